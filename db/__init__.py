@@ -1,5 +1,5 @@
 # This file makes the 'db' directory a Python package.
 # We can also use it for convenient imports.
 
-from .database import get_db_connection, setup_database
-from .data_unifier import get_unified_alerts, get_all_logs
\ No newline at end of file
+from .database import get_db_connection, pooled_connection, get_pool_stats, setup_database
+from .data_unifier import get_unified_alerts, get_unified_alerts_page, get_alert_summary, refresh_alert_summary, get_all_logs, get_logs_page, get_new_logs, get_latest_ids
\ No newline at end of file
@@ -1,73 +1,260 @@
-from .database import get_db_connection
+from .database import pooled_connection
 
-def get_unified_alerts():
+DEFAULT_LOG_PAGE_SIZE = 500
+DEFAULT_ALERT_PAGE_SIZE = 200
+LOG_FILTER_FIELDS = ('user_id', 'action', 'resource', 'status')
+UNIFIED_ALERT_COLUMNS = "id, timestamp, title, description, type, severity"
+# The 'type' of each source in 'unified_alerts', and the table it comes from
+ALERT_SOURCE_TYPES = (('Rule-Based', 'alerts'), ('ML-Based', 'anomalies'))
+SUMMARY_TOP_N = 5
+SUMMARY_HOURS = 24
+
+def get_latest_ids():
+    """
+    Returns the newest ids of logs, alerts and anomalies, for delta refreshes.
+
+    Also returns the oldest anomaly id: the ML pipeline replaces the whole
+    'anomalies' table, so anomalies a client has already shown may be gone.
+
+    Returns:
+        dict: 'logs', 'alerts', 'anomalies' and 'oldest_anomaly' ids (0 when a table is empty).
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT (SELECT COALESCE(MAX(id), 0) FROM logs),
+                           (SELECT COALESCE(MAX(id), 0) FROM alerts),
+                           (SELECT COALESCE(MAX(id), 0) FROM anomalies),
+                           (SELECT COALESCE(MIN(id), 0) FROM anomalies)
+                """)
+                return dict(zip(('logs', 'alerts', 'anomalies', 'oldest_anomaly'), cur.fetchone()))
+        except Exception as e:
+            print(f"Error fetching latest ids: {e}")
+            return None
+
+def _alert_from_row(row):
+    """Converts a row selected with UNIFIED_ALERT_COLUMNS into an alert dictionary."""
+    return dict(zip(("id", "timestamp", "title", "description", "type", "severity"), row))
+
+def _id_range_conditions(since, until):
+    """
+    Builds the conditions limiting unified alerts to per-source id ranges.
+
+    Args:
+        since (dict, optional): Exclusive lower bounds keyed by 'alerts' and 'anomalies'.
+        until (dict, optional): Inclusive upper bounds keyed by 'alerts' and 'anomalies'.
+
+    Returns:
+        tuple: A list of SQL conditions and their query parameters.
+    """
+    conditions = []
+    params = []
+    for alert_type, key in ALERT_SOURCE_TYPES:
+        if since and since.get(key):
+            conditions.append("(type <> %s OR source_id > %s)")
+            params.extend([alert_type, since[key]])
+        if until and until.get(key) is not None:
+            conditions.append("(type <> %s OR source_id <= %s)")
+            params.extend([alert_type, until[key]])
+    return conditions, params
+
+def get_unified_alerts(since=None, until=None, exclude_ids=()):
     """
     Fetches both rule-based alerts and ML-based anomalies from the database
     and unifies them into a single list, sorted by timestamp.
 
+    The unification, severity and ordering happen in the 'unified_alerts' view.
+
+    Args:
+        since (dict, optional): Only alerts and anomalies with ids above since['alerts'] and since['anomalies'].
+        until (dict, optional): Only alerts and anomalies with ids up to until['alerts'] and until['anomalies'].
+        exclude_ids (iterable): Unified ids ('rule-<n>' / 'ml-<n>') to leave out, e.g. the ones already shown.
+
     Returns:
         list: A list of dictionaries, where each dictionary represents an alert.
     """
-    unified_list = []
-    conn = get_db_connection()
-    if not conn:
-        print("Could not connect to the database to unify data.")
-        return unified_list
-
-    try:
-        with conn.cursor() as cur:
-            # 1. Fetch Rule-Based Alerts
-            cur.execute("""
-                SELECT a.id, a.timestamp, r.name, a.description, 'Rule-Based' as type, 'Medium' as severity
-                FROM alerts a
-                JOIN rules r ON a.rule_id = r.id
-            """)
-            rule_alerts = cur.fetchall()
-            for alert in rule_alerts:
-                unified_list.append({
-                    "id": f"rule-{alert[0]}",
-                    "timestamp": alert[1],
-                    "title": alert[2],
-                    "description": alert[3],
-                    "type": alert[4],
-                    "severity": alert[5] # Placeholder severity
-                })
-
-            # 2. Fetch ML-Based Anomalies
-            cur.execute("""
-                SELECT a.id, a.timestamp, a.details, a.score, 'ML-Based' as type
-                FROM anomalies a
-            """)
-            anomalies = cur.fetchall()
-            for anomaly in anomalies:
-                # Assign severity based on score
-                score = anomaly[3]
-                severity = "Low"
-                if score < -0.1:
-                    severity = "Medium"
-                if score < -0.2:
-                    severity = "High"
-
-                unified_list.append({
-                    "id": f"ml-{anomaly[0]}",
-                    "timestamp": anomaly[1],
-                    "title": "Unusual Activity Detected",
-                    "description": anomaly[2],
-                    "type": anomaly[4],
-                    "severity": severity
-                })
-
-        # 3. Sort the combined list by timestamp, most recent first
-        unified_list.sort(key=lambda x: x['timestamp'], reverse=True)
-
-        return unified_list
-
-    except Exception as e:
-        print(f"Error unifying data sources: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+    conditions, params = _id_range_conditions(since, until)
+    if exclude_ids:
+        conditions.append("id <> ALL(%s)")
+        params.append(list(exclude_ids))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with pooled_connection() as conn:
+        if not conn:
+            print("Could not connect to the database to unify data.")
+            return []
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT {UNIFIED_ALERT_COLUMNS} FROM unified_alerts
+                    {where}
+                    ORDER BY timestamp DESC, type DESC, source_id DESC
+                    """,
+                    params
+                )
+                return [_alert_from_row(row) for row in cur.fetchall()]
+        except Exception as e:
+            print(f"Error unifying data sources: {e}")
+            return []
+
+def get_unified_alerts_page(page_size=DEFAULT_ALERT_PAGE_SIZE, after=None, alert_type=None, severity=None,
+                            start_time=None, end_time=None, until=None):
+    """
+    Fetches one page of unified alerts, most recent first, using keyset pagination.
+
+    Alerts and anomalies are paged separately, each on its indexed (timestamp, id)
+    keyset, and the two pages are merged here. A page therefore reads at most
+    page_size + 1 rows of each source instead of sorting the whole view. At equal
+    timestamps, rule-based alerts come before anomalies and higher ids first.
+
+    Args:
+        page_size (int): The maximum number of alerts to return.
+        after (dict, optional): The cursor returned with the previous page: the last
+            (timestamp, id) shown of 'alerts' and of 'anomalies'.
+        alert_type (str, optional): 'Rule-Based' or 'ML-Based'.
+        severity (str, optional): 'High', 'Medium' or 'Low'.
+        start_time (datetime, optional): Only alerts at or after this time.
+        end_time (datetime, optional): Only alerts before this time.
+        until (dict, optional): Only alerts and anomalies with ids up to until['alerts'] and
+            until['anomalies'], so later pages stay consistent with the first one.
+
+    Returns:
+        tuple: A list of alert dictionaries and the cursor for the next page,
+        or None when this is the last page.
+    """
+    conditions, params = [], []
+    if severity is not None:
+        conditions.append("severity = %s")
+        params.append(severity)
+    if start_time is not None:
+        conditions.append("timestamp >= %s")
+        params.append(start_time)
+    if end_time is not None:
+        conditions.append("timestamp < %s")
+        params.append(end_time)
+
+    # (timestamp, is rule-based, source id, source, row) of both sources' candidates
+    candidates = []
+    with pooled_connection() as conn:
+        if not conn:
+            return [], None
+        try:
+            with conn.cursor() as cur:
+                for source_type, key in ALERT_SOURCE_TYPES:
+                    if alert_type is not None and alert_type != source_type:
+                        continue
+                    source_conditions = ["type = %s", *conditions]
+                    source_params = [source_type, *params]
+                    if until and until.get(key) is not None:
+                        source_conditions.append("source_id <= %s")
+                        source_params.append(until[key])
+                    if after and after.get(key) is not None:
+                        source_conditions.append("(timestamp, source_id) < (%s, %s)")
+                        source_params.extend(after[key])
+                    # One extra row tells whether another page follows
+                    cur.execute(
+                        f"""
+                        SELECT source_id, {UNIFIED_ALERT_COLUMNS} FROM unified_alerts
+                        WHERE {' AND '.join(source_conditions)}
+                        ORDER BY timestamp DESC, source_id DESC
+                        LIMIT %s
+                        """,
+                        (*source_params, page_size + 1)
+                    )
+                    candidates.extend((row[2], key == 'alerts', row[0], key, row[1:]) for row in cur.fetchall())
+        except Exception as e:
+            print(f"Error fetching alerts page: {e}")
+            return [], None
+
+    candidates.sort(key=lambda candidate: candidate[:3], reverse=True)
+    next_cursor = None
+    if len(candidates) > page_size:
+        candidates = candidates[:page_size]
+        next_cursor = dict(after or {})
+        # Newest first, so each source ends up at the last of its rows on this page
+        for timestamp, _, source_id, key, _ in candidates:
+            next_cursor[key] = (timestamp, source_id)
+    return [_alert_from_row(candidate[4]) for candidate in candidates], next_cursor
+
+def refresh_alert_summary():
+    """
+    Recomputes the 'alert_summary' materialized view.
+
+    Called by the writers (run_rules, save_anomalies, follow_logs) once they
+    have stored alerts, so the dashboard only ever reads the view. The refresh
+    runs CONCURRENTLY, so the dashboard keeps reading the previous counts while
+    it runs.
+
+    Returns:
+        bool: True if the summary was refreshed.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY alert_summary")
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error refreshing alert summary: {e}")
+            conn.rollback()
+            return False
+
+def get_alert_summary(top=SUMMARY_TOP_N, hours=SUMMARY_HOURS):
+    """
+    Reads the alert counts from the 'alert_summary' materialized view.
+
+    The view holds one row per (hour, type, severity, rule, user), so this
+    costs the same however many alerts have been raised.
+
+    Args:
+        top (int): How many rules and users to return, busiest first.
+        hours (int): How many of the most recent hours with alerts to return.
+
+    Returns:
+        dict: 'total', 'by_severity' and 'by_type' (name -> count), 'by_rule' and
+        'by_user' (lists of (name, count)) and 'by_hour' (list of (hour, count), oldest first).
+    """
+    summary = {'total': 0, 'by_severity': {}, 'by_type': {}, 'by_rule': [], 'by_user': [], 'by_hour': []}
+    with pooled_connection() as conn:
+        if not conn:
+            return summary
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT GROUPING(severity, type, rule_name, user_id, hour),
+                           severity, type, rule_name, user_id, hour, COALESCE(SUM(alert_count), 0)
+                    FROM alert_summary
+                    GROUP BY GROUPING SETS ((severity), (type), (rule_name), (user_id), (hour), ())
+                """)
+                rows = cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching alert summary: {e}")
+            return summary
+
+    # GROUPING() sets a bit for every column left out of the grouping set, first column highest.
+    # An empty view still yields the () total row, with a count of 0
+    dimensions = {0b01111: ('by_severity', 1), 0b10111: ('by_type', 2), 0b11011: ('by_rule', 3),
+                  0b11101: ('by_user', 4), 0b11110: ('by_hour', 5)}
+    grouped = {key: [] for key, _ in dimensions.values()}
+    for row in rows:
+        if row[0] == 0b11111:
+            summary['total'] = int(row[6])
+        else:
+            key, column = dimensions[row[0]]
+            grouped[key].append((row[column], int(row[6])))
+
+    summary['by_severity'] = dict(grouped['by_severity'])
+    summary['by_type'] = dict(grouped['by_type'])
+    summary['by_rule'] = sorted(grouped['by_rule'], key=lambda item: -item[1])[:top]
+    summary['by_user'] = sorted(grouped['by_user'], key=lambda item: -item[1])[:top]
+    summary['by_hour'] = sorted(grouped['by_hour'])[-hours:]
+    return summary
 
 def get_all_logs():
     """
@@ -76,19 +263,115 @@ def get_all_logs():
     Returns:
         list: A list of tuples, where each tuple is a log record.
     """
-    conn = get_db_connection()
-    if not conn:
-        return []
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT status, timestamp, user_id, resource, action FROM logs ORDER BY timestamp DESC")
-            return cur.fetchall()
-    except Exception as e:
-        print(f"Error fetching all logs: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT status, timestamp, user_id, resource, action FROM logs ORDER BY timestamp DESC")
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching all logs: {e}")
+            return []
+
+def get_new_logs(since_id, until_id, exclude_ids=()):
+    """
+    Fetches the logs with ids in (since_id, until_id], most recent first.
+
+    Args:
+        since_id (int): Exclusive lower id bound.
+        until_id (int): Inclusive upper id bound.
+        exclude_ids (iterable): Log ids to leave out, e.g. the ones already shown.
+
+    Returns:
+        list: A list of (id, status, timestamp, user_id, resource, action) tuples.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT id, status, timestamp, user_id, resource, action FROM logs
+                    WHERE id > %s AND id <= %s AND id <> ALL(%s)
+                    ORDER BY timestamp DESC, id DESC
+                    """,
+                    (since_id, until_id, list(exclude_ids))
+                )
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching new logs: {e}")
+            return []
+
+def get_logs_page(page_size=DEFAULT_LOG_PAGE_SIZE, after=None, filters=None, start_time=None, end_time=None,
+                  max_id=None):
+    """
+    Fetches one page of logs, most recent first, using keyset pagination.
+
+    Pages are ordered by (timestamp, id) descending and continue strictly
+    after the cursor of the previous page, so every page costs one index
+    range scan no matter how deep the user has scrolled.
+
+    Args:
+        page_size (int): The maximum number of logs to return.
+        after (tuple, optional): The (timestamp, id) cursor returned with the previous page.
+        filters (dict, optional): Exact-match values keyed by 'user_id', 'action', 'resource' or 'status'.
+        start_time (datetime, optional): Only logs at or after this time.
+        end_time (datetime, optional): Only logs before this time.
+        max_id (int, optional): Only logs with ids up to this one, so later pages stay
+            consistent with the first one.
+
+    Returns:
+        tuple: A list of (status, timestamp, user_id, resource, action) tuples and
+        the cursor for the next page, or None when this is the last page.
+    """
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append("(timestamp, id) < (%s, %s)")
+        params.extend(after)
+    for field, value in (filters or {}).items():
+        if field not in LOG_FILTER_FIELDS:
+            raise ValueError(f"Cannot filter logs on '{field}'.")
+        conditions.append(f"{field} = %s")
+        params.append(value)
+    if start_time is not None:
+        conditions.append("timestamp >= %s")
+        params.append(start_time)
+    if end_time is not None:
+        conditions.append("timestamp < %s")
+        params.append(end_time)
+    if max_id is not None:
+        conditions.append("id <= %s")
+        params.append(max_id)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with pooled_connection() as conn:
+        if not conn:
+            return [], None
+        try:
+            with conn.cursor() as cur:
+                # One extra row tells whether another page follows
+                cur.execute(
+                    f"""
+                    SELECT status, timestamp, user_id, resource, action, id FROM logs
+                    {where}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s
+                    """,
+                    (*params, page_size + 1)
+                )
+                rows = cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching logs page: {e}")
+            return [], None
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][1], rows[-1][5])
+    return [row[:5] for row in rows], next_cursor
 
 if __name__ == '__main__':
     # For testing purposes
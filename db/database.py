@@ -1,143 +1,385 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import pool
+from psycopg2.extensions import connection as _connection
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Connection pool settings, overridable through the environment
+POOL_MIN_CONNECTIONS = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Idle connections older than this are verified with 'SELECT 1' before being lent out
+POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+_pool_stats = {"opened": 0, "reused": 0}
+_stats_lock = threading.Lock()
+
+def _connection_params():
+    return dict(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+    )
+
 def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
+    """
+    Establishes a new, dedicated connection to the PostgreSQL database.
+
+    The caller owns the connection and must close it. Short-lived queries should
+    use pooled_connection() instead.
+    """
     try:
-        conn = psycopg2.connect(
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT")
-        )
+        conn = psycopg2.connect(**_connection_params())
         return conn
     except psycopg2.OperationalError as e:
         print(f"Error connecting to the database: {e}")
         return None
 
-def setup_database():
-    """Reads the schema.sql file and executes it to set up the DB tables."""
-    conn = get_db_connection()
-    if conn is None:
-        return
+class _PooledConnection(_connection):
+    """A psycopg2 connection that remembers when it was last returned to the pool."""
+    last_used = None
+
+class _CountingConnectionPool(pool.ThreadedConnectionPool):
+    """A thread-safe pool that counts the physical connections it opens."""
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        with _stats_lock:
+            _pool_stats["opened"] += 1
+        return conn
+
+def _get_pool():
+    """Creates the shared connection pool on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = _CountingConnectionPool(
+                    POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS,
+                    connection_factory=_PooledConnection, **_connection_params()
+                )
+            except psycopg2.OperationalError as e:
+                print(f"Error connecting to the database: {e}")
+                return None
+        return _pool
 
+def _is_healthy(conn):
+    """Checks that a pooled connection is still usable before lending it out."""
+    if conn.closed:
+        return False
+    if conn.last_used is None or time.monotonic() - conn.last_used < POOL_HEALTHCHECK_SECONDS:
+        return True
     try:
         with conn.cursor() as cur:
-            with open('db/schema.sql', 'r') as f:
-                cur.execute(f.read())
-            conn.commit()
-        print("Database setup complete. Tables created successfully.")
-    except Exception as e:
-        print(f"Error setting up database: {e}")
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _acquire_connection(db_pool):
+    """Takes a healthy connection from the pool, replacing broken ones."""
+    for _ in range(POOL_MAX_CONNECTIONS + 1):
+        try:
+            conn = db_pool.getconn()
+        except (pool.PoolError, psycopg2.OperationalError) as e:
+            print(f"Error getting a pooled database connection: {e}")
+            return None
+
+        if _is_healthy(conn):
+            if conn.last_used is not None:
+                with _stats_lock:
+                    _pool_stats["reused"] += 1
+            return conn
+
+        db_pool.putconn(conn, close=True)
+    return None
+
+@contextmanager
+def pooled_connection():
+    """
+    Lends a connection from the shared, thread-safe connection pool.
+
+    Yields None if no connection could be obtained, like get_db_connection.
+    On exit the connection goes back to the pool, and any transaction still
+    open is rolled back. Waits up to DB_POOL_TIMEOUT seconds when every
+    connection is in use.
+    """
+    db_pool = _get_pool()
+    if db_pool is None:
+        yield None
+        return
+
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+        print("Timed out waiting for a pooled database connection.")
+        yield None
+        return
+
+    conn = None
+    try:
+        conn = _acquire_connection(db_pool)
+        yield conn
     finally:
-        if conn:
-            conn.close()
+        if conn is not None:
+            conn.last_used = time.monotonic()
+            db_pool.putconn(conn, close=bool(conn.closed))
+        _pool_slots.release()
+
+def get_pool_stats():
+    """
+    Returns connection pool counters.
+
+    Returns:
+        dict: 'opened' physical connections and 'reused' checkouts of an
+        already open connection.
+    """
+    with _stats_lock:
+        return dict(_pool_stats)
+
+def close_pool():
+    """Closes every pooled connection. The pool is recreated on next use."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def setup_database(partitioned=False):
+    """
+    Reads the schema file and executes it to set up the DB tables.
+
+    Args:
+        partitioned (bool): Use db/schema_partitioned.sql, which range-partitions
+            logs, alerts and anomalies by month, and create the upcoming partitions.
+    """
+    schema_path = 'db/schema_partitioned.sql' if partitioned else 'db/schema.sql'
+    with pooled_connection() as conn:
+        if conn is None:
+            return
+
+        try:
+            with conn.cursor() as cur:
+                with open(schema_path, 'r') as f:
+                    cur.execute(f.read())
+                if partitioned:
+                    from db.partitions import ensure_upcoming_partitions
+                    ensure_upcoming_partitions(cur)
+                conn.commit()
+            print("Database setup complete. Tables created successfully.")
+        except Exception as e:
+            print(f"Error setting up database: {e}")
+
+def read_snapshot_xids(cur):
+    """
+    Returns (xmin, xmax) of a fresh snapshot: the oldest transaction still running
+    and the first transaction id not yet assigned.
+    """
+    cur.execute(
+        "SELECT pg_snapshot_xmin(s)::text::bigint, pg_snapshot_xmax(s)::text::bigint "
+        "FROM pg_current_snapshot() s"
+    )
+    return cur.fetchone()
+
+def advance_settled_log_id(settled_log_id, last_log_id, snapshot_xmax, xmin):
+    """
+    Returns the log id at or below which no more logs can commit.
+
+    Log ids are taken from the sequence when a row is inserted, not when it commits,
+    so a writer that commits late can add logs below an id a batch job has already
+    passed. Such a writer held its id before the job read last_log_id, and so was
+    running before the snapshot_xmax the job read right after it. Once every
+    transaction below that xmax has finished (xmin has reached it), nothing more can
+    appear at or below last_log_id, and the settled id moves up to it.
+
+    Args:
+        settled_log_id (int): The settled id stored by the previous run.
+        last_log_id (int): The newest log id the previous run processed.
+        snapshot_xmax (int): The snapshot xmax the previous run read after last_log_id,
+            or None if it never ran.
+        xmin (int): The xmin of a snapshot taken now (see read_snapshot_xids()).
+    """
+    if snapshot_xmax is not None and xmin >= snapshot_xmax:
+        return last_log_id
+    return settled_log_id
 
 def get_all_rules():
     """Retrieves all rules from the database."""
-    conn = get_db_connection()
-    if not conn:
-        return []
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, name, description, target_field, operator, value, is_active FROM rules ORDER BY id")
-            return cur.fetchall()
-    except Exception as e:
-        print(f"Error fetching rules: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, name, description, target_field, operator, value, is_active FROM rules ORDER BY id")
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching rules: {e}")
+            return []
 
 def get_active_rules():
-    """Retrieves all active rules from the database."""
-    conn = get_db_connection()
-    if not conn:
-        return []
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, name, description, target_field, operator, value FROM rules WHERE is_active = TRUE")
-            return cur.fetchall()
-    except Exception as e:
-        print(f"Error fetching active rules: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+    """Retrieves all active match rules (flag every matching log) from the database."""
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT id, name, description, target_field, operator, value FROM rules "
+                    "WHERE is_active = TRUE AND rule_type = 'match'"
+                )
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching active rules: {e}")
+            return []
 
-def add_rule(name, description, target_field, operator, value, is_active=True):
-    """Adds a new rule to the database."""
-    conn = get_db_connection()
-    if not conn:
-        return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO rules (name, description, target_field, operator, value, is_active)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (name, description, target_field, operator, value, is_active)
-            )
-            conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error adding rule: {e}")
-        conn.rollback()
-        return False
-    finally:
-        if conn:
-            conn.close()
+def get_active_window_rules():
+    """
+    Retrieves all active windowed threshold rules from the database.
+
+    Returns:
+        list: Tuples of (id, name, description, target_field, operator, value,
+        group_by_field, aggregate, distinct_field, window_type, window_seconds, threshold).
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, name, description, target_field, operator, value,
+                           group_by_field, aggregate, distinct_field, window_type, window_seconds, threshold
+                    FROM rules
+                    WHERE is_active = TRUE AND rule_type = 'window'
+                """)
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching active window rules: {e}")
+            return []
+
+def add_rule(name, description, target_field, operator, value, is_active=True, rule_type='match',
+             group_by_field=None, aggregate=None, distinct_field=None, window_type=None,
+             window_seconds=None, threshold=None):
+    """
+    Adds a new rule to the database.
+
+    Match rules only need the condition (target_field, operator, value). Window
+    rules (rule_type='window') also need group_by_field, aggregate ('count' or
+    'distinct_count', the latter with distinct_field), window_type ('sliding' or
+    'tumbling'), window_seconds and threshold.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO rules (name, description, target_field, operator, value, is_active, rule_type,
+                                       group_by_field, aggregate, distinct_field, window_type, window_seconds, threshold)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (name, description, target_field, operator, value, is_active, rule_type,
+                     group_by_field, aggregate, distinct_field, window_type, window_seconds, threshold)
+                )
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error adding rule: {e}")
+            conn.rollback()
+            return False
 
 def update_rule(rule_id, name, description, target_field, operator, value, is_active):
-    """Updates an existing rule in the database."""
-    conn = get_db_connection()
-    if not conn:
-        return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE rules
-                SET name = %s, description = %s, target_field = %s, operator = %s, value = %s, is_active = %s
-                WHERE id = %s
-                """,
-                (name, description, target_field, operator, value, is_active, rule_id)
-            )
-            conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error updating rule: {e}")
-        conn.rollback()
-        return False
-    finally:
-        if conn:
-            conn.close()
+    """
+    Updates an existing rule in the database.
+
+    If the rule's definition (field, operator or value) changes, its evaluation
+    watermarks are reset so the next rule engine run re-evaluates every log.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE rules
+                    SET name = %s, description = %s, target_field = %s, operator = %s, value = %s, is_active = %s,
+                        last_evaluated_log_id = CASE
+                            WHEN (target_field, operator, value) IS DISTINCT FROM (%s, %s, %s) THEN 0
+                            ELSE last_evaluated_log_id
+                        END,
+                        settled_log_id = CASE
+                            WHEN (target_field, operator, value) IS DISTINCT FROM (%s, %s, %s) THEN 0
+                            ELSE settled_log_id
+                        END
+                    WHERE id = %s
+                    """,
+                    (name, description, target_field, operator, value, is_active,
+                     target_field, operator, value, target_field, operator, value, rule_id)
+                )
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error updating rule: {e}")
+            conn.rollback()
+            return False
+
+def update_rule_window(rule_id, group_by_field, aggregate, distinct_field, window_type, window_seconds, threshold):
+    """
+    Turns a rule into a window rule, or changes its window settings.
+
+    The rule's evaluation watermarks are reset so it is re-evaluated against every log.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE rules
+                    SET rule_type = 'window', group_by_field = %s, aggregate = %s, distinct_field = %s,
+                        window_type = %s, window_seconds = %s, threshold = %s,
+                        last_evaluated_log_id = 0, settled_log_id = 0
+                    WHERE id = %s
+                    """,
+                    (group_by_field, aggregate, distinct_field, window_type, window_seconds, threshold, rule_id)
+                )
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error updating rule window: {e}")
+            conn.rollback()
+            return False
 
 def delete_rule(rule_id):
     """Deletes a rule from the database."""
-    conn = get_db_connection()
-    if not conn:
-        return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM rules WHERE id = %s", (rule_id,))
-            conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error deleting rule: {e}")
-        conn.rollback()
-        return False
-    finally:
-        if conn:
-            conn.close()
+    with pooled_connection() as conn:
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM rules WHERE id = %s", (rule_id,))
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error deleting rule: {e}")
+            conn.rollback()
+            return False
 
 if __name__ == '__main__':
     # This allows running the script directly to initialize the database
+    import sys
+
     print("Setting up the database...")
-    setup_database()
+    setup_database(partitioned='--partitioned' in sys.argv)
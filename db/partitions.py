@@ -0,0 +1,215 @@
+import argparse
+import gzip
+import os
+import re
+from datetime import datetime, timedelta
+
+from db.database import pooled_connection
+
+# Tables range-partitioned by month in db/schema_partitioned.sql, and their partition keys.
+# Alerts and anomalies are partitioned on their log's timestamp, so each month's
+# partitions hold the same logs. Retention drops children first so no partition
+# outlives the logs it refers to.
+PARTITIONED_TABLES = ('logs', 'alerts', 'anomalies')
+PARTITION_KEYS = {'logs': 'timestamp', 'alerts': 'log_ts', 'anomalies': 'log_ts'}
+DEFAULT_MONTHS_AHEAD = 3
+PARTITION_NAME_PATTERN = re.compile(r'^(logs|alerts|anomalies)_p(\d{4})(\d{2})$')
+
+def month_start(ts):
+    """Returns the first instant of the month containing ts, without a timezone."""
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+def add_months(month, count):
+    """Returns the month start 'count' months after the given month start."""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def partition_name(table, month):
+    """Returns the name of a table's partition for the given month, e.g. 'logs_p202310'."""
+    return f"{table}_p{month:%Y%m}"
+
+def months_for_rows(rows, position=0):
+    """
+    Collects the months covered by a batch of log tuples.
+
+    Args:
+        rows (list): Log tuples; timestamps as datetimes or ISO 8601 strings.
+        position (int): The index of the timestamp in each tuple.
+
+    Returns:
+        set: The month starts of every parseable timestamp.
+    """
+    months = set()
+    for row in rows:
+        value = row[position]
+        try:
+            ts = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            continue
+        months.add(month_start(ts))
+    return months
+
+def is_partitioned(cur):
+    """Checks whether the 'logs' table was created by the partitioned schema."""
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('logs'))")
+    return cur.fetchone()[0]
+
+def existing_partitions(cur, table):
+    """Returns the names of a partitioned table's current partitions."""
+    cur.execute(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        (table,)
+    )
+    return {name for (name,) in cur.fetchall()}
+
+def _create_partition(cur, table, month):
+    """
+    Creates a table's partition for one month.
+
+    PostgreSQL refuses to create a partition while the default partition holds
+    rows that belong in it, so any such rows are moved out first and
+    re-inserted once the partition exists.
+    """
+    name = partition_name(table, month)
+    key = PARTITION_KEYS[table]
+    bounds = (month, add_months(month, 1))
+    create_sql = f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)"
+
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {key} >= %s AND {key} < %s)", bounds)
+    if not cur.fetchone()[0]:
+        cur.execute(create_sql, bounds)
+        return
+
+    staging = f"{name}_staging"
+    cur.execute(f"CREATE TEMP TABLE {staging} (LIKE {table}) ON COMMIT DROP")
+    cur.execute(
+        f"""
+        WITH moved AS (DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *)
+        INSERT INTO {staging} SELECT * FROM moved
+        """,
+        bounds
+    )
+    cur.execute(create_sql, bounds)
+    cur.execute(f"INSERT INTO {table} SELECT * FROM {staging}")
+    cur.execute(f"DROP TABLE {staging}")
+
+def ensure_partitions(cur, months):
+    """
+    Creates the monthly partitions of every partitioned table for the given months.
+
+    Does nothing when the database uses the plain schema. Runs inside the
+    caller's transaction, so partitions appear together with the rows that
+    needed them. Rows of those months already in a default partition are
+    moved into the new partitions.
+
+    Args:
+        cur: An open psycopg2 cursor.
+        months (iterable): Month starts (see month_start) that must have a partition.
+
+    Returns:
+        int: The number of partitions created.
+    """
+    months = sorted(set(months))
+    if not months or not is_partitioned(cur):
+        return 0
+
+    existing = existing_partitions(cur, 'logs')
+    missing = [month for month in months if partition_name('logs', month) not in existing]
+    if not missing:
+        return 0
+
+    # Serialize partition creation between concurrent writers
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('logs_partitions'))")
+    created = 0
+    for month in missing:
+        for table in PARTITIONED_TABLES:
+            _create_partition(cur, table, month)
+            created += 1
+    return created
+
+def ensure_upcoming_partitions(cur, months_ahead=DEFAULT_MONTHS_AHEAD, now=None):
+    """
+    Creates the partitions for the current month and the next few months, so
+    live ingestion rarely has to create one while it writes.
+
+    Returns:
+        int: The number of partitions created.
+    """
+    current = month_start(now or datetime.now())
+    return ensure_partitions(cur, [add_months(current, offset) for offset in range(months_ahead + 1)])
+
+def _archive_partition(cur, name, archive_dir):
+    """Writes a partition's rows to '<archive_dir>/<name>.csv.gz' and returns the path."""
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(archive_dir, f"{name}.csv.gz")
+    with gzip.open(archive_path, 'wt', newline='') as f:
+        cur.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    return archive_path
+
+def drop_expired_partitions(retention_days, archive_dir=None, now=None):
+    """
+    Drops (and optionally archives) monthly partitions older than the retention window.
+
+    A partition is dropped once its whole month lies before the cutoff, which
+    removes its rows instantly instead of with a DELETE. Alerts and anomalies
+    partitions are dropped before the logs partition of the same month.
+
+    Args:
+        retention_days (int): How many days of data to keep.
+        archive_dir (str, optional): Directory to COPY each partition to before dropping it.
+
+    Returns:
+        list: The names of the dropped partitions.
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+
+        dropped = []
+        try:
+            with conn.cursor() as cur:
+                if not is_partitioned(cur):
+                    print("Retention requires the partitioned schema; nothing to drop.")
+                    return []
+
+                for table in reversed(PARTITIONED_TABLES):
+                    for name in sorted(existing_partitions(cur, table)):
+                        match = PARTITION_NAME_PATTERN.match(name)
+                        if not match:
+                            continue
+                        month = datetime(int(match.group(2)), int(match.group(3)), 1)
+                        if add_months(month, 1) > cutoff:
+                            continue
+                        if archive_dir:
+                            print(f"Archived {name} to {_archive_partition(cur, name, archive_dir)}.")
+                        cur.execute(f"DROP TABLE {name}")
+                        dropped.append(name)
+            conn.commit()
+            return dropped
+        except Exception as e:
+            print(f"Error dropping expired partitions: {e}")
+            conn.rollback()
+            return []
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of the logs tables.")
+    parser.add_argument('--retention-days', type=int, help="Drop partitions older than this many days.")
+    parser.add_argument('--archive-dir', help="Archive partitions here as gzipped CSV before dropping them.")
+    parser.add_argument('--months-ahead', type=int, default=DEFAULT_MONTHS_AHEAD,
+                        help="Create partitions for this many upcoming months.")
+    args = parser.parse_args()
+
+    with pooled_connection() as conn:
+        if conn:
+            with conn.cursor() as cur:
+                print(f"Created {ensure_upcoming_partitions(cur, args.months_ahead)} partitions.")
+            conn.commit()
+
+    if args.retention_days is not None:
+        dropped = drop_expired_partitions(args.retention_days, args.archive_dir)
+        print(f"Dropped {len(dropped)} partitions: {', '.join(dropped) or 'none'}.")
@@ -5,6 +5,8 @@ DROP TABLE IF EXISTS anomalies CASCADE;
 DROP TABLE IF EXISTS alerts CASCADE;
 DROP TABLE IF EXISTS logs CASCADE;
 DROP TABLE IF EXISTS rules CASCADE;
+DROP TABLE IF EXISTS ingestion_checkpoints CASCADE;
+DROP TABLE IF EXISTS pipeline_watermarks CASCADE;
 
 -- Create logs table to store ingested log data
 CREATE TABLE logs (
@@ -24,7 +26,24 @@ CREATE TABLE rules (
     target_field VARCHAR(100) NOT NULL,
     operator VARCHAR(50) NOT NULL,
     value VARCHAR(255) NOT NULL,
-    is_active BOOLEAN DEFAULT TRUE
+    is_active BOOLEAN DEFAULT TRUE,
+    -- 'match' flags every log matching the condition. 'window' flags the logs of a group
+    -- (group_by_field) once their count, or distinct count of distinct_field, reaches
+    -- threshold within window_seconds, using a 'sliding' or 'tumbling' window.
+    rule_type VARCHAR(20) NOT NULL DEFAULT 'match',
+    group_by_field VARCHAR(100),
+    aggregate VARCHAR(20),
+    distinct_field VARCHAR(100),
+    window_type VARCHAR(20),
+    window_seconds INTEGER,
+    threshold INTEGER,
+    -- High-water mark: the highest logs.id this rule has been evaluated against
+    last_evaluated_log_id INTEGER NOT NULL DEFAULT 0,
+    -- Snapshot xmax read just after last_evaluated_log_id; once every transaction below it
+    -- has finished, no more logs can commit at or below that id
+    evaluated_xmax BIGINT,
+    -- Every log at or below this id has committed and been evaluated; the next run starts here
+    settled_log_id INTEGER NOT NULL DEFAULT 0
 );
 
 -- Create alerts table to store flagged compliance violations
@@ -32,30 +51,90 @@ CREATE TABLE alerts (
     id SERIAL PRIMARY KEY,
     log_id INTEGER REFERENCES logs(id) ON DELETE CASCADE,
     rule_id INTEGER REFERENCES rules(id) ON DELETE CASCADE,
+    -- log_ts is the timestamp of the log; timestamp is when the alert was raised
+    log_ts TIMESTAMP NOT NULL,
     timestamp TIMESTAMP NOT NULL,
-    description TEXT
+    description TEXT,
+    -- One alert per log entry and rule; lets the rule engine insert with
+    -- ON CONFLICT (log_id, rule_id, log_ts) DO NOTHING, as on the partitioned schema
+    CONSTRAINT uq_alerts_log_rule UNIQUE (log_id, rule_id, log_ts)
 );
 
 -- Create anomalies table to store results from the ML model
 CREATE TABLE anomalies (
     id SERIAL PRIMARY KEY,
     log_id INTEGER REFERENCES logs(id) ON DELETE CASCADE,
+    log_ts TIMESTAMP NOT NULL,
     timestamp TIMESTAMP NOT NULL,
     score DECIMAL(10, 5) NOT NULL,
     details TEXT
 );
 
+-- Create ingestion_checkpoints table to make streaming ingestion resumable
+-- byte_offset is the position just after the last committed row of the file
+CREATE TABLE ingestion_checkpoints (
+    file_path TEXT PRIMARY KEY,
+    byte_offset BIGINT NOT NULL DEFAULT 0,
+    rows_ingested BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Create pipeline_watermarks table so batch jobs only process logs they have not seen
+-- last_log_id is the newest log id the named pipeline has fully processed, snapshot_xmax
+-- the xmax read just after it, and settled_log_id the id at or below which every log has
+-- committed and been processed (the next incremental run starts after it)
+CREATE TABLE pipeline_watermarks (
+    name TEXT PRIMARY KEY,
+    last_log_id INTEGER NOT NULL DEFAULT 0,
+    snapshot_xmax BIGINT,
+    settled_log_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Unified view of rule-based alerts and ML-based anomalies, read a page at a time by the dashboard.
+-- 'id' ('rule-<n>' / 'ml-<n>') identifies an alert across both sources; pages are read per
+-- source on (timestamp, source_id), which the planner pushes down to each table's index.
+CREATE VIEW unified_alerts AS
+SELECT 'rule-' || a.id AS id, a.id AS source_id, a.log_id, a.timestamp,
+       r.name AS title, a.description, 'Rule-Based' AS type, 'Medium' AS severity
+FROM alerts a
+JOIN rules r ON a.rule_id = r.id
+UNION ALL
+SELECT 'ml-' || a.id, a.id, a.log_id, a.timestamp,
+       'Unusual Activity Detected', a.details, 'ML-Based',
+       CASE WHEN a.score < -0.2 THEN 'High' WHEN a.score < -0.1 THEN 'Medium' ELSE 'Low' END
+FROM anomalies a;
+
+-- Alert counts per hour, type, severity, rule and user, read by the dashboard summary panel.
+-- Refreshed CONCURRENTLY (hence the unique index), so readers are never blocked.
+CREATE MATERIALIZED VIEW alert_summary AS
+SELECT date_trunc('hour', u.timestamp) AS hour, u.type, u.severity, u.title AS rule_name,
+       COALESCE(l.user_id, 'unknown') AS user_id, COUNT(*) AS alert_count
+FROM unified_alerts u
+LEFT JOIN logs l ON l.id = u.log_id
+GROUP BY 1, 2, 3, 4, 5;
+CREATE UNIQUE INDEX uq_alert_summary ON alert_summary(hour, type, severity, rule_name, user_id);
+
 -- Add some default rules to get started
 INSERT INTO rules (name, description, target_field, operator, value) VALUES
 ('Unauthorized Access Attempt', 'Flags any log entry where the status is ''unauthorized''.', 'status', '=', 'unauthorized'),
-('Admin Action on Sensitive DB', 'Flags actions by admins on sensitive databases.', 'user_id', 'LIKE', 'admin%'),
-('Multiple Failed Logins', 'Flags users with 3 or more failed login attempts.', 'action', '=', 'failed_login')
+('Admin Action on Sensitive DB', 'Flags actions by admins on sensitive databases.', 'user_id', 'LIKE', 'admin%')
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO rules (name, description, target_field, operator, value,
+                   rule_type, group_by_field, aggregate, window_type, window_seconds, threshold) VALUES
+('Multiple Failed Logins', 'Flags users with 3 or more failed login attempts within 15 minutes.', 'action', '=', 'failed_login',
+ 'window', 'user_id', 'count', 'sliding', 900, 3)
 ON CONFLICT (name) DO NOTHING;
 
 -- Indexes for performance
-CREATE INDEX idx_logs_timestamp ON logs(timestamp);
-CREATE INDEX idx_alerts_timestamp ON alerts(timestamp);
-CREATE INDEX idx_anomalies_timestamp ON anomalies(timestamp);
+-- (timestamp, id) serves time-range scans and keyset pagination of the dashboard;
+-- alerts and anomalies are paged separately, each on its own index
+CREATE INDEX idx_logs_timestamp_id ON logs(timestamp, id);
+CREATE INDEX idx_alerts_timestamp_id ON alerts(timestamp, id);
+CREATE INDEX idx_anomalies_timestamp_id ON anomalies(timestamp, id);
+-- Incremental anomaly detection replaces anomalies by log_id
+CREATE INDEX idx_anomalies_log_id ON anomalies(log_id);
 CREATE INDEX idx_logs_user_id ON logs(user_id);
 CREATE INDEX idx_logs_action ON logs(action);
 CREATE INDEX idx_logs_status ON logs(status);
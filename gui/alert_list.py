@@ -0,0 +1,241 @@
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter, QPainterPath, QPen
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, QVariant
+
+from db import get_unified_alerts_page
+from gui.alert_card import AlertCard
+
+# Field order of the compact tuples kept by AlertListModel
+ALERT_FIELDS = ('id', 'timestamp', 'title', 'description', 'type', 'severity')
+# Unified id prefix ('rule-<n>' / 'ml-<n>') -> the source table the id counts in
+ALERT_SOURCES = {'rule': 'alerts', 'ml': 'anomalies'}
+
+class AlertListModel(QAbstractListModel):
+    """
+    A list model of unified alerts, stored as compact tuples.
+
+    The display role returns the description; AlertRole returns the whole
+    tuple (ordered like ALERT_FIELDS) for AlertCardDelegate to paint. Older
+    alerts are fetched a page at a time from the 'unified_alerts' view as
+    the view scrolls (canFetchMore/fetchMore). An alert whose id is already
+    in the list is never added twice, so alerts that committed late can be
+    fetched again by delta refreshes.
+    """
+    AlertRole = Qt.UserRole + 1
+    RECENT_ID_WINDOW = 10000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._alerts = []
+        self._ids = set()
+        self._newest = {'alerts': 0, 'anomalies': 0}
+        self._next_cursor = None
+        self._until = None
+
+    def _add_new(self, alerts):
+        """Returns the compact tuples of the alerts not in the list yet, and records their ids."""
+        added = []
+        for alert in alerts:
+            if alert['id'] not in self._ids:
+                self._ids.add(alert['id'])
+                added.append(tuple(alert[field] for field in ALERT_FIELDS))
+        return added
+
+    def recent_ids(self):
+        """Returns the ids shown within RECENT_ID_WINDOW of the newest id of each source."""
+        recent = set()
+        for alert_id in self._ids:
+            prefix, _, number = alert_id.partition('-')
+            if int(number) > self._newest[ALERT_SOURCES[prefix]] - self.RECENT_ID_WINDOW:
+                recent.add(alert_id)
+        return frozenset(recent)
+
+    def set_alerts(self, alerts, next_cursor=None, until=None):
+        """
+        Replaces the model's contents.
+
+        Args:
+            alerts (list): Alert dictionaries, e.g. the first page from get_unified_alerts_page().
+            next_cursor (dict, optional): The cursor of the following page, if there is one.
+            until (dict, optional): The id bounds the first page was read with.
+        """
+        self.beginResetModel()
+        self._ids = set()
+        self._alerts = self._add_new(alerts)
+        self._newest = {key: (until or {}).get(key, 0) for key in ALERT_SOURCES.values()}
+        self._next_cursor = next_cursor
+        self._until = until
+        self.endResetModel()
+
+    def prepend_alerts(self, alerts, newest=None):
+        """
+        Inserts alerts that arrived since the last refresh at the top of the list.
+
+        Alerts already in the list are skipped.
+
+        Args:
+            alerts (list): Alert dictionaries, newest first.
+            newest (dict, optional): The newest 'alerts' and 'anomalies' ids they were read up to.
+        """
+        for key in ALERT_SOURCES.values():
+            self._newest[key] = max(self._newest[key], (newest or {}).get(key, 0))
+        rows = self._add_new(alerts)
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._alerts[:0] = rows
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._alerts)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._next_cursor is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Reads the next page of older alerts and appends it to the model."""
+        if not self.canFetchMore(parent):
+            return
+
+        alerts, self._next_cursor = get_unified_alerts_page(after=self._next_cursor, until=self._until)
+        # A late alert may already have been prepended by a delta refresh
+        rows = self._add_new(alerts)
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._alerts), len(self._alerts) + len(rows) - 1)
+        self._alerts.extend(rows)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._alerts):
+            return QVariant()
+
+        alert = self._alerts[index.row()]
+        if role == self.AlertRole:
+            return alert
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return alert[ALERT_FIELDS.index('description')]
+        return QVariant()
+
+class AlertCardDelegate(QStyledItemDelegate):
+    """
+    Paints an alert with the look of an AlertCard, without creating any widgets.
+
+    Every card has the same height (the description is elided to two lines),
+    so the view can lay out any number of alerts without measuring them.
+    """
+    MARGIN = 10
+    SPACING = 5
+    CARD_GAP = 10
+    BORDER_WIDTH = 5
+    DESCRIPTION_LINES = 2
+    CARD_BACKGROUND = QColor("#2e2e4f")
+    BADGE_BACKGROUND = QColor("#1a1a2e")
+    TEXT_COLOR = QColor("#f0f0f0")
+    FOOTER_COLOR = QColor("#808080")
+
+    def _fonts(self, option):
+        body_font = QFont(option.font)
+        body_font.setPixelSize(14)
+        header_font = QFont(body_font)
+        header_font.setBold(True)
+        badge_font = QFont(option.font)
+        badge_font.setPixelSize(11)
+        return header_font, body_font, badge_font
+
+    def sizeHint(self, option, index):
+        header_font, body_font, _ = self._fonts(option)
+        line_height = QFontMetrics(body_font).height()
+        height = (
+            2 * self.MARGIN + QFontMetrics(header_font).height()
+            + self.DESCRIPTION_LINES * line_height + line_height
+            + 2 * self.SPACING + self.CARD_GAP
+        )
+        return QSize(option.rect.width(), height)
+
+    def paint(self, painter, option, index):
+        alert = index.data(AlertListModel.AlertRole)
+        if not alert:
+            return
+        alert_id, timestamp, title, description, alert_type, severity = alert
+        header_font, body_font, badge_font = self._fonts(option)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        # --- Card background with the severity-coloured left border ---
+        card = QRectF(option.rect.adjusted(0, 0, 0, -self.CARD_GAP))
+        path = QPainterPath()
+        path.addRoundedRect(card, 5, 5)
+        painter.fillPath(path, self.CARD_BACKGROUND.lighter(115) if option.state & QStyle.State_Selected
+                         else self.CARD_BACKGROUND)
+        painter.setClipPath(path)
+        painter.fillRect(QRectF(card.left(), card.top(), self.BORDER_WIDTH, card.height()),
+                         QColor(AlertCard.SEVERITY_COLORS.get(severity, "#ffffff")))
+        painter.setClipping(False)
+
+        content = card.toRect().adjusted(self.MARGIN + self.BORDER_WIDTH, self.MARGIN, -self.MARGIN, -self.MARGIN)
+
+        # --- Header: severity on the left, type badge on the right ---
+        header_height = QFontMetrics(header_font).height()
+        painter.setFont(badge_font)
+        badge_metrics = QFontMetrics(badge_font)
+        badge_width = badge_metrics.horizontalAdvance(alert_type) + 10
+        badge = QRect(content.right() - badge_width, content.top(), badge_width, header_height)
+        badge_path = QPainterPath()
+        badge_path.addRoundedRect(QRectF(badge), 3, 3)
+        painter.fillPath(badge_path, self.BADGE_BACKGROUND)
+        painter.setPen(QPen(self.TEXT_COLOR))
+        painter.drawText(badge, Qt.AlignCenter, alert_type)
+
+        painter.setFont(header_font)
+        painter.drawText(QRect(content.left(), content.top(), content.width() - badge_width, header_height),
+                         Qt.AlignLeft | Qt.AlignVCenter, f"▲ {severity} Severity")
+
+        # --- Body: description elided to a fixed number of lines ---
+        painter.setFont(body_font)
+        body_metrics = QFontMetrics(body_font)
+        line_height = body_metrics.height()
+        top = content.top() + header_height + self.SPACING
+        lines = self._wrap(str(description or ""), body_metrics, content.width())
+        for line in lines:
+            painter.drawText(QRect(content.left(), top, content.width(), line_height),
+                             Qt.AlignLeft | Qt.AlignVCenter, line)
+            top += line_height
+
+        # --- Footer ---
+        painter.setPen(QPen(self.FOOTER_COLOR))
+        footer_top = content.top() + header_height + self.DESCRIPTION_LINES * line_height + 2 * self.SPACING
+        painter.drawText(QRect(content.left(), footer_top, content.width(), line_height),
+                         Qt.AlignLeft | Qt.AlignVCenter,
+                         body_metrics.elidedText(f"{timestamp} | Log ID: {alert_id}", Qt.ElideRight, content.width()))
+        painter.restore()
+
+    def _wrap(self, text, metrics, width):
+        """Word-wraps text into at most DESCRIPTION_LINES lines, eliding the last one."""
+        lines = []
+        remaining = " ".join(text.split())
+        while remaining and len(lines) < self.DESCRIPTION_LINES - 1:
+            words = remaining.split(" ")
+            line = words[0]
+            for word in words[1:]:
+                if metrics.horizontalAdvance(f"{line} {word}") > width:
+                    break
+                line = f"{line} {word}"
+            lines.append(metrics.elidedText(line, Qt.ElideRight, width))
+            remaining = remaining[len(line):].lstrip()
+        if remaining:
+            lines.append(metrics.elidedText(remaining, Qt.ElideRight, width))
+        return lines
+
+class AlertListView(QListView):
+    """A list view that shows AlertListModel rows as alert cards."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setItemDelegate(AlertCardDelegate(self))
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setObjectName("AlertList")
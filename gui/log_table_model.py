@@ -0,0 +1,172 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+
+from db.data_unifier import get_latest_ids, get_logs_page, get_new_logs
+
+class LogTableModel(QAbstractTableModel):
+    """
+    A read-only table model over the 'logs' table that loads rows lazily.
+
+    Rows are read a block at a time with keyset queries (get_logs_page), each a
+    short transaction on a pooled connection, so opening the model costs the
+    same no matter how many logs exist and no snapshot stays open while the
+    view is shown. The view pulls blocks with canFetchMore/fetchMore as the
+    user scrolls, and only the most recently used blocks are kept in memory;
+    the (timestamp, id) cursor each block starts after is remembered, so a
+    block that was evicted is re-read with one index range scan.
+
+    Logs with ids above the newest one at open are not paged; they can be
+    prepended with prepend_rows() and are kept in memory above the paged rows.
+    The ids of the newest RECENT_ID_WINDOW logs shown are remembered, so logs
+    that committed late with lower ids can be fetched again without duplicates.
+    """
+    HEADERS = ["Status", "Timestamp", "User", "Source IP", "Action"]
+    BLOCK_SIZE = 500
+    MAX_CACHED_BLOCKS = 20
+    RECENT_ID_WINDOW = 10000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._blocks = OrderedDict()  # block number -> list of row tuples, least recently used first
+        self._block_starts = [None]  # block number -> keyset cursor the block starts after
+        self._head = []  # Prepended rows, newest first
+        self._row_count = 0
+        self._exhausted = True
+        self._max_id = 0  # The newest log id paged
+        self._newest_id = 0
+        self._recent_ids = set()  # Ids shown within RECENT_ID_WINDOW of _newest_id
+
+    @classmethod
+    def open_snapshot(cls, max_id=None):
+        """
+        Reads the first block of logs and the recent ids.
+
+        Touches no Qt objects, so it can run on a worker thread; the result is
+        handed to install() on the GUI thread. No connection is kept open.
+
+        Args:
+            max_id (int, optional): Only logs with ids up to this one, so that later
+                logs can be prepended without being shown twice.
+
+        Returns:
+            tuple: (first_rows, next_cursor, max_id, recent_ids), or None if the
+            logs could not be read.
+        """
+        if max_id is None:
+            latest = get_latest_ids()
+            if latest is None:
+                return None
+            max_id = latest['logs']
+        recent_ids = {row[0] for row in get_new_logs(max_id - cls.RECENT_ID_WINDOW, max_id)}
+        rows, next_cursor = get_logs_page(cls.BLOCK_SIZE, max_id=max_id)
+        return [tuple(str(field) for field in row) for row in rows], next_cursor, max_id, recent_ids
+
+    def install(self, snapshot):
+        """Replaces the model's rows with a snapshot from open_snapshot() and resets the view."""
+        self.beginResetModel()
+        self._blocks.clear()
+        self._block_starts = [None]
+        self._head = []
+        self._row_count = 0
+        self._exhausted = True
+        self._max_id = 0
+        self._newest_id = 0
+        self._recent_ids = set()
+
+        if snapshot:
+            rows, next_cursor, self._max_id, self._recent_ids = snapshot
+            self._newest_id = self._max_id
+            self._blocks[0] = rows
+            self._block_starts.append(next_cursor)
+            self._row_count = len(rows)
+            self._exhausted = next_cursor is None
+        self.endResetModel()
+
+    def open(self):
+        """(Re)reads the logs table and resets the model to its first rows."""
+        self.install(self.open_snapshot())
+
+    def recent_ids(self):
+        """Returns the ids shown within RECENT_ID_WINDOW of the newest one, for delta refreshes."""
+        return frozenset(self._recent_ids)
+
+    def prepend_rows(self, rows, newest_id=None):
+        """
+        Inserts logs that arrived since the last refresh at the top of the table.
+
+        Logs whose ids are already shown are skipped.
+
+        Args:
+            rows (list): (id, status, timestamp, user_id, resource, action) tuples, newest first.
+            newest_id (int, optional): The newest log id the rows were read up to.
+        """
+        rows = [row for row in rows if row[0] not in self._recent_ids]
+        self._newest_id = max([self._newest_id, newest_id or 0, *(row[0] for row in rows)])
+        floor = self._newest_id - self.RECENT_ID_WINDOW
+        self._recent_ids = {log_id for log_id in self._recent_ids if log_id > floor}
+        self._recent_ids.update(row[0] for row in rows if row[0] > floor)
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._head[:0] = [tuple(str(field) for field in row[1:]) for row in rows]
+        self.endInsertRows()
+
+    def _read_block(self, block):
+        """Reads one block of rows with a keyset query, remembering where the next block starts."""
+        rows, next_cursor = get_logs_page(self.BLOCK_SIZE, after=self._block_starts[block], max_id=self._max_id)
+        if block + 1 == len(self._block_starts):
+            self._block_starts.append(next_cursor)
+
+        self._blocks[block] = [tuple(str(field) for field in row) for row in rows]
+        while len(self._blocks) > self.MAX_CACHED_BLOCKS:
+            self._blocks.popitem(last=False)
+        return self._blocks[block]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._head) + self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return QVariant()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return QVariant()
+
+        row = index.row()
+        if row < len(self._head):
+            return self._head[row][index.column()]
+
+        block, offset = divmod(row - len(self._head), self.BLOCK_SIZE)
+        rows = self._blocks.get(block)
+        if rows is None:
+            if block >= len(self._block_starts):
+                return QVariant()
+            rows = self._read_block(block)
+        else:
+            self._blocks.move_to_end(block)
+        return rows[offset][index.column()] if offset < len(rows) else QVariant()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Reads the next block of logs and appends it to the model."""
+        if not self.canFetchMore(parent):
+            return
+
+        block = self._row_count // self.BLOCK_SIZE
+        rows = self._read_block(block)
+        self._exhausted = self._block_starts[block + 1] is None
+        if not rows:
+            return
+
+        first = len(self._head) + self._row_count
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._row_count += len(rows)
+        self.endInsertRows()
@@ -1,13 +1,16 @@
 import sys
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
-    QLabel, QTableView, QSplitter, QFrame, QHeaderView, QScrollArea, QPushButton
+    QLabel, QTableView, QSplitter, QFrame, QHeaderView, QPushButton, QProgressBar, QCheckBox
 )
-from PyQt5.QtGui import QStandardItemModel, QStandardItem
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer
 
-from db import get_all_logs, get_unified_alerts
-from gui.alert_card import AlertCard
+from gui.alert_list import AlertListModel, AlertListView
+from gui.log_table_model import LogTableModel
+from gui.refresh_worker import ERROR_PREFIX, RefreshWorker
+from gui.summary_panel import SummaryPanel
+
+AUTO_REFRESH_INTERVAL_MS = 10000
 
 
 class MainWindow(QMainWindow):
@@ -44,9 +47,27 @@ class MainWindow(QMainWindow):
 
         self.refresh_button = QPushButton("⟳ Refresh")
         self.refresh_button.setFixedWidth(120)
+        self.full_refresh_button = QPushButton("Reload All")
+        self.auto_refresh_checkbox = QCheckBox("Auto-refresh")
+
+        # Loading state, shown while a refresh runs in the background
+        self.status_label = QLabel("")
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)  # Indeterminate progress bar
+        self.progress_bar.setFixedWidth(120)
+        self.progress_bar.setVisible(False)
+
+        # Alert counts, read from the alert_summary materialized view
+        self.summary_panel = SummaryPanel()
 
         header_layout.addWidget(title)
+        header_layout.addSpacing(20)
+        header_layout.addWidget(self.summary_panel)
         header_layout.addStretch()
+        header_layout.addWidget(self.status_label)
+        header_layout.addWidget(self.progress_bar)
+        header_layout.addWidget(self.auto_refresh_checkbox)
+        header_layout.addWidget(self.full_refresh_button)
         header_layout.addWidget(self.refresh_button)
         main_layout.addWidget(header)
 
@@ -62,8 +83,9 @@ class MainWindow(QMainWindow):
         logs_layout = QVBoxLayout(logs_container)
         logs_layout.addWidget(QLabel("Real-Time Access Logs"))
         self.logs_table = QTableView()
-        self.logs_model = QStandardItemModel()
+        self.logs_model = LogTableModel(self)
         self.logs_table.setModel(self.logs_model)
+        self.logs_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         logs_layout.addWidget(self.logs_table)
 
         # --- Right Pane: Security Alerts ---
@@ -71,18 +93,15 @@ class MainWindow(QMainWindow):
         alerts_container_layout = QVBoxLayout(alerts_container)
         alerts_container_layout.addWidget(QLabel("Security Alerts"))
 
-        # Scroll Area for alert cards
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        # Alert list; cards are painted by a delegate only for the visible rows
+        self.alerts_model = AlertListModel(self)
+        self.alerts_view = AlertListView()
+        self.alerts_view.setModel(self.alerts_model)
+        self.no_alerts_label = QLabel("No security alerts found.")
+        self.no_alerts_label.setVisible(False)
 
-        self.scroll_content = QWidget()
-        self.alerts_layout = QVBoxLayout(self.scroll_content)
-        self.alerts_layout.setAlignment(Qt.AlignTop)
-        self.alerts_layout.setSpacing(10)
-
-        self.scroll_area.setWidget(self.scroll_content)
-        alerts_container_layout.addWidget(self.scroll_area)
+        alerts_container_layout.addWidget(self.no_alerts_label)
+        alerts_container_layout.addWidget(self.alerts_view)
 
         splitter.addWidget(logs_container)
         splitter.addWidget(alerts_container)
@@ -91,56 +110,134 @@ class MainWindow(QMainWindow):
         body_layout.addWidget(splitter)
         main_layout.addWidget(body_widget)
 
+        # Background refreshes by generation; only the latest one updates the views
+        self.refresh_generation = 0
+        self.refresh_threads = {}
+        # Set when the latest refresh reported an error, whose message then stays shown
+        self.refresh_failed = False
+        # Newest ids shown per source; None means that view must be reloaded in full
+        self.shown_ids = {'logs': None, 'alerts': None, 'anomalies': None}
+
+        self.auto_refresh_timer = QTimer(self)
+        self.auto_refresh_timer.setInterval(AUTO_REFRESH_INTERVAL_MS)
+
         self.connect_signals()
         self.load_initial_data()
 
     def connect_signals(self):
         """Connects signals to slots."""
-        self.refresh_button.clicked.connect(self.load_initial_data)
+        self.refresh_button.clicked.connect(self.refresh)
+        self.full_refresh_button.clicked.connect(self.load_initial_data)
+        self.auto_refresh_checkbox.toggled.connect(self.toggle_auto_refresh)
+        self.auto_refresh_timer.timeout.connect(self.on_auto_refresh)
 
     def load_initial_data(self):
-        """Loads all necessary data on startup."""
+        """Reloads every view from scratch."""
         print("Refreshing all data...")
-        self.load_logs_into_table()
-        self.load_alerts_into_cards()
-
-    def load_logs_into_table(self):
-        """Fetches all logs and populates the left-hand table."""
-        self.logs_model.clear()
-        headers = ["Status", "Timestamp", "User", "Source IP", "Action"]
-        self.logs_model.setHorizontalHeaderLabels(headers)
-
-        logs_data = get_all_logs()
-        for row_data in logs_data:
-            items = [QStandardItem(str(field)) for field in row_data]
-            self.logs_model.appendRow(items)
-
-        self.logs_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.logs_table.resizeColumnsToContents()
-
-    def load_alerts_into_cards(self):
-        """Fetches unified alerts and populates the right-hand panel with AlertCard widgets."""
-        # Clear existing cards
-        for i in reversed(range(self.alerts_layout.count())):
-            widget = self.alerts_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
-
-        unified_alerts = get_unified_alerts()
+        self.start_refresh(since=None)
+
+    def refresh(self):
+        """Loads only the logs and alerts not shown yet."""
+        seen = {'logs': self.logs_model.recent_ids(), 'alerts': self.alerts_model.recent_ids()}
+        self.start_refresh(since=dict(self.shown_ids), seen=seen)
+
+    def toggle_auto_refresh(self, enabled):
+        if enabled:
+            self.auto_refresh_timer.start()
+        else:
+            self.auto_refresh_timer.stop()
+
+    def on_auto_refresh(self):
+        # Skip a tick rather than superseding a refresh that is still running
+        if not self.refresh_threads:
+            self.refresh()
+
+    def start_refresh(self, since, seen=None):
+        """Starts loading data on a worker thread, superseding any refresh in progress."""
+        for thread, worker in self.refresh_threads.values():
+            worker.cancel()
+
+        self.refresh_generation += 1
+        generation = self.refresh_generation
+
+        thread = QThread()
+        worker = RefreshWorker(generation, since, seen)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self.on_refresh_progress)
+        worker.logs_ready.connect(self.on_logs_ready)
+        worker.logs_added.connect(self.on_logs_added)
+        worker.alerts_ready.connect(self.on_alerts_ready)
+        worker.alerts_added.connect(self.on_alerts_added)
+        worker.summary_ready.connect(self.on_summary_ready)
+        worker.finished.connect(self.on_refresh_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(lambda: self.refresh_threads.pop(generation, None))
+
+        self.refresh_threads[generation] = (thread, worker)
+        self.refresh_failed = False
+        self.set_loading("Refreshing...", is_busy=True)
+        thread.start()
+
+    def set_loading(self, message, is_busy=False):
+        """Updates the header's status label and busy indicator."""
+        self.status_label.setText(message)
+        self.progress_bar.setVisible(is_busy)
+
+    def on_refresh_progress(self, generation, message):
+        if generation == self.refresh_generation:
+            self.refresh_failed = message.startswith(ERROR_PREFIX)
+            self.set_loading(message, is_busy=not self.refresh_failed)
+
+    def on_refresh_finished(self, generation):
+        if generation == self.refresh_generation:
+            # Keep an error visible until the next refresh starts
+            self.set_loading(self.status_label.text() if self.refresh_failed else "")
+
+    def on_logs_ready(self, generation, snapshot, newest_log_id):
+        """Shows the first block of logs; later blocks are fetched as the table scrolls."""
+        if generation != self.refresh_generation:
+            return
+        self.logs_model.install(snapshot)
+        self.shown_ids['logs'] = newest_log_id if snapshot else None
 
-        if not unified_alerts:
-            self.alerts_layout.addWidget(QLabel("No security alerts found."))
+    def on_logs_added(self, generation, rows, newest_log_id):
+        """Prepends the logs that arrived since the last refresh."""
+        if generation != self.refresh_generation:
             return
+        self.logs_model.prepend_rows(rows, newest_log_id)
+        self.shown_ids['logs'] = newest_log_id
 
-        for alert_data in unified_alerts:
-            card = AlertCard(
-                severity=alert_data['severity'],
-                alert_type=alert_data['type'],
-                description=alert_data['description'],
-                timestamp=str(alert_data['timestamp']),
-                log_id=alert_data['id']
-            )
-            self.alerts_layout.addWidget(card)
+    def on_alerts_ready(self, generation, unified_alerts, latest_ids, next_cursor):
+        """Shows the first page of unified alerts as cards; older pages load as the list scrolls."""
+        if generation != self.refresh_generation:
+            return
+        self.alerts_model.set_alerts(unified_alerts, next_cursor, latest_ids)
+        self.no_alerts_label.setVisible(not unified_alerts)
+        self.shown_ids['alerts'] = latest_ids['alerts']
+        self.shown_ids['anomalies'] = latest_ids['anomalies']
+
+    def on_alerts_added(self, generation, unified_alerts, latest_ids):
+        """Prepends the alerts and anomalies raised since the last refresh."""
+        if generation != self.refresh_generation:
+            return
+        self.alerts_model.prepend_alerts(unified_alerts, latest_ids)
+        self.no_alerts_label.setVisible(self.alerts_model.rowCount() == 0)
+        self.shown_ids['alerts'] = latest_ids['alerts']
+        self.shown_ids['anomalies'] = latest_ids['anomalies']
+
+    def on_summary_ready(self, generation, summary):
+        if generation == self.refresh_generation:
+            self.summary_panel.set_summary(summary)
+
+    def closeEvent(self, event):
+        """Stops any refresh in progress."""
+        self.auto_refresh_timer.stop()
+        for thread, worker in list(self.refresh_threads.values()):
+            worker.cancel()
+            thread.quit()
+            thread.wait()
+        super().closeEvent(event)
 
 def main():
     """Main function to run the application."""
@@ -0,0 +1,121 @@
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from db import (
+    get_latest_ids, get_new_logs, get_unified_alerts, get_unified_alerts_page, get_alert_summary
+)
+from gui.alert_list import AlertListModel
+from gui.log_table_model import LogTableModel
+
+# Progress messages starting with this report a failed refresh
+ERROR_PREFIX = "An error occurred"
+
+class RefreshWorker(QObject):
+    """
+    A worker object that loads the dashboard data in a separate thread.
+
+    Results are delivered as soon as each part is ready, tagged with the
+    generation of the refresh that requested them so the window can ignore
+    results from a refresh that has since been superseded. Each result also
+    carries the newest ids it covers, for the next delta refresh.
+
+    Ids are handed out before their rows commit, so a row can commit after a
+    newer id was already shown. Delta refreshes therefore re-read a trailing
+    window of ids below the newest one shown and skip the ids already shown.
+    """
+    finished = pyqtSignal(int)
+    progress = pyqtSignal(int, str)
+    logs_ready = pyqtSignal(int, object, int)             # Full refresh: a LogTableModel snapshot
+    logs_added = pyqtSignal(int, list, int)               # Delta refresh: the new log rows
+    alerts_ready = pyqtSignal(int, list, object, object)  # Full refresh: the first page and its cursor
+    alerts_added = pyqtSignal(int, list, object)          # Delta refresh: the new unified alerts
+    summary_ready = pyqtSignal(int, object)               # The alert counts, when they changed
+
+    def __init__(self, generation, since=None, seen=None, parent=None):
+        """
+        Args:
+            generation (int): The refresh this worker belongs to.
+            since (dict, optional): The newest 'logs', 'alerts' and 'anomalies' ids already
+                shown. Only newer rows are loaded; a part whose id is None is reloaded in full.
+            seen (dict, optional): The 'logs' and 'alerts' ids already shown within the
+                models' RECENT_ID_WINDOW, which delta refreshes leave out.
+        """
+        super().__init__(parent)
+        self.generation = generation
+        self.since = since
+        self.seen = seen or {}
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Asks the worker to stop; results not yet delivered are dropped."""
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        """
+        The main entry point for the worker's task.
+        This method will be executed in a separate thread.
+        """
+        try:
+            latest = get_latest_ids()
+            if latest is None or self.is_cancelled():
+                return
+            since = self.since or {}
+            delta_logs = since.get('logs') is not None and since['logs'] <= latest['logs']
+            # A new ML run replaces the whole anomalies table, so the anomalies shown may be gone
+            anomalies_replaced = bool(since.get('anomalies')) and (
+                latest['oldest_anomaly'] == 0 or latest['oldest_anomaly'] > since['anomalies']
+            )
+            delta_alerts = (
+                since.get('alerts') is not None and since['alerts'] <= latest['alerts']
+                and not anomalies_replaced
+            )
+
+            self.progress.emit(self.generation, "Loading logs...")
+            if not delta_logs:
+                snapshot = LogTableModel.open_snapshot(max_id=latest['logs'])
+                if self.is_cancelled():
+                    return
+                self.logs_ready.emit(self.generation, snapshot, latest['logs'])
+            else:
+                window_start = max(since['logs'] - LogTableModel.RECENT_ID_WINDOW, 0)
+                rows = get_new_logs(window_start, latest['logs'], self.seen.get('logs', ()))
+                if self.is_cancelled():
+                    return
+                if rows or latest['logs'] > since['logs']:
+                    self.logs_added.emit(self.generation, rows, latest['logs'])
+
+            self.progress.emit(self.generation, "Loading alerts...")
+            if not delta_alerts:
+                alerts, next_cursor = get_unified_alerts_page(until=latest)
+                if self.is_cancelled():
+                    return
+                self.alerts_ready.emit(self.generation, alerts, latest, next_cursor)
+            else:
+                window_start = {
+                    key: max(since[key] - AlertListModel.RECENT_ID_WINDOW, 0) for key in ('alerts', 'anomalies')
+                }
+                alerts = get_unified_alerts(since=window_start, until=latest,
+                                            exclude_ids=self.seen.get('alerts', ()))
+                if self.is_cancelled():
+                    return
+                if alerts or latest['alerts'] > since['alerts'] or latest['anomalies'] > since['anomalies']:
+                    self.alerts_added.emit(self.generation, alerts, latest)
+
+            # The writers refresh the summary view after storing alerts; reading it costs
+            # the same however many alerts exist, and it may have been refreshed since
+            # the ids were last read, so it is read on every refresh
+            self.progress.emit(self.generation, "Loading summary...")
+            summary = get_alert_summary()
+            if self.is_cancelled():
+                return
+            self.summary_ready.emit(self.generation, summary)
+        except Exception as e:
+            # Report any errors back to the user via the progress signal
+            self.progress.emit(self.generation, f"{ERROR_PREFIX}: {e}")
+        finally:
+            # Signal that the worker has finished its job
+            self.finished.emit(self.generation)
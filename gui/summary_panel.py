@@ -0,0 +1,58 @@
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel
+
+from gui.alert_card import AlertCard
+
+class SummaryPanel(QWidget):
+    """
+    A compact row of alert counts for the dashboard header.
+    Shows the totals from get_alert_summary() without loading any alerts.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("SummaryPanel")
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(15)
+
+        self.total_label = QLabel()
+        self.severity_labels = {}
+        layout.addWidget(self.total_label)
+        for severity in ("High", "Medium", "Low"):
+            label = QLabel()
+            label.setStyleSheet(f"color: {AlertCard.SEVERITY_COLORS[severity]};")
+            self.severity_labels[severity] = label
+            layout.addWidget(label)
+        self.top_rule_label = QLabel()
+        self.top_user_label = QLabel()
+        self.last_hour_label = QLabel()
+        layout.addWidget(self.top_rule_label)
+        layout.addWidget(self.top_user_label)
+        layout.addWidget(self.last_hour_label)
+
+        self.set_summary(None)
+
+    def set_summary(self, summary):
+        """
+        Updates the counts shown.
+
+        Args:
+            summary (dict): As returned by get_alert_summary(), or None while nothing is loaded.
+        """
+        summary = summary or {}
+        self.total_label.setText(f"Alerts: {summary.get('total', 0)}")
+        by_severity = summary.get('by_severity', {})
+        for severity, label in self.severity_labels.items():
+            label.setText(f"▲ {severity}: {by_severity.get(severity, 0)}")
+
+        by_rule = summary.get('by_rule') or [("-", 0)]
+        by_user = summary.get('by_user') or [("-", 0)]
+        by_hour = summary.get('by_hour') or [(None, 0)]
+        self.top_rule_label.setText(f"Top rule: {by_rule[0][0]} ({by_rule[0][1]})")
+        self.top_user_label.setText(f"Top user: {by_user[0][0]} ({by_user[0][1]})")
+        self.last_hour_label.setText(f"Latest hour: {by_hour[-1][1]}")
+
+        self.setToolTip("\n".join(
+            [f"{name}: {count}" for name, count in summary.get('by_rule', [])]
+            + [f"{hour:%Y-%m-%d %H:00}: {count}" for hour, count in summary.get('by_hour', [])]
+        ))
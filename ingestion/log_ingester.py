@@ -1,5 +1,145 @@
+import argparse
 import csv
+import functools
+import glob
+import io
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import psycopg2
+
 from db.database import get_db_connection
+from db.data_unifier import refresh_alert_summary
+from db.partitions import ensure_partitions, is_partitioned, months_for_rows
+from ingestion.readers import LOG_COLUMNS, extract_rows, get_reader, has_required_values, iter_log_batches, read_csv
+from rules.rule_engine import compile_active_rules, insert_alerts
+
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_SPLIT_BYTES = 16 * 1024 * 1024
+DEFAULT_FOLLOW_BATCH_SIZE = 500
+MAX_FOLLOW_RETRY_DELAY = 30.0
+SUMMARY_REFRESH_INTERVAL = 30.0  # Least seconds between alert summary refreshes while following
+
+COPY_LOGS_SQL = "COPY logs (timestamp, user_id, action, resource, status) FROM STDIN"
+COPY_LOGS_WITH_IDS_SQL = "COPY logs (id, timestamp, user_id, action, resource, status) FROM STDIN"
+TIMESTAMP_POSITION = LOG_COLUMNS.index('timestamp')
+# Errors caused by the rows themselves; retrying the same rows can never succeed
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+def _is_valid_row(row):
+    """Basic data validation: a row must provide every log column and a value for the required ones."""
+    return all(k in row for k in LOG_COLUMNS) and has_required_values(tuple(row[k] for k in LOG_COLUMNS))
+
+def _copy_value(value):
+    """Escapes a single value for PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+def _format_copy_rows(rows):
+    """Serializes log tuples into a COPY text-format payload."""
+    return ''.join('\t'.join(_copy_value(value) for value in row) + '\n' for row in rows)
+
+def _serialize_batch(rows):
+    """Prepares a batch for a writer: its row count, the months it covers and its COPY payload."""
+    return len(rows), months_for_rows(rows, TIMESTAMP_POSITION), _format_copy_rows(rows)
+
+def _ensure_partitions(cur, rows):
+    """Creates the monthly partitions a batch needs when the schema is partitioned."""
+    if is_partitioned(cur):
+        ensure_partitions(cur, months_for_rows(rows, TIMESTAMP_POSITION))
+
+def _copy_rows(cur, rows):
+    """
+    Streams a batch of log tuples into the 'logs' table with COPY FROM STDIN.
+
+    Args:
+        cur: An open psycopg2 cursor.
+        rows (list): Tuples ordered like LOG_COLUMNS.
+    """
+    _ensure_partitions(cur, rows)
+    cur.copy_expert(COPY_LOGS_SQL, io.StringIO(_format_copy_rows(rows)))
+
+def _copy_rows_with_alerts(cur, rows, rule_set):
+    """
+    Copies a batch of log tuples into 'logs' and records the rule violations found in it.
+
+    The batch is matched in memory by the compiled rules before it is written,
+    so no scan of 'logs' is needed. When something matches (or window rules
+    need the ids to remember events), ids are reserved from the logs sequence
+    up front so the batch can still be written with COPY and its alerts can
+    reference the new rows. If the alerts cannot be stored, the window rules
+    are returned to their state before the batch.
+
+    Args:
+        cur: An open psycopg2 cursor.
+        rows (list): Tuples ordered like LOG_COLUMNS.
+        rule_set (CompiledRuleSet): The compiled active rules.
+
+    Returns:
+        int: The number of alerts generated for the batch.
+    """
+    violations = rule_set.evaluate(rows)
+    if not violations and not rule_set.window_rules:
+        _copy_rows(cur, rows)
+        return 0
+
+    _ensure_partitions(cur, rows)
+    cur.execute("SELECT nextval(pg_get_serial_sequence('logs', 'id')) FROM generate_series(1, %s)", (len(rows),))
+    log_ids = sorted(log_id for (log_id,) in cur.fetchall())
+    payload = _format_copy_rows((log_id, *row) for log_id, row in zip(log_ids, rows))
+    cur.copy_expert(COPY_LOGS_WITH_IDS_SQL, io.StringIO(payload))
+
+    user_position = LOG_COLUMNS.index('user_id')
+    alerts = [(log_ids[index], rule_id, rows[index][user_position]) for index, rule_id in violations]
+    windows = rule_set.snapshot_windows()
+    try:
+        alerts.extend(rule_set.evaluate_windows(rows, log_ids))
+        return insert_alerts(cur, [
+            (log_id, rule_id, f"User '{user_id}' triggered rule '{rule_set.rule_names[rule_id]}'")
+            for log_id, rule_id, user_id in alerts
+        ], datetime.now())
+    except Exception:
+        rule_set.restore_windows(windows)
+        raise
+
+def _write_valid_rows(cur, rows, write):
+    """
+    Writes a batch with write(cur, rows), leaving out the rows the database rejects.
+
+    The batch is written under a savepoint. If it fails with one of ROW_ERRORS
+    it is rolled back and split in halves, recursively, until the rejected rows
+    are isolated, so one bad row costs O(log n) extra writes.
+
+    Returns:
+        tuple: The sum of write()'s results (e.g. alerts generated) and the list of rejected rows.
+    """
+    cur.execute("SAVEPOINT write_batch")
+    try:
+        result = write(cur, rows) or 0
+        cur.execute("RELEASE SAVEPOINT write_batch")
+        return result, []
+    except ROW_ERRORS as e:
+        cur.execute("ROLLBACK TO SAVEPOINT write_batch")
+        cur.execute("RELEASE SAVEPOINT write_batch")
+        if len(rows) == 1:
+            print(f"Skipping row rejected by the database: {rows[0]}: {str(e).strip()}")
+            return 0, list(rows)
+    middle = len(rows) // 2
+    first, first_rejected = _write_valid_rows(cur, rows[:middle], write)
+    second, second_rejected = _write_valid_rows(cur, rows[middle:], write)
+    return first + second, first_rejected + second_rejected
 
 def ingest_logs(file_path='data/sample_logs.csv'):
     """Reads log data from a CSV file and inserts it into the database."""
@@ -11,14 +151,22 @@ def ingest_logs(file_path='data/sample_logs.csv'):
     inserted_rows = 0
     try:
         with conn.cursor() as cur:
+            partitioned = is_partitioned(cur)
+            covered_months = set()
             with open(file_path, 'r') as f:
                 reader = csv.DictReader(f)
                 for row in reader:
                     # Basic data validation
-                    if not all(k in row for k in ['timestamp', 'user_id', 'action', 'resource', 'status']):
+                    if not _is_valid_row(row):
                         print(f"Skipping malformed row: {row}")
                         continue
 
+                    if partitioned:
+                        months = months_for_rows([(row['timestamp'],)]) - covered_months
+                        if months:
+                            ensure_partitions(cur, months)
+                            covered_months |= months
+
                     cur.execute(
                         """
                         INSERT INTO logs (timestamp, user_id, action, resource, status)
@@ -36,7 +184,553 @@ def ingest_logs(file_path='data/sample_logs.csv'):
         if conn:
             conn.close()
 
+def bulk_ingest_logs(file_path='data/sample_logs.csv', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reads a log file and streams it into the database using COPY.
+
+    The file is read in batches of `batch_size` rows by the reader registered
+    for its format (CSV, gzip'd CSV, JSONL or Parquet, see ingestion.readers)
+    and each batch is sent with COPY FROM STDIN instead of one INSERT per row.
+    Malformed rows are skipped as in ingest_logs, and the file is committed as
+    a single transaction.
+
+    Args:
+        file_path (str): Path to the log file to ingest.
+        batch_size (int): The number of rows buffered per COPY call.
+
+    Returns:
+        int: The number of log entries ingested (0 on failure).
+    """
+    conn = get_db_connection()
+    if not conn:
+        print("Could not connect to the database for ingestion.")
+        return 0
+
+    inserted_rows = 0
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            for rows, _ in iter_log_batches(file_path, batch_size):
+                if rows:
+                    _copy_rows(cur, rows)
+                    inserted_rows += len(rows)
+            conn.commit()
+
+        elapsed = time.perf_counter() - start
+        rate = inserted_rows / elapsed if elapsed > 0 else 0.0
+        print(f"Successfully ingested {inserted_rows} log entries in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+        return inserted_rows
+    except Exception as e:
+        print(f"Error ingesting logs: {e}")
+        conn.rollback()  # Rollback changes on error
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+def _load_checkpoint(cur, checkpoint_key):
+    """Returns the (byte_offset, rows_ingested) recorded for a file, or (0, 0)."""
+    cur.execute(
+        "SELECT byte_offset, rows_ingested FROM ingestion_checkpoints WHERE file_path = %s",
+        (checkpoint_key,)
+    )
+    checkpoint = cur.fetchone()
+    return checkpoint if checkpoint else (0, 0)
+
+def _save_checkpoint(cur, checkpoint_key, byte_offset, rows_ingested):
+    """Records the progress of a file in the same transaction as its rows."""
+    cur.execute(
+        """
+        INSERT INTO ingestion_checkpoints (file_path, byte_offset, rows_ingested, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (file_path) DO UPDATE
+        SET byte_offset = EXCLUDED.byte_offset,
+            rows_ingested = EXCLUDED.rows_ingested,
+            updated_at = EXCLUDED.updated_at
+        """,
+        (checkpoint_key, byte_offset, rows_ingested)
+    )
+
+def stream_ingest_logs(file_path='data/sample_logs.csv', chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Streams a CSV file into the database in committed chunks, resuming after a restart.
+
+    Each chunk of `chunk_size` lines is copied into 'logs' and committed together
+    with the file's byte offset in 'ingestion_checkpoints'. A failed run therefore
+    keeps every committed chunk, and the next run continues from the last
+    checkpoint instead of starting over. Only one chunk is held in memory at a
+    time. Records must not span multiple lines.
+
+    Args:
+        file_path (str): Path to the CSV file to ingest.
+        chunk_size (int): The number of lines per committed chunk.
+
+    Returns:
+        int: The number of log entries ingested by this run.
+    """
+    conn = get_db_connection()
+    if not conn:
+        print("Could not connect to the database for ingestion.")
+        return 0
+
+    checkpoint_key = os.path.abspath(file_path)
+    inserted_rows = 0
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            byte_offset, rows_ingested = _load_checkpoint(cur, checkpoint_key)
+            if byte_offset > os.path.getsize(file_path):
+                print(f"{file_path} is smaller than its checkpoint. Restarting from the beginning.")
+                byte_offset, rows_ingested = 0, 0
+
+            with open(file_path, 'rb') as f:
+                header = next(csv.reader([f.readline().decode('utf-8')]), [])
+                if byte_offset > f.tell():
+                    print(f"Resuming {file_path} at byte {byte_offset} ({rows_ingested} rows already ingested).")
+                    f.seek(byte_offset)
+
+                while True:
+                    lines = []
+                    while len(lines) < chunk_size:
+                        line = f.readline()
+                        if not line:
+                            break
+                        lines.append(line.decode('utf-8'))
+                    if not lines:
+                        break
+
+                    rows, _ = extract_rows(header, csv.reader(lines))
+                    if rows:
+                        _copy_rows(cur, rows)
+                    inserted_rows += len(rows)
+                    rows_ingested += len(rows)
+                    _save_checkpoint(cur, checkpoint_key, f.tell(), rows_ingested)
+                    conn.commit()
+
+        elapsed = time.perf_counter() - start
+        rate = inserted_rows / elapsed if elapsed > 0 else 0.0
+        print(f"Successfully ingested {inserted_rows} log entries in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+        return inserted_rows
+    except Exception as e:
+        print(f"Error ingesting logs: {e}")
+        conn.rollback()  # Only the current chunk is lost; earlier chunks stay committed
+        return inserted_rows
+    finally:
+        if conn:
+            conn.close()
+
+def _parse_file_split(file_path, start, end, batch_size):
+    """
+    Parses the CSV lines that start within bytes [start, end) of a file.
+
+    Runs in a worker process. Rows are validated and serialized to COPY payloads
+    here so the parent process only has to hand them to a writer connection.
+
+    Returns:
+        tuple: The file path, a list of (row_count, months, payload) batches and the
+        number of skipped rows.
+    """
+    payloads = []
+    skipped = 0
+    with open(file_path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8')]), [])
+        if start > f.tell():
+            # Finish the line that straddles the split boundary; it belongs to the previous split
+            f.seek(start - 1)
+            f.readline()
+
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line.decode('utf-8'))
+            if len(lines) >= batch_size:
+                rows, bad = extract_rows(header, csv.reader(lines))
+                payloads.append(_serialize_batch(rows))
+                skipped += bad
+                lines = []
+        if lines:
+            rows, bad = extract_rows(header, csv.reader(lines))
+            payloads.append(_serialize_batch(rows))
+            skipped += bad
+    return file_path, payloads, skipped
+
+def _parse_file(file_path, batch_size):
+    """
+    Parses a whole log file with its registered reader into COPY payloads.
+
+    Runs in a worker process and is used for formats that cannot be split
+    into byte ranges (compressed, JSONL and Parquet files).
+    """
+    payloads = []
+    skipped = 0
+    for rows, bad in iter_log_batches(file_path, batch_size):
+        payloads.append(_serialize_batch(rows))
+        skipped += bad
+    return file_path, payloads, skipped
+
+def ingest_directory(path, pattern='*.csv', workers=None, writer_connections=2,
+                     batch_size=DEFAULT_BATCH_SIZE, split_bytes=DEFAULT_SPLIT_BYTES):
+    """
+    Ingests every log file in a directory (or matching a glob) in parallel.
+
+    Plain CSV files are cut into byte ranges, and every other registered format
+    is handled one file per task; either way parsing and validation run in a
+    process pool, since they are CPU bound. The resulting batches are funneled
+    through a bounded queue to a small set of writer threads, each owning one
+    database connection and committing one COPY batch at a time. A writer keeps
+    taking batches until it is told to stop, counting them as failed if its
+    connection breaks, so the parsers can never block on a full queue.
+
+    Args:
+        path (str): A directory, or a glob pattern such as 'incoming/*.csv'.
+        pattern (str): The file pattern used when `path` is a directory.
+        workers (int): The number of parser processes (defaults to the CPU count).
+        writer_connections (int): The number of concurrent writer connections.
+        batch_size (int): The number of rows per COPY batch.
+        split_bytes (int): The size of the byte range handed to one parser task; raised to
+            a file's header length when smaller, so no split lies inside the header.
+
+    Returns:
+        dict: Per-file summaries with 'ingested', 'skipped' and 'failed' rows, 'parse_errors'
+        (the number of the file's parser tasks that raised) and 'elapsed' (seconds from the
+        file's first parser task being submitted to its last batch being handled).
+    """
+    files = sorted(glob.glob(os.path.join(path, pattern) if os.path.isdir(path) else path))
+    if not files:
+        print(f"No log files found for {path}.")
+        return {}
+
+    connections = [get_db_connection() for _ in range(writer_connections)]
+    if not all(connections):
+        print("Could not connect to the database for ingestion.")
+        for conn in connections:
+            if conn:
+                conn.close()
+        return {}
+
+    start = time.perf_counter()
+    summary = {fp: {'ingested': 0, 'skipped': 0, 'failed': 0, 'parse_errors': 0, 'elapsed': 0.0} for fp in files}
+    started = {}  # file -> when its first parser task was submitted
+    summary_lock = threading.Lock()
+    batches = queue.Queue(maxsize=writer_connections * 4)
+
+    def write_batches(conn):
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            file_path, row_count, months, payload = item
+            try:
+                with conn.cursor() as cur:
+                    ensure_partitions(cur, months)
+                    cur.copy_expert(COPY_LOGS_SQL, io.StringIO(payload))
+                conn.commit()
+                outcome = 'ingested'
+            except Exception as e:
+                print(f"Error ingesting batch from {file_path}: {e}")
+                outcome = 'failed'
+                try:
+                    conn.rollback()
+                except Exception as rollback_error:
+                    print(f"Error rolling back writer connection: {rollback_error}")
+            with summary_lock:
+                summary[file_path][outcome] += row_count
+                summary[file_path]['elapsed'] = time.perf_counter() - started[file_path]
+
+    writers = [threading.Thread(target=write_batches, args=(conn,)) for conn in connections]
+    for writer in writers:
+        writer.start()
+
+    try:
+        tasks = []
+        for fp in files:
+            try:
+                reader = get_reader(fp)
+            except ValueError as e:
+                print(f"Skipping {fp}: {e}")
+                continue
+            if reader is not read_csv or fp.lower().endswith('.gz'):
+                tasks.append((_parse_file, fp, batch_size))
+                continue
+            size = os.path.getsize(fp)
+            with open(fp, 'rb') as f:
+                step = max(split_bytes, len(f.readline()), 1)
+            tasks.extend(
+                (_parse_file_split, fp, offset, min(offset + step, size), batch_size)
+                for offset in range(0, max(size, 1), step)
+            )
+
+        workers = workers or os.cpu_count() or 1
+        # Parser processes are spawned rather than forked: forking now would copy the writer
+        # threads' connections and locks into every child
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            max_in_flight = workers * 2
+            pending = {}  # future -> the file it parses
+            while tasks or pending:
+                # Keep a bounded number of parsed-but-unwritten tasks in memory
+                while tasks and len(pending) < max_in_flight:
+                    task = tasks.pop(0)
+                    with summary_lock:
+                        started.setdefault(task[1], time.perf_counter())
+                    pending[pool.submit(*task)] = task[1]
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_file = pending.pop(future)
+                    try:
+                        file_path, payloads, skipped = future.result()
+                    except Exception as e:
+                        print(f"Error parsing {task_file}: {e}")
+                        with summary_lock:
+                            summary[task_file]['parse_errors'] += 1
+                            summary[task_file]['elapsed'] = time.perf_counter() - started[task_file]
+                        continue
+                    with summary_lock:
+                        summary[file_path]['skipped'] += skipped
+                        summary[file_path]['elapsed'] = time.perf_counter() - started[file_path]
+                    for row_count, months, payload in payloads:
+                        if row_count:
+                            batches.put((file_path, row_count, months, payload))
+    finally:
+        for _ in writers:
+            batches.put(None)
+        for writer in writers:
+            writer.join()
+        for conn in connections:
+            conn.close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(s['ingested'] for s in summary.values())
+    for file_path, stats in summary.items():
+        print(f"{file_path}: {stats['ingested']} ingested, {stats['skipped']} skipped, "
+              f"{stats['failed']} failed, {stats['parse_errors']} parse errors in {stats['elapsed']:.2f}s")
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Successfully ingested {total} log entries from {len(files)} files in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+    return summary
+
+def follow_logs(file_path, batch_size=DEFAULT_FOLLOW_BATCH_SIZE, flush_interval=1.0, poll_interval=0.25,
+                from_start=False, on_batch=None, stop_event=None, evaluate_rules=False,
+                rules_refresh_interval=30.0):
+    """
+    Tails a growing CSV log file and inserts new lines in small batches.
+
+    New complete lines are buffered and flushed with COPY as soon as either
+    `batch_size` lines are pending or the oldest pending line is
+    `flush_interval` seconds old, so entries reach the database within about a
+    second. Rotation (the path now points to a new file) and truncation are
+    detected on every poll; the replacement file is read from its beginning and
+    its header line is consumed again.
+
+    Rows the database rejects (e.g. an unparseable timestamp) are skipped and
+    the rest of their batch is written. A batch that fails for any other reason
+    is kept and retried on later polls, with the delay doubling up to
+    MAX_FOLLOW_RETRY_DELAY seconds, so a database outage delays rows instead of
+    losing them.
+
+    With `evaluate_rules`, each batch is matched against the active rules in
+    memory before it is written and its alerts are stored in the same
+    transaction, so alerts appear together with the logs that caused them. The
+    'alert_summary' view is then refreshed at most every SUMMARY_REFRESH_INTERVAL
+    seconds, and once more when following stops.
+
+    Args:
+        file_path (str): Path to the log file to follow.
+        batch_size (int): Flush once this many lines are pending.
+        flush_interval (float): Flush once the oldest pending line is this old, in seconds.
+        poll_interval (float): Seconds to wait when no new data is available.
+        from_start (bool): Ingest the existing contents first instead of only new lines.
+        on_batch (callable): Called with the number of rows after each committed batch.
+        stop_event (threading.Event): Stops following when set. Runs until
+            interrupted if omitted.
+        evaluate_rules (bool): Generate rule alerts for each batch at ingestion time.
+        rules_refresh_interval (float): Seconds between reloads of the active rules.
+
+    Returns:
+        int: The number of log entries ingested while following.
+    """
+    conn = get_db_connection()
+    if not conn:
+        print("Could not connect to the database for ingestion.")
+        return 0
+
+    f = None
+    inode = None
+    header = None
+    partial = b''
+    pending = []
+    pending_since = None
+    unsent = []  # Parsed rows not committed yet
+    retry_at = None
+    retry_delay = max(flush_interval, poll_interval)
+    inserted_rows = 0
+    rule_set = None
+    rules_loaded_at = None
+    summary_stale = False
+    summary_refreshed_at = time.monotonic()
+
+    def refresh_summary():
+        nonlocal summary_stale, summary_refreshed_at
+        refresh_alert_summary()
+        summary_stale, summary_refreshed_at = False, time.monotonic()
+
+    def flush():
+        nonlocal conn, pending, pending_since, unsent, retry_at, retry_delay, inserted_rows, rule_set, rules_loaded_at
+        nonlocal summary_stale
+        # Parse with the current file's header, even if the write has to wait
+        rows, _ = extract_rows(header or list(LOG_COLUMNS), csv.reader(pending))
+        pending, pending_since = [], None
+        unsent.extend(rows)
+        if not unsent or (retry_at is not None and time.monotonic() < retry_at):
+            return
+        rows = unsent
+        if conn.closed:
+            conn = get_db_connection() or conn
+        if evaluate_rules and (rule_set is None or time.monotonic() - rules_loaded_at >= rules_refresh_interval):
+            rule_set = compile_active_rules(previous=rule_set)
+            rules_loaded_at = time.monotonic()
+        if rule_set:
+            write = functools.partial(_copy_rows_with_alerts, rule_set=rule_set)
+        else:
+            write = _copy_rows
+        # The window rules must not keep events from a batch that is rolled back
+        windows = rule_set.snapshot_windows() if rule_set else None
+        try:
+            with conn.cursor() as cur:
+                alerts_generated, rejected = _write_valid_rows(cur, rows, write)
+            conn.commit()
+        except Exception as e:
+            print(f"Error ingesting logs, retrying {len(rows)} rows in {retry_delay:.1f}s: {e}")
+            if windows is not None:
+                rule_set.restore_windows(windows)
+            if not conn.closed:
+                conn.rollback()
+            retry_at = time.monotonic() + retry_delay
+            retry_delay = min(retry_delay * 2, MAX_FOLLOW_RETRY_DELAY)
+            return
+        unsent, retry_at, retry_delay = [], None, max(flush_interval, poll_interval)
+        written = len(rows) - len(rejected)
+        inserted_rows += written
+        if alerts_generated:
+            print(f"Generated {alerts_generated} alerts for {written} new log entries.")
+            summary_stale = True
+        if on_batch and written:
+            on_batch(written)
+
+    print(f"Following {file_path} (Ctrl+C to stop)...")
+    try:
+        while not (stop_event and stop_event.is_set()):
+            if f is None:
+                try:
+                    f = open(file_path, 'rb')
+                except FileNotFoundError:
+                    time.sleep(poll_interval)
+                    continue
+                inode = os.fstat(f.fileno()).st_ino
+                header, partial = None, b''
+                if not from_start:
+                    first_line = f.readline()
+                    if first_line.endswith(b'\n'):
+                        header = next(csv.reader([first_line.decode('utf-8')]), None) or None
+                        f.seek(0, os.SEEK_END)
+                    else:
+                        # No complete header line yet, so no rows either: read the file as it grows
+                        f.seek(0)
+                from_start = True  # Rotated-in files are always read from their beginning
+
+            chunk = f.read()
+            if chunk:
+                lines = (partial + chunk).split(b'\n')
+                partial = lines.pop()
+                for line in lines:
+                    text = line.decode('utf-8')
+                    if header is None:
+                        # Blank lines before the header leave it unread
+                        header = next(csv.reader([text]), None) or None
+                    else:
+                        pending.append(text)
+                if pending and pending_since is None:
+                    pending_since = time.monotonic()
+
+            if pending and (len(pending) >= batch_size or time.monotonic() - pending_since >= flush_interval):
+                flush()
+            elif unsent and time.monotonic() >= retry_at:
+                flush()
+            if summary_stale and time.monotonic() - summary_refreshed_at >= SUMMARY_REFRESH_INTERVAL:
+                refresh_summary()
+
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                stat = None  # Mid-rotation: keep draining the old file until the new one appears
+            if stat is not None and stat.st_ino != inode:
+                print(f"{file_path} was rotated. Switching to the new file.")
+                if pending:
+                    flush()
+                f.close()
+                f = None
+                continue
+            if stat is not None and stat.st_size < f.tell():
+                print(f"{file_path} was truncated. Reading it from the beginning.")
+                if pending:
+                    flush()
+                f.seek(0)
+                header, partial = None, b''
+                continue
+
+            if not chunk:
+                if stop_event:
+                    stop_event.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Stopping log follower...")
+    finally:
+        retry_at = None  # One last attempt before stopping
+        if pending or unsent:
+            flush()
+        if unsent:
+            print(f"Could not ingest {len(unsent)} log entries before stopping.")
+        if summary_stale:
+            refresh_summary()
+        if f:
+            f.close()
+        conn.close()
+
+    print(f"Ingested {inserted_rows} log entries while following {file_path}.")
+    return inserted_rows
+
 if __name__ == '__main__':
     # This allows running the script directly to ingest data
+    parser = argparse.ArgumentParser(description="Ingest audit logs into the database.")
+    parser.add_argument('file_path', nargs='?', default='data/sample_logs.csv',
+                        help="Path to the log file (or a directory/glob with --parallel).")
+    parser.add_argument('--bulk', action='store_true', help="Stream rows with COPY instead of per-row INSERTs.")
+    parser.add_argument('--stream', action='store_true', help="Commit in chunks and resume from the last checkpoint.")
+    parser.add_argument('--follow', action='store_true', help="Tail the file and ingest new lines as they arrive.")
+    parser.add_argument('--run-rules', action='store_true', help="With --follow, run the rule engine after each batch.")
+    parser.add_argument('--evaluate-rules', action='store_true',
+                        help="With --follow, match each batch against the active rules before it is written.")
+    parser.add_argument('--parallel', action='store_true', help="Ingest every file in a directory or glob in parallel.")
+    parser.add_argument('--pattern', default='*.csv', help="File pattern used when the path is a directory.")
+    parser.add_argument('--workers', type=int, default=None, help="Parser processes for --parallel.")
+    parser.add_argument('--writers', type=int, default=2, help="Writer connections for --parallel.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows buffered per COPY call.")
+    args = parser.parse_args()
+
     print("Starting log ingestion...")
-    ingest_logs()
\ No newline at end of file
+    if args.follow:
+        on_batch = None
+        if args.run_rules:
+            from rules.rule_engine import run_rules
+            on_batch = lambda row_count: run_rules()
+        follow_logs(args.file_path, on_batch=on_batch, evaluate_rules=args.evaluate_rules)
+    elif args.parallel:
+        ingest_directory(args.file_path, pattern=args.pattern, workers=args.workers,
+                         writer_connections=args.writers, batch_size=args.batch_size)
+    elif args.stream:
+        stream_ingest_logs(args.file_path, chunk_size=args.batch_size)
+    elif args.bulk:
+        bulk_ingest_logs(args.file_path, batch_size=args.batch_size)
+    else:
+        ingest_logs(args.file_path)
@@ -0,0 +1,159 @@
+import csv
+import gzip
+import itertools
+import json
+
+# Columns every log row must provide, in the order they are written to the 'logs' table
+LOG_COLUMNS = ('timestamp', 'user_id', 'action', 'resource', 'status')
+# Columns that must also have a value (NOT NULL in the 'logs' table); rows missing one are malformed
+REQUIRED_COLUMNS = ('timestamp', 'user_id', 'action')
+REQUIRED_POSITIONS = tuple(LOG_COLUMNS.index(k) for k in REQUIRED_COLUMNS)
+
+# Maps a file suffix (e.g. '.csv.gz') to a reader function. See register_reader.
+READERS = {}
+
+def register_reader(*suffixes):
+    """
+    Decorator that registers a reader function for one or more file suffixes.
+
+    A reader is called as reader(file_path, batch_size) and must yield
+    (rows, skipped) pairs, where rows is a list of tuples ordered like
+    LOG_COLUMNS and skipped is the number of malformed records in that batch.
+    """
+    def decorator(reader):
+        for suffix in suffixes:
+            READERS[suffix.lower()] = reader
+        return reader
+    return decorator
+
+def get_reader(file_path):
+    """
+    Returns the reader registered for the longest suffix matching the file name.
+
+    Raises:
+        ValueError: If no reader handles the file's format.
+    """
+    name = file_path.lower()
+    matches = [suffix for suffix in READERS if name.endswith(suffix)]
+    if not matches:
+        raise ValueError(f"No log reader registered for '{file_path}'.")
+    return READERS[max(matches, key=len)]
+
+def has_required_values(row):
+    """Checks that a log tuple ordered like LOG_COLUMNS has a value in every REQUIRED_COLUMNS field."""
+    return all(row[i] not in (None, '') for i in REQUIRED_POSITIONS)
+
+def iter_log_batches(file_path, batch_size):
+    """Yields (rows, skipped) batches from a log file in any registered format."""
+    return get_reader(file_path)(file_path, batch_size)
+
+def extract_rows(header, records):
+    """
+    Converts csv.reader records into log tuples ordered like LOG_COLUMNS.
+
+    Mirrors csv.DictReader: blank records are ignored and short records are
+    padded with None. If the header lacks a log column, every record is
+    reported as malformed and skipped, as is any record without a value in a
+    REQUIRED_COLUMNS field.
+
+    Args:
+        header (list): The column names from the file's header line.
+        records (iterable): Lists of field values as produced by csv.reader.
+
+    Returns:
+        tuple: A list of valid log tuples and the number of skipped records.
+    """
+    positions = [header.index(k) for k in LOG_COLUMNS if k in header]
+    complete = len(positions) == len(LOG_COLUMNS)
+    width = len(header)
+
+    rows = []
+    skipped = 0
+    for record in records:
+        if not record:
+            continue
+        if not complete:
+            print(f"Skipping malformed row: {dict(zip(header, record))}")
+            skipped += 1
+            continue
+        if len(record) < width:
+            record = record + [None] * (width - len(record))
+        row = tuple(record[i] for i in positions)
+        if not has_required_values(row):
+            print(f"Skipping malformed row: {dict(zip(header, record))}")
+            skipped += 1
+            continue
+        rows.append(row)
+    return rows, skipped
+
+def _open_text(file_path):
+    """Opens a plain or gzip-compressed file for text reading, decompressing on the fly."""
+    if file_path.lower().endswith('.gz'):
+        return gzip.open(file_path, 'rt', newline='')
+    return open(file_path, 'r', newline='')
+
+@register_reader('.csv', '.csv.gz')
+def read_csv(file_path, batch_size):
+    """Streams CSV records in batches without building a dict per row."""
+    with _open_text(file_path) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        while True:
+            records = list(itertools.islice(reader, batch_size))
+            if not records:
+                break
+            yield extract_rows(header, records)
+
+@register_reader('.jsonl', '.jsonl.gz', '.ndjson', '.ndjson.gz')
+def read_jsonl(file_path, batch_size):
+    """Streams newline-delimited JSON objects in batches."""
+    with _open_text(file_path) as f:
+        while True:
+            lines = list(itertools.islice(f, batch_size))
+            if not lines:
+                break
+
+            rows = []
+            skipped = 0
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                row = tuple(record[k] for k in LOG_COLUMNS) if (
+                    isinstance(record, dict) and all(k in record for k in LOG_COLUMNS)
+                ) else None
+                if row is None or not has_required_values(row):
+                    print(f"Skipping malformed row: {line.strip()}")
+                    skipped += 1
+                    continue
+                rows.append(row)
+            yield rows, skipped
+
+@register_reader('.parquet')
+def read_parquet(file_path, batch_size):
+    """
+    Streams a Parquet file one record batch at a time.
+
+    Only the log columns are read from each row group, and rows are built by
+    zipping whole columns instead of converting record by record. Requires the
+    optional pyarrow dependency.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet log files requires pyarrow (pip install pyarrow).") from e
+
+    parquet_file = pq.ParquetFile(file_path)
+    missing = [k for k in LOG_COLUMNS if k not in parquet_file.schema_arrow.names]
+    if missing:
+        print(f"Skipping {parquet_file.metadata.num_rows} malformed rows in {file_path}: missing columns {missing}")
+        yield [], parquet_file.metadata.num_rows
+        return
+
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(LOG_COLUMNS)):
+        columns = [batch.column(k).to_pylist() for k in LOG_COLUMNS]
+        rows = [row for row in zip(*columns) if has_required_values(row)]
+        yield rows, batch.num_rows - len(rows)
@@ -1,50 +1,121 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 import joblib
 from datetime import datetime
+from psycopg2.extras import execute_values
 
-from db.database import get_db_connection
-from ml.feature_extractor import fetch_logs_as_dataframe, preprocess_features
+from db.database import pooled_connection, read_snapshot_xids, advance_settled_log_id
+from db.data_unifier import refresh_alert_summary
+from ml.feature_extractor import (
+    fetch_logs_as_dataframe, build_feature_vocabulary, iter_log_chunks, DEFAULT_CHUNK_SIZE
+)
+from ml.encoder import FeatureEncoder, ENCODER_PATH
 
 MODEL_PATH = "ml/isolation_forest_model.joblib"
 COLUMNS_PATH = "ml/model_columns.joblib"
+WATERMARK_NAME = "anomaly_detection"
+SAVE_PAGE_SIZE = 10000  # Anomalies per INSERT statement
+SCORE_BATCH_SIZE = 50000  # Most rows per scoring task
+
+# The model each scoring process was started with (see _init_scoring_worker)
+_worker_model = None
+
+def _init_scoring_worker(model):
+    global _worker_model
+    _worker_model = model
+    # The processes are the parallelism; don't let each one spawn its own jobs too
+    _worker_model.set_params(n_jobs=1)
+
+def _score_batch(batch):
+    return _worker_model.decision_function(batch)
 
 class AnomalyDetector:
     """
     A class to handle training, prediction, and persistence of the Isolation Forest model.
+
+    With n_jobs above 1, scoring runs on a pool of processes that is started on
+    first use and reused by every later score() call, e.g. for each chunk of a
+    chunked run. Call close() to stop it.
     """
-    def __init__(self, contamination=0.05):
+    def __init__(self, contamination=0.05, n_jobs=None, max_samples='auto'):
         """
         Initializes the AnomalyDetector.
         
         Args:
             contamination (float): The expected proportion of anomalies in the dataset.
+            n_jobs (int, optional): Parallel jobs for training and scoring; -1 uses every CPU.
+                Scoring splits the rows into a batch per process.
+            max_samples (int, float or 'auto'): Rows each tree is trained on, subsampled
+                from the training data (see IsolationForest).
         """
-        self.model = IsolationForest(contamination=contamination, random_state=42)
+        self.n_jobs = n_jobs
+        self.model = IsolationForest(contamination=contamination, max_samples=max_samples,
+                                     n_jobs=n_jobs, random_state=42)
         self.model_columns = []
+        self.encoder = None
+        self._pool = None
+
+    def _scoring_pool(self):
+        """Returns the pool of scoring processes, starting it with the current model if needed."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=joblib.effective_n_jobs(self.n_jobs),
+                                             initializer=_init_scoring_worker, initargs=(self.model,))
+        return self._pool
+
+    def close(self):
+        """Stops the scoring processes, if any were started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
 
     def train(self, data):
         """
         Trains the Isolation Forest model on the given data.
 
         Args:
-            data (pd.DataFrame): The preprocessed numerical data for training.
+            data (pd.DataFrame or scipy.sparse.csr_matrix): The preprocessed numerical data
+                for training; a sparse matrix must come from self.encoder.
         """
-        if data.empty:
+        if data.shape[0] == 0:
             print("Training data is empty. Skipping training.")
             return
 
         print("Training Isolation Forest model...")
+        self.close()  # Running processes hold the previous model
         self.model.fit(data)
-        self.model_columns = data.columns.tolist() # Store the column order
+        # Store the column order
+        if isinstance(data, pd.DataFrame):
+            self.model_columns = data.columns.tolist()
+        else:
+            self.model_columns = self.encoder.feature_names
         print("Model training complete.")
 
     def predict(self, data):
         """
-        Predicts anomalies using the trained model.
+        Predicts anomalies using the trained model. Same as score() with its defaults.
+
+        Returns:
+            np.ndarray: An array of predictions (-1 for anomalies, 1 for normal).
+            np.ndarray: The anomaly scores for each data point.
+        """
+        return self.score(data)
+
+    def score(self, data, batch_size=SCORE_BATCH_SIZE):
+        """
+        Scores the data in a single pass over the trees and derives the labels from the scores.
+
+        The rows are scored batch_size at a time. With n_jobs above 1 they are split
+        evenly into at least one batch per process, and the batches are scored on
+        the detector's pool of processes.
 
         Args:
-            data (pd.DataFrame): The preprocessed numerical data for prediction.
+            data (pd.DataFrame or scipy.sparse.csr_matrix): The preprocessed numerical data
+                for prediction.
+            batch_size (int): The number of rows per batch.
 
         Returns:
             np.ndarray: An array of predictions (-1 for anomalies, 1 for normal).
@@ -55,51 +126,119 @@ class AnomalyDetector:
             return None, None
             
         # Ensure the prediction data has the same columns as the training data
-        data = data.reindex(columns=self.model_columns, fill_value=0)
+        if isinstance(data, pd.DataFrame):
+            data = data.reindex(columns=self.model_columns, fill_value=0)
+        elif data.shape[1] != len(self.model_columns):
+            print(f"Expected {len(self.model_columns)} features, got {data.shape[1]}. Cannot predict.")
+            return None, None
 
         print("Predicting anomalies...")
-        predictions = self.model.predict(data)
-        scores = self.model.decision_function(data)
+        workers = joblib.effective_n_jobs(self.n_jobs)
+        if workers > 1:
+            batch_size = min(batch_size, max(math.ceil(data.shape[0] / workers), 1))
+        batches = [data[start:start + batch_size] for start in range(0, data.shape[0], batch_size)]
+        if workers > 1 and len(batches) > 1:
+            batch_scores = list(self._scoring_pool().map(_score_batch, batches))
+        else:
+            batch_scores = [self.model.decision_function(batch) for batch in batches]
+        scores = np.concatenate(batch_scores) if batch_scores else np.empty(0)
+        # IsolationForest.predict() labels exactly the rows with a negative decision_function
+        predictions = np.where(scores < 0, -1, 1)
         print("Prediction complete.")
         return predictions, scores
 
     def save_model(self):
-        """Saves the trained model and its columns to disk."""
+        """Saves the trained model, its columns and its encoder to disk."""
         print(f"Saving model to {MODEL_PATH}")
         joblib.dump(self.model, MODEL_PATH)
         joblib.dump(self.model_columns, COLUMNS_PATH)
+        if self.encoder is not None:
+            self.encoder.save(ENCODER_PATH)
 
     def load_model(self):
-        """Loads a pre-trained model and its columns from disk."""
+        """Loads a pre-trained model, its columns and its encoder from disk."""
         try:
             print(f"Loading model from {MODEL_PATH}")
+            self.close()  # Running processes hold the previous model
             self.model = joblib.load(MODEL_PATH)
+            self.model.set_params(n_jobs=self.n_jobs)
             self.model_columns = joblib.load(COLUMNS_PATH)
+            try:
+                self.encoder = FeatureEncoder.load(ENCODER_PATH)
+            except FileNotFoundError:
+                # Models saved before the encoder existed only have their column names.
+                # They were fitted on a DataFrame; drop its feature names, as they are now
+                # given CSR matrices, which have none.
+                self.encoder = FeatureEncoder.from_columns(self.model_columns)
+                if hasattr(self.model, 'feature_names_in_'):
+                    del self.model.feature_names_in_
             print("Model loaded successfully.")
             return True
         except FileNotFoundError:
             print("No pre-trained model found.")
             return False
 
-def run_anomaly_detection():
+def run_anomaly_detection(chunk_size=None, incremental=False, n_jobs=None, max_samples='auto'):
     """
     Full pipeline: Fetches data, trains model, predicts anomalies, and saves results.
+
+    Args:
+        chunk_size (int, optional): Stream the logs and score them this many at a
+            time instead of loading the whole table, keeping memory bounded. A new
+            model is then trained on the first chunk.
+        incremental (bool): Only score the logs newer than the last run's settled
+            watermark (like the rule engine, see advance_settled_log_id(), so logs that
+            committed late are still scored) and replace only the anomalies of the logs scored.
+            The logs are streamed in chunks (DEFAULT_CHUNK_SIZE unless chunk_size is given).
+        n_jobs (int, optional): Train and score in parallel; see AnomalyDetector.
+        max_samples (int, float or 'auto'): Rows each tree is trained on; see AnomalyDetector.
     """
     print("--- Starting Anomaly Detection Pipeline ---")
-    
+    detector = AnomalyDetector(n_jobs=n_jobs, max_samples=max_samples)
+    try:
+        _run_pipeline(detector, chunk_size, incremental)
+    finally:
+        detector.close()
+
+def _run_pipeline(detector, chunk_size, incremental):
+    """Runs the steps of run_anomaly_detection() with the given detector."""
+    # The settled id is advanced before the logs are read, and the xmax read after them
+    min_id, settled_log_id = _read_scan_start()
+    if incremental:
+        print(f"Scoring logs after id {min_id}.")
+        anomalous_logs, anomaly_scores, last_log_id = _detect_in_chunks(
+            detector, chunk_size or DEFAULT_CHUNK_SIZE, min_id
+        )
+        if anomalous_logs is None:
+            return
+        save_anomalies(anomalous_logs, anomaly_scores, scored_range=(min_id, last_log_id),
+                       watermark=(last_log_id, settled_log_id, _read_snapshot_xmax()))
+        return
+
+    if chunk_size:
+        anomalous_logs, anomaly_scores, last_log_id = _detect_in_chunks(detector, chunk_size)
+        if anomalous_logs is None:
+            return
+        save_anomalies(anomalous_logs, anomaly_scores,
+                       watermark=(last_log_id, settled_log_id, _read_snapshot_xmax()))
+        return
+
     # 1. Fetch and preprocess data
     logs_df = fetch_logs_as_dataframe()
     if logs_df.empty:
         print("Pipeline stopped: No logs to process.")
         return
+    snapshot_xmax = _read_snapshot_xmax()
     
-    processed_data, original_data = preprocess_features(logs_df)
-
     # 2. Train or load model
-    detector = AnomalyDetector()
-    if not detector.load_model():
+    if detector.load_model():
+        processed_data = detector.encoder.transform(logs_df)
+    else:
+        detector.encoder = FeatureEncoder().fit(logs_df)
+        processed_data = detector.encoder.transform(logs_df)
         detector.train(processed_data)
         detector.save_model()
+    print(f"Feature extraction complete. Shape of processed data: {processed_data.shape}")
 
     # 3. Predict anomalies
     predictions, scores = detector.predict(processed_data)
@@ -109,69 +248,255 @@ def run_anomaly_detection():
         return
 
     # 4. Identify and save anomalies to the database
-    anomaly_indices = original_data.index[predictions == -1]
-    anomalous_logs = original_data.loc[anomaly_indices]
+    anomalous_logs = logs_df[predictions == -1]
     anomaly_scores = scores[predictions == -1]
+    save_anomalies(anomalous_logs, anomaly_scores,
+                   watermark=(int(logs_df['id'].max()), settled_log_id, snapshot_xmax))
 
-    print(f"\nFound {len(anomalous_logs)} potential anomalies.")
+def _detect_in_chunks(detector, chunk_size, min_id=0):
+    """
+    Scores the logs chunk by chunk with one encoder, so every chunk has the same columns.
 
-    conn = get_db_connection()
-    if not conn:
-        print("Could not connect to DB to save anomalies.")
-        return
-        
-    try:
-        with conn.cursor() as cur:
-            # Clear previous anomalies
-            cur.execute("DELETE FROM anomalies")
-            print("Cleared previous anomaly records.")
-            
-            for index, row in anomalous_logs.iterrows():
-                log_id = row['id']
-                score = anomaly_scores[anomalous_logs.index.get_loc(index)]
-                timestamp = datetime.now()
-                details = f"Anomaly detected for user '{row['user_id']}' performing action '{row['action']}' on resource '{row['resource']}'"
-                
+    Only the anomalous rows of each chunk are kept, so memory is bounded by
+    the chunk size plus the anomalies found.
+
+    Args:
+        detector (AnomalyDetector): The detector to load (or train) and score with.
+        chunk_size (int): The number of logs per chunk.
+        min_id (int): Only score logs with an id above this one.
+
+    Returns:
+        tuple: The anomalous log rows (pd.DataFrame), their scores and the newest log id
+        scored, or (None, None, None) if nothing could be scored.
+    """
+    model_loaded = detector.load_model()
+    # A loaded model fixes the columns; otherwise derive them from the whole table up front
+    if not model_loaded:
+        detector.encoder = FeatureEncoder.from_columns(build_feature_vocabulary())
+
+    anomalous_chunks = []
+    score_chunks = []
+    scored_rows = 0
+    last_log_id = min_id
+    for original in iter_log_chunks(chunk_size, min_id):
+        features = detector.encoder.transform(original)
+        if not detector.model_columns:
+            detector.train(features)
+            detector.save_model()
+
+        predictions, scores = detector.predict(features)
+        if predictions is None:
+            print("Pipeline stopped: Prediction failed.")
+            return None, None, None
+        anomalous_chunks.append(original[predictions == -1])
+        score_chunks.append(scores[predictions == -1])
+        scored_rows += features.shape[0]
+        last_log_id = int(original['id'].iloc[-1])  # Chunks arrive in id order
+
+    if not scored_rows:
+        print("Pipeline stopped: No logs to process.")
+        return None, None, None
+    print(f"Scored {scored_rows} logs in chunks of {chunk_size}.")
+    return pd.concat(anomalous_chunks, ignore_index=True), np.concatenate(score_chunks), last_log_id
+
+def get_watermark():
+    """
+    Returns the newest log id already scored by anomaly detection, or 0 if none has been.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return 0
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT last_log_id FROM pipeline_watermarks WHERE name = %s", (WATERMARK_NAME,))
+                row = cur.fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            print(f"Error fetching anomaly detection watermark: {e}")
+            return 0
+
+def _read_scan_start():
+    """
+    Returns (min_id, settled_log_id): the settled id stored by the last run, after which
+    an incremental run scores the logs, and the id it can now be advanced to.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            return 0, 0
+
+        try:
+            with conn.cursor() as cur:
+                xmin, _ = read_snapshot_xids(cur)
                 cur.execute(
+                    "SELECT settled_log_id, last_log_id, snapshot_xmax FROM pipeline_watermarks WHERE name = %s",
+                    (WATERMARK_NAME,)
+                )
+                row = cur.fetchone()
+                if not row:
+                    return 0, 0
+                return row[0], advance_settled_log_id(*row, xmin)
+        except Exception as e:
+            print(f"Error fetching anomaly detection watermark: {e}")
+            return 0, 0
+
+def _read_snapshot_xmax():
+    """Returns the xmax of a fresh snapshot, or None if it could not be read."""
+    with pooled_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                return read_snapshot_xids(cur)[1]
+        except Exception as e:
+            print(f"Error reading the snapshot xmax: {e}")
+            return None
+
+def save_anomalies(anomalous_logs, anomaly_scores, scored_range=None, watermark=None):
+    """
+    Saves the given anomalies to the 'anomalies' table.
+
+    Args:
+        anomalous_logs (pd.DataFrame): The anomalous log rows, including their 'id'.
+        anomaly_scores (np.ndarray): The anomaly score of each row, in the same order.
+        scored_range (tuple, optional): The (after_id, up_to_id) range of log ids that was
+            scored. Only the anomalies whose label or score changed are written: logs no
+            longer anomalous lose theirs, logs still anomalous keep theirs (and its id) and
+            get the new score only if it differs, new anomalies are inserted, and all other
+            anomalies are kept. By default every previous anomaly is replaced.
+        watermark (tuple, optional): (last_log_id, settled_log_id, snapshot_xmax), the newest
+            log id that was scored and the settled state of the next incremental run (see
+            advance_settled_log_id()); stored in the same transaction.
+
+    The 'alert_summary' view read by the dashboard is refreshed once anomalies have changed.
+    """
+    print(f"\nFound {len(anomalous_logs)} potential anomalies.")
+
+    # Build the rows column-wise instead of row by row
+    log_ids = anomalous_logs['id'].to_numpy(dtype=np.int64).tolist()
+    log_timestamps = pd.to_datetime(anomalous_logs['timestamp']).dt.to_pydatetime().tolist()
+    scores = np.asarray(anomaly_scores, dtype=np.float64).tolist()
+    fields = anomalous_logs[['user_id', 'action', 'resource']].fillna('unknown').astype(str)
+    details = (
+        "Anomaly detected for user '" + fields['user_id']
+        + "' performing action '" + fields['action']
+        + "' on resource '" + fields['resource'] + "'"
+    ).tolist()
+    timestamp = datetime.now()
+
+    with pooled_connection() as conn:
+        if not conn:
+            print("Could not connect to DB to save anomalies.")
+            return
+
+        try:
+            with conn.cursor() as cur:
+                start = time.perf_counter()
+                rows = list(zip(log_ids, log_timestamps, scores, details))
+                updated = deleted = 0
+                if scored_range is None:
+                    # Clear previous anomalies
+                    cur.execute("DELETE FROM anomalies")
+                    print("Cleared previous anomaly records.")
+                else:
+                    # Upsert on log_id; a plain unique constraint is not possible on the partitioned table
+                    cur.execute(
+                        "DELETE FROM anomalies WHERE log_id > %s AND log_id <= %s AND log_id <> ALL(%s)",
+                        (*scored_range, log_ids)
+                    )
+                    deleted = cur.rowcount
+                    cur.execute(
+                        "SELECT log_id FROM anomalies WHERE log_id > %s AND log_id <= %s",
+                        scored_range
+                    )
+                    existing = {log_id for (log_id,) in cur.fetchall()}
+                    # Scores are compared at the column's precision, so re-scoring an unchanged log is a no-op
+                    updated = len(execute_values(
+                        cur,
+                        """
+                        UPDATE anomalies a SET score = v.score, details = v.details
+                        FROM (VALUES %s) AS v (log_id, score, details)
+                        WHERE a.log_id = v.log_id AND (a.score, a.details) IS DISTINCT FROM (v.score, v.details)
+                        RETURNING a.log_id
+                        """,
+                        [(log_id, score, detail) for log_id, _, score, detail in rows if log_id in existing],
+                        template="(%s::integer, %s::numeric(10, 5), %s::text)",
+                        page_size=SAVE_PAGE_SIZE,
+                        fetch=True
+                    ))
+                    rows = [row for row in rows if row[0] not in existing]
+
+                execute_values(
+                    cur,
                     """
-                    INSERT INTO anomalies (log_id, timestamp, score, details)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO anomalies (log_id, log_ts, timestamp, score, details)
+                    VALUES %s
                     """,
-                    (log_id, timestamp, score, details)
+                    [(log_id, log_ts, timestamp, score, detail) for log_id, log_ts, score, detail in rows],
+                    page_size=SAVE_PAGE_SIZE
                 )
-            conn.commit()
-        print(f"Successfully saved {len(anomalous_logs)} new anomalies to the database.")
-    except Exception as e:
-        print(f"Error saving anomalies to database: {e}")
-        conn.rollback()
-    finally:
-        if conn:
-            conn.close()
+                if watermark is not None:
+                    cur.execute(
+                        """
+                        INSERT INTO pipeline_watermarks (name, last_log_id, settled_log_id, snapshot_xmax, updated_at)
+                        VALUES (%s, %s, %s, %s, NOW())
+                        ON CONFLICT (name) DO UPDATE
+                        SET last_log_id = EXCLUDED.last_log_id, settled_log_id = EXCLUDED.settled_log_id,
+                            snapshot_xmax = EXCLUDED.snapshot_xmax, updated_at = EXCLUDED.updated_at
+                        """,
+                        (WATERMARK_NAME, *watermark)
+                    )
+                conn.commit()
+            elapsed = time.perf_counter() - start
+            rate = len(log_ids) / elapsed if elapsed > 0 else 0.0
+            print(f"Successfully saved anomalies in {elapsed:.2f}s ({rate:,.0f} rows/sec): "
+                  f"{len(rows)} new, {updated} updated, {deleted} removed.")
+            if scored_range is None or rows or updated or deleted:
+                refresh_alert_summary()
+        except Exception as e:
+            print(f"Error saving anomalies to database: {e}")
+            conn.rollback()
 
 def get_anomalies():
-    """Retrieves all anomalies from the database, joined with log details."""
-    conn = get_db_connection()
-    if not conn:
-        return []
+    """Retrieves all anomalies from the database, joined with log details; scores are floats."""
+    with pooled_connection() as conn:
+        if not conn:
+            return []
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT a.id, a.timestamp, l.user_id, l.action, l.resource, a.score, a.details
-                FROM anomalies a
-                JOIN logs l ON a.log_id = l.id
-                ORDER BY a.score ASC -- Show most anomalous first
-            """)
-            return cur.fetchall()
-    except Exception as e:
-        print(f"Error fetching anomalies: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT a.id, a.timestamp, l.user_id, l.action, l.resource, a.score::float8, a.details
+                    FROM anomalies a
+                    JOIN logs l ON a.log_id = l.id
+                    ORDER BY a.score ASC -- Show most anomalous first
+                """)
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching anomalies: {e}")
+            return []
+
+def _max_samples(value):
+    """Parses --max-samples: 'auto', a row count or a fraction of the rows."""
+    if value == 'auto':
+        return value
+    return float(value) if '.' in value else int(value)
 
 if __name__ == '__main__':
-    run_anomaly_detection()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Detect anomalous logs with an Isolation Forest.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only score the logs added since the last run.")
+    parser.add_argument('--chunk-size', type=int, help="Stream and score the logs this many at a time.")
+    parser.add_argument('--n-jobs', type=int, help="Parallel jobs for training and scoring (-1 for all CPUs).")
+    parser.add_argument('--max-samples', type=_max_samples, default='auto',
+                        help="Rows each tree is trained on: 'auto', a count or a fraction.")
+    args = parser.parse_args()
+
+    run_anomaly_detection(chunk_size=args.chunk_size, incremental=args.incremental,
+                          n_jobs=args.n_jobs, max_samples=args.max_samples)
     
     print("\n--- Fetching Detected Anomalies ---")
     anomalies = get_anomalies()
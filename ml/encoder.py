@@ -0,0 +1,107 @@
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from ml.feature_extractor import FEATURES_TO_ENCODE, NUMERICAL_FEATURES
+
+ENCODER_PATH = "ml/feature_encoder.joblib"
+
+class FeatureEncoder:
+    """
+    Encodes logs into sparse feature matrices with a fixed set of columns.
+
+    The columns are the numerical time features followed by one indicator per
+    known category value, named like pd.get_dummies would name them. Each row
+    stores only its non-zero entries (at most one per categorical field), so
+    the matrix grows with the number of logs, not with the number of distinct
+    users or resources. Values never seen when fitting are simply not encoded.
+    """
+    def __init__(self):
+        self.categories = {}  # field -> list of known values, in column order
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Rebuilds an encoder from get_dummies-style column names.
+
+        Used for models trained before the encoder existed (model_columns.joblib)
+        and for vocabularies from build_feature_vocabulary().
+
+        Args:
+            columns (list): Feature names such as 'hour_of_day' or 'user_id_admin-01'.
+        """
+        encoder = cls()
+        encoder.categories = {field: [] for field in FEATURES_TO_ENCODE}
+        for column in columns:
+            if column in NUMERICAL_FEATURES:
+                continue
+            for field in FEATURES_TO_ENCODE:
+                if column.startswith(f"{field}_"):
+                    encoder.categories[field].append(column[len(field) + 1:])
+                    break
+        return encoder
+
+    @property
+    def feature_names(self):
+        """The name of every column produced by transform(), in order."""
+        names = list(NUMERICAL_FEATURES)
+        for field in FEATURES_TO_ENCODE:
+            names.extend(f"{field}_{value}" for value in self.categories.get(field, []))
+        return names
+
+    def fit(self, df):
+        """
+        Learns the category values of every categorical field.
+
+        Args:
+            df (pd.DataFrame): Logs with the columns of the 'logs' table.
+        """
+        self.categories = {
+            field: sorted(df[field].dropna().unique())
+            for field in FEATURES_TO_ENCODE
+        }
+        return self
+
+    def transform(self, df):
+        """
+        Encodes logs into a CSR matrix with feature_names as its columns.
+
+        Args:
+            df (pd.DataFrame): Logs with the columns of the 'logs' table.
+
+        Returns:
+            scipy.sparse.csr_matrix: One float64 row per log.
+        """
+        n_rows = len(df)
+        timestamps = pd.to_datetime(df['timestamp'])
+        row_blocks = [np.arange(n_rows), np.arange(n_rows)]
+        column_blocks = [np.zeros(n_rows, dtype=np.int64), np.ones(n_rows, dtype=np.int64)]
+        value_blocks = [timestamps.dt.hour.to_numpy(dtype=np.float64),
+                        timestamps.dt.dayofweek.to_numpy(dtype=np.float64)]
+
+        offset = len(NUMERICAL_FEATURES)
+        for field in FEATURES_TO_ENCODE:
+            values = self.categories.get(field, [])
+            # Unseen values (and NULLs) get code -1 and are left out
+            codes = pd.Index(values).get_indexer(df[field])
+            known = codes >= 0
+            row_blocks.append(np.flatnonzero(known))
+            column_blocks.append(codes[known].astype(np.int64) + offset)
+            value_blocks.append(np.ones(int(known.sum())))
+            offset += len(values)
+
+        return sparse.csr_matrix(
+            (np.concatenate(value_blocks), (np.concatenate(row_blocks), np.concatenate(column_blocks))),
+            shape=(n_rows, offset)
+        )
+
+    def save(self, path=ENCODER_PATH):
+        joblib.dump(self.categories, path)
+
+    @classmethod
+    def load(cls, path=ENCODER_PATH):
+        """Loads a saved encoder; raises FileNotFoundError if there is none."""
+        encoder = cls()
+        encoder.categories = joblib.load(path)
+        return encoder
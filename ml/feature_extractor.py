@@ -1,69 +1,93 @@
 import pandas as pd
-from db.database import get_db_connection
+from db.database import pooled_connection
+
+DEFAULT_CHUNK_SIZE = 50000
+LOG_COLUMNS = ['id', 'timestamp', 'user_id', 'action', 'resource', 'status']
+FEATURES_TO_ENCODE = ['user_id', 'action', 'resource', 'status']
+NUMERICAL_FEATURES = ['hour_of_day', 'day_of_week']
 
 def fetch_logs_as_dataframe():
     """
     Fetches all logs from the database and returns them as a pandas DataFrame.
     """
-    conn = get_db_connection()
-    if not conn:
-        print("Could not connect to the database to fetch logs.")
-        return pd.DataFrame()
+    with pooled_connection() as conn:
+        if not conn:
+            print("Could not connect to the database to fetch logs.")
+            return pd.DataFrame()
 
-    try:
-        df = pd.read_sql("SELECT * FROM logs ORDER BY timestamp", conn)
-        return df
-    except Exception as e:
-        print(f"Error fetching logs into DataFrame: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
+        try:
+            df = pd.read_sql("SELECT * FROM logs ORDER BY timestamp", conn)
+            return df
+        except Exception as e:
+            print(f"Error fetching logs into DataFrame: {e}")
+            return pd.DataFrame()
 
-def preprocess_features(df):
-    """
-    Takes a DataFrame of logs and converts categorical and timestamp features
-    into a numerical format suitable for machine learning models.
+def iter_log_chunks(chunk_size=DEFAULT_CHUNK_SIZE, min_id=0):
     """
-    if df.empty:
-        return pd.DataFrame(), df
-
-    # --- Feature Engineering ---
-    # Convert timestamp to numerical features
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['hour_of_day'] = df['timestamp'].dt.hour
-    df['day_of_week'] = df['timestamp'].dt.dayofweek
-
-    # Keep original data for reference
-    original_df = df.copy()
+    Streams logs from the database as DataFrames of at most chunk_size rows.
 
-    # --- Feature Selection and Encoding ---
-    features_to_encode = ['user_id', 'action', 'resource', 'status']
-    numerical_features = ['hour_of_day', 'day_of_week']
+    Rows are read through a server-side (named) cursor in id order, so only
+    one chunk is held in memory at a time.
 
-    # One-hot encode categorical variables
-    encoded_df = pd.get_dummies(df[features_to_encode], prefix=features_to_encode, dtype=float)
+    Args:
+        chunk_size (int): The number of logs per chunk.
+        min_id (int): Only logs with an id above this one.
 
-    # Combine numerical features with encoded features
-    final_df = pd.concat([df[numerical_features], encoded_df], axis=1)
+    Yields:
+        pd.DataFrame: The next chunk of logs, with the columns of the 'logs' table.
+    """
+    with pooled_connection() as conn:
+        if not conn:
+            print("Could not connect to the database to fetch logs.")
+            return
 
-    # THE FIX IS HERE: Ensure all columns are of a standard float type
-    final_df = final_df.astype(float)
+        try:
+            with conn.cursor(name='ml_logs') as cur:
+                cur.itersize = chunk_size
+                cur.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM logs WHERE id > %s ORDER BY id", (min_id,))
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield pd.DataFrame(rows, columns=LOG_COLUMNS)
+            conn.rollback()  # Ends the read-only transaction the named cursor lived in
+        except Exception as e:
+            print(f"Error streaming logs: {e}")
+            conn.rollback()
 
-    final_df.columns = final_df.columns.astype(str)
+def build_feature_vocabulary():
+    """
+    Builds the full list of feature columns from the distinct values in 'logs'.
 
-    print(f"Feature extraction complete. Shape of processed data: {final_df.shape}")
+    The names and order match the feature_names of a FeatureEncoder fitted on the
+    whole table at once, so features computed chunk by chunk line up with each other.
 
-    return final_df, original_df
+    Returns:
+        list: The numerical feature names followed by one '<field>_<value>' column per category.
+    """
+    columns = list(NUMERICAL_FEATURES)
+    with pooled_connection() as conn:
+        if not conn:
+            return columns
+        try:
+            with conn.cursor() as cur:
+                for feature in FEATURES_TO_ENCODE:
+                    cur.execute(f"SELECT DISTINCT {feature} FROM logs WHERE {feature} IS NOT NULL ORDER BY 1")
+                    columns.extend(f"{feature}_{value}" for (value,) in cur.fetchall())
+        except Exception as e:
+            print(f"Error building feature vocabulary: {e}")
+    return columns
 
 if __name__ == '__main__':
+    from ml.encoder import FeatureEncoder
+
     print("Fetching logs and running feature extraction...")
     logs_df = fetch_logs_as_dataframe()
     if not logs_df.empty:
-        processed_data, original_data = preprocess_features(logs_df)
-        print("\nProcessed Data Head:")
-        print(processed_data.head())
-        print("\nData Types:")
-        print(processed_data.dtypes)
+        encoder = FeatureEncoder().fit(logs_df)
+        processed_data = encoder.transform(logs_df)
+        print(f"Feature extraction complete. Shape of processed data: {processed_data.shape}")
+        print("\nFeature Columns:")
+        print(encoder.feature_names)
     else:
-        print("No logs found to process.")
\ No newline at end of file
+        print("No logs found to process.")
@@ -0,0 +1,176 @@
+import json
+
+from db.database import pooled_connection, get_active_rules
+from db.partitions import existing_partitions, is_partitioned
+from rules.rule_engine import ALLOWED_TARGET_FIELDS, ALLOWED_OPERATORS, build_rule_predicate
+
+def _quote_literal(value):
+    """Quotes a rule value for use inside an index predicate."""
+    return "'" + value.replace("'", "''") + "'"
+
+def _add_proposal(proposals, name, definition, rule_id):
+    """Records an index proposal, merging the rules that share it."""
+    sql = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON logs {definition}"
+    proposal = proposals.setdefault(name, {'name': name, 'definition': definition, 'sql': sql, 'rule_ids': []})
+    proposal['rule_ids'].append(rule_id)
+
+def propose_indexes(rules):
+    """
+    Proposes indexes on 'logs' that support the given match rules.
+
+    - '=' and 'IN' rules get a composite (field, id) index, so the incremental
+      scan 'id > watermark AND field = value' is a single index range.
+    - 'LIKE' rules with a literal prefix get a text_pattern_ops index, which
+      the planner can use for prefix matches under any collation.
+    - '!=' rules get a partial index on id restricted to the rule's predicate,
+      since a plain btree cannot serve an inequality.
+
+    Args:
+        rules (list): Rule tuples as returned by get_active_rules().
+
+    Returns:
+        list: Dicts with 'name', 'definition' (the columns and predicate), 'sql' and
+        'rule_ids' for each proposed index.
+    """
+    proposals = {}
+    for rule_id, rule_name, description, target_field, operator, value in rules:
+        if target_field not in ALLOWED_TARGET_FIELDS or operator not in ALLOWED_OPERATORS:
+            continue
+
+        if operator in ('=', 'IN'):
+            _add_proposal(
+                proposals,
+                f"idx_logs_{target_field}_id",
+                f"({target_field}, id)",
+                rule_id
+            )
+        elif operator == 'LIKE':
+            # A leading wildcard cannot use a btree at all
+            if value[:1] in ('%', '_'):
+                continue
+            _add_proposal(
+                proposals,
+                f"idx_logs_{target_field}_pattern",
+                f"({target_field} text_pattern_ops, id)",
+                rule_id
+            )
+        elif operator == '!=':
+            _add_proposal(
+                proposals,
+                f"idx_logs_rule_{rule_id}",
+                f"(id) WHERE {target_field} <> {_quote_literal(value)}",
+                rule_id
+            )
+    return list(proposals.values())
+
+def explain_rule_cost(cur, target_field, operator, value, last_log_id=0):
+    """
+    Returns the planner's estimated total cost of a rule's incremental scan.
+
+    Args:
+        last_log_id (int): The rule's watermark; only logs after it are scanned.
+
+    Returns:
+        float: The 'Total Cost' of the top plan node.
+    """
+    predicate, params = build_rule_predicate(target_field, operator, value)
+    cur.execute(f"EXPLAIN (FORMAT JSON) SELECT id, user_id FROM logs WHERE id > %s AND {predicate}",
+                (last_log_id, *params))
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Total Cost']
+
+def create_index_concurrently(cur, proposal):
+    """
+    Builds a proposed index without blocking writes to 'logs'.
+
+    The cursor's connection must be in autocommit mode, since CREATE INDEX
+    CONCURRENTLY cannot run inside a transaction. A partitioned 'logs' table
+    cannot be indexed concurrently as a whole, so the index is created on the
+    parent alone and each partition's index is built concurrently and attached.
+    """
+    if not is_partitioned(cur):
+        cur.execute(proposal['sql'])
+        return
+
+    name, definition = proposal['name'], proposal['definition']
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY logs {definition}")
+    for partition in sorted(existing_partitions(cur, 'logs')):
+        child = f"{name}_{partition}"
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}")
+        cur.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+def advise_indexes(create=False):
+    """
+    Proposes indexes for the active match rules and reports their effect.
+
+    The estimated cost of every rule's incremental scan is taken with
+    EXPLAIN before and, when the indexes are created, after. Indexes are
+    created CONCURRENTLY outside a transaction, so ingestion keeps writing.
+
+    Args:
+        create (bool): Create the proposed indexes and re-analyze 'logs'.
+
+    Returns:
+        dict: 'indexes' (the proposals) and 'rules', a list of dicts with
+        'rule_id', 'name', 'indexes', 'cost_before' and 'cost_after'
+        (None unless create is True).
+    """
+    rules = [rule for rule in get_active_rules()
+             if rule[3] in ALLOWED_TARGET_FIELDS and rule[4] in ALLOWED_OPERATORS]
+    proposals = propose_indexes(rules)
+
+    with pooled_connection() as conn:
+        if not conn:
+            return {'indexes': proposals, 'rules': []}
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, settled_log_id FROM rules")
+                watermarks = dict(cur.fetchall())
+
+                report = []
+                for rule_id, rule_name, description, target_field, operator, value in rules:
+                    report.append({
+                        'rule_id': rule_id,
+                        'name': rule_name,
+                        'indexes': [p['name'] for p in proposals if rule_id in p['rule_ids']],
+                        'cost_before': explain_rule_cost(cur, target_field, operator, value,
+                                                         watermarks.get(rule_id, 0)),
+                        'cost_after': None,
+                    })
+
+            conn.commit()
+
+            if create and proposals:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    for proposal in proposals:
+                        create_index_concurrently(cur, proposal)
+                    cur.execute("ANALYZE logs")
+                    for entry, rule in zip(report, rules):
+                        entry['cost_after'] = explain_rule_cost(cur, rule[3], rule[4], rule[5],
+                                                                watermarks.get(rule[0], 0))
+            return {'indexes': proposals, 'rules': report}
+        except Exception as e:
+            print(f"Error advising indexes: {e}")
+            if not conn.autocommit:
+                conn.rollback()
+            return {'indexes': proposals, 'rules': []}
+        finally:
+            if not conn.closed:
+                conn.autocommit = False  # The connection goes back to the pool
+
+if __name__ == '__main__':
+    import sys
+
+    result = advise_indexes(create='--create' in sys.argv)
+    print("Proposed indexes:")
+    for proposal in result['indexes']:
+        print(f"  {proposal['sql']}")
+
+    print("\nEstimated cost per rule:")
+    for entry in result['rules']:
+        after = f"{entry['cost_after']:.2f}" if entry['cost_after'] is not None else "-"
+        print(f"  {entry['name']}: before {entry['cost_before']:.2f}, after {after}")
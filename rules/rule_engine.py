@@ -1,94 +1,646 @@
-from datetime import datetime
-from db.database import get_db_connection, get_active_rules
+import copy
+import re
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+from db.database import (
+    pooled_connection, get_active_rules, get_active_window_rules,
+    read_snapshot_xids, advance_settled_log_id
+)
+from db.data_unifier import refresh_alert_summary
 
 # Whitelist of allowed fields and operators to prevent SQL injection
 ALLOWED_TARGET_FIELDS = {'user_id', 'action', 'resource', 'status'}
 ALLOWED_OPERATORS = {'=', '!=', 'LIKE', 'IN'}
+ALLOWED_AGGREGATES = {'count', 'distinct_count'}
+ALLOWED_WINDOW_TYPES = {'sliding', 'tumbling'}
+
+# Field order of incoming log rows (matches ingestion.readers.LOG_COLUMNS)
+LOG_COLUMNS = ('timestamp', 'user_id', 'action', 'resource', 'status')
+
+def build_rule_predicate(target_field, operator, value):
+    """
+    Builds the SQL condition matching a rule against the 'logs' table.
+
+    The field and operator must already be checked against the whitelists.
+    For IN, the value is a comma-separated list.
+
+    Returns:
+        tuple: The SQL condition and its query parameters.
+    """
+    if operator == 'IN':
+        return f"{target_field} = ANY(%s)", [[item.strip() for item in value.split(',')]]
+    return f"{target_field} {operator} %s", [value]
+
+def insert_alerts(cur, alerts, alert_ts):
+    """
+    Records alerts, skipping the ones already recorded.
+
+    Each alert is stored with the timestamp of its log (log_ts), read from
+    'logs'. log_ts is part of the unique key on 'alerts' and, on the
+    partitioned schema, its partition key, so an alert raised again for the
+    same log and rule always conflicts with the first one.
+
+    Args:
+        cur: An open psycopg2 cursor.
+        alerts (list): (log_id, rule_id, description) tuples.
+        alert_ts (datetime): The time the alerts were raised.
+
+    Returns:
+        int: The number of alerts inserted.
+    """
+    if not alerts:
+        return 0
+
+    inserted = execute_values(
+        cur,
+        """
+        INSERT INTO alerts (log_id, rule_id, log_ts, timestamp, description)
+        SELECT v.log_id, v.rule_id, l.timestamp, v.raised_at, v.description
+        FROM (VALUES %s) AS v (log_id, rule_id, raised_at, description)
+        JOIN logs l ON l.id = v.log_id
+        ON CONFLICT (log_id, rule_id, log_ts) DO NOTHING
+        RETURNING id
+        """,
+        [(log_id, rule_id, alert_ts, description) for log_id, rule_id, description in alerts],
+        template="(%s::integer, %s::integer, %s::timestamp, %s::text)",
+        fetch=True
+    )
+    return len(inserted)
+
+def _run_window_rule(cur, rule, last_log_id, max_log_id, alert_ts):
+    """
+    Evaluates a window rule over the logs in (last_log_id, max_log_id].
+
+    Only the new matching logs, plus the older matching logs that can still
+    share a window with them, are read and replayed through a WindowedRule.
+
+    Returns:
+        int: The number of alerts inserted.
+    """
+    evaluator = WindowedRule(rule)
+    predicate, params = build_rule_predicate(evaluator.target_field, evaluator.operator, evaluator.value)
+
+    cur.execute(f"SELECT MIN(timestamp) FROM logs WHERE id > %s AND id <= %s AND {predicate}",
+                (last_log_id, max_log_id, *params))
+    first_new_ts = cur.fetchone()[0]
+    if first_new_ts is None:
+        return 0
+
+    distinct_column = evaluator.distinct_field if evaluator.aggregate == 'distinct_count' else 'NULL'
+    cur.execute(
+        f"""
+        SELECT id, timestamp, {evaluator.group_by_field}, {distinct_column}, user_id
+        FROM logs
+        WHERE id <= %s AND timestamp >= %s AND {predicate}
+        ORDER BY timestamp, id
+        """,
+        (max_log_id, evaluator.context_start(first_new_ts), *params)
+    )
+    alerts = []
+    for log_id, ts, key, distinct_value, user_id in cur.fetchall():
+        for alert_log_id, alert_user_id in evaluator.feed(log_id, ts, key, distinct_value, user_id):
+            alerts.append((alert_log_id, evaluator.rule_id,
+                           f"User '{alert_user_id}' triggered rule '{evaluator.rule_name}'"))
+    return insert_alerts(cur, alerts, alert_ts)
+
+def _run_rules_single_pass(cur, pending_rules, max_log_id, alert_ts):
+    """
+    Evaluates several match rules with a single scan of the new logs.
+
+    Every log after the lowest watermark is read once, and a LATERAL
+    UNION ALL of the rule conditions emits one (log_id, rule_id) pair per
+    violation. Each branch still honours its own rule's watermark.
+
+    Args:
+        pending_rules (list): (rule_id, rule_name, predicate, params, last_log_id) tuples.
 
-def run_rules():
+    Returns:
+        int: The number of alerts inserted.
+    """
+    branches = []
+    params = [alert_ts]
+    for rule_id, rule_name, predicate, rule_params, last_log_id in pending_rules:
+        # Unqualified field names inside the LATERAL subquery refer to the outer 'l' row
+        branches.append(f"SELECT %s::integer AS rule_id, %s::text AS rule_name WHERE l.id > %s AND {predicate}")
+        params.extend([rule_id, rule_name, last_log_id, *rule_params])
+    params.extend([min(rule[4] for rule in pending_rules), max_log_id])
+
+    cur.execute(
+        f"""
+        INSERT INTO alerts (log_id, rule_id, log_ts, timestamp, description)
+        SELECT l.id, m.rule_id, l.timestamp, %s,
+               'User ''' || l.user_id || ''' triggered rule ''' || m.rule_name || ''''
+        FROM logs l
+        CROSS JOIN LATERAL ({" UNION ALL ".join(branches)}) m
+        WHERE l.id > %s AND l.id <= %s
+        ON CONFLICT (log_id, rule_id, log_ts) DO NOTHING
+        """,
+        params
+    )
+    return cur.rowcount
+
+def _save_watermarks(cur, rule_ids, watermarks, max_log_id, xmax):
+    """
+    Records that the given rules have been evaluated up to max_log_id.
+
+    Args:
+        watermarks (dict): rule id -> (settled id scanned from, settled id to store).
+        xmax (int): The snapshot xmax read just after max_log_id.
+    """
+    cur.execute(
+        """
+        UPDATE rules r
+        SET last_evaluated_log_id = %s, evaluated_xmax = %s, settled_log_id = v.settled_log_id
+        FROM unnest(%s::integer[], %s::integer[]) AS v (id, settled_log_id)
+        WHERE r.id = v.id
+        """,
+        (max_log_id, xmax, rule_ids, [watermarks.get(rule_id, (0, 0))[1] for rule_id in rule_ids])
+    )
+
+def run_rules(full_rescan=False, single_pass=False):
     """
     Runs all active compliance rules from the database against the logs
     and stores any violations in the 'alerts' table.
-    """
-    conn = get_db_connection()
-    if not conn:
-        print("Could not connect to the database to run rules.")
-        return
 
+    Each rule is evaluated as a single INSERT ... SELECT on the server, limited
+    to logs newer than the rule's settled watermark (rules.settled_log_id), so a
+    run costs O(new logs) rather than O(history). The settled id only moves up to
+    a previous run's last_evaluated_log_id once every transaction that could still
+    commit a log below it has finished (see advance_settled_log_id()), so logs that
+    commit late are evaluated by a later run. The unique (log_id, rule_id, log_ts)
+    constraint on 'alerts' makes already-reported violations a no-op through
+    ON CONFLICT DO NOTHING. When new alerts were stored, the 'alert_summary'
+    view read by the dashboard is refreshed.
+
+    Window rules replay only the new matching logs, plus the older ones still
+    inside their window, through a WindowedRule instead of a GROUP BY over the
+    whole table.
+
+    Args:
+        full_rescan (bool): Ignore the watermarks and re-evaluate every log.
+        single_pass (bool): Evaluate all match rules in one scan of the new logs
+            instead of one statement per rule.
+    """
     alerts_generated = 0
     active_rules = get_active_rules()
+    window_rules = get_active_window_rules()
 
-    if not active_rules:
+    if not active_rules and not window_rules:
         print("No active rules to run.")
         return
 
-    try:
-        with conn.cursor() as cur:
-            for rule_id, rule_name, description, target_field, operator, value in active_rules:
-                # --- Security Check ---
-                if target_field not in ALLOWED_TARGET_FIELDS or operator not in ALLOWED_OPERATORS:
-                    print(f"Skipping rule '{rule_name}' due to invalid field or operator.")
-                    continue
-
-                # --- Dynamic Query Construction ---
-                sql_query = f"SELECT id, timestamp, user_id, resource FROM logs WHERE {target_field} {operator} %s"
-
-                cur.execute(sql_query, (value,))
-                violating_logs = cur.fetchall()
-
-                for log_id, ts, user_id, resource in violating_logs:
-                    alert_ts = datetime.now()
-                    alert_description = f"User '{user_id}' triggered rule '{rule_name}'"
-
-                    # Check if this specific alert (log_id + rule_id) already exists to avoid duplicates
-                    cur.execute(
-                        "SELECT id FROM alerts WHERE log_id = %s AND rule_id = %s",
-                        (log_id, rule_id)
-                    )
-                    if cur.fetchone() is None:
+    with pooled_connection() as conn:
+        if not conn:
+            print("Could not connect to the database to run rules.")
+            return
+
+        try:
+            with conn.cursor() as cur:
+                alert_ts = datetime.now()
+                # Logs committed after this snapshot are left for the next run. Those with
+                # ids below max_log_id stay above the settled watermark until xmin passes xmax.
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM logs")
+                max_log_id = cur.fetchone()[0]
+                xmin, xmax = read_snapshot_xids(cur)
+                cur.execute(
+                    """
+                    SELECT id, settled_log_id, last_evaluated_log_id, evaluated_xmax
+                    FROM rules WHERE is_active = TRUE
+                    """
+                )
+                # rule id -> (settled id to scan from, settled id to store after this run)
+                watermarks = {
+                    rule_id: (settled, advance_settled_log_id(settled, last_evaluated, evaluated_xmax, xmin))
+                    for rule_id, settled, last_evaluated, evaluated_xmax in cur.fetchall()
+                }
+
+                pending_rules = []
+                for rule_id, rule_name, description, target_field, operator, value in active_rules:
+                    # --- Security Check ---
+                    if target_field not in ALLOWED_TARGET_FIELDS or operator not in ALLOWED_OPERATORS:
+                        print(f"Skipping rule '{rule_name}' due to invalid field or operator.")
+                        continue
+
+                    last_log_id = 0 if full_rescan else watermarks.get(rule_id, (0, 0))[0]
+                    if last_log_id >= max_log_id:
+                        continue
+
+                    # --- Dynamic Query Construction ---
+                    predicate, params = build_rule_predicate(target_field, operator, value)
+                    pending_rules.append((rule_id, rule_name, predicate, params, last_log_id))
+
+                if single_pass and len(pending_rules) > 1:
+                    alerts_generated += _run_rules_single_pass(cur, pending_rules, max_log_id, alert_ts)
+                else:
+                    for rule_id, rule_name, predicate, params, last_log_id in pending_rules:
                         cur.execute(
-                            """
-                            INSERT INTO alerts (log_id, rule_id, timestamp, description)
-                            VALUES (%s, %s, %s, %s)
+                            f"""
+                            INSERT INTO alerts (log_id, rule_id, log_ts, timestamp, description)
+                            SELECT id, %s, timestamp, %s,
+                                   'User ''' || user_id || ''' triggered rule ''' || %s || ''''
+                            FROM logs
+                            WHERE id > %s AND id <= %s AND {predicate}
+                            ON CONFLICT (log_id, rule_id, log_ts) DO NOTHING
                             """,
-                            (log_id, rule_id, alert_ts, alert_description)
+                            (rule_id, alert_ts, rule_name, last_log_id, max_log_id, *params)
                         )
-                        alerts_generated += 1
+                        alerts_generated += cur.rowcount
+
+                if pending_rules:
+                    _save_watermarks(cur, [rule[0] for rule in pending_rules], watermarks, max_log_id, xmax)
+
+                for rule in window_rules:
+                    rule_id, rule_name = rule[0], rule[1]
+                    if not is_valid_window_rule(rule):
+                        print(f"Skipping rule '{rule_name}' due to invalid window settings.")
+                        continue
+
+                    last_log_id = 0 if full_rescan else watermarks.get(rule_id, (0, 0))[0]
+                    if last_log_id >= max_log_id:
+                        continue
+
+                    alerts_generated += _run_window_rule(cur, rule, last_log_id, max_log_id, alert_ts)
+                    _save_watermarks(cur, [rule_id], watermarks, max_log_id, xmax)
+
+                conn.commit()
+            rule_count = len(active_rules) + len(window_rules)
+            print(f"Rule engine finished. Generated {alerts_generated} new alerts based on {rule_count} active rules.")
+            if alerts_generated:
+                refresh_alert_summary()
+        except Exception as e:
+            print(f"Error running rule engine: {e}")
+            conn.rollback()
+
+def like_to_regex(pattern):
+    """
+    Translates a SQL LIKE pattern into a compiled regular expression.
+
+    '%' matches any sequence, '_' any single character and a backslash escapes
+    the next character, as in PostgreSQL's default LIKE syntax.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return re.compile(''.join(parts), re.DOTALL)
 
-            conn.commit()
-        print(f"Rule engine finished. Generated {alerts_generated} new alerts based on {len(active_rules)} active rules.")
-    except Exception as e:
-        print(f"Error running rule engine: {e}")
-        conn.rollback()
-    finally:
-        if conn:
-            conn.close()
+def _epoch_seconds(timestamp):
+    """Converts a datetime (naive values are treated as UTC) to seconds since the epoch."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+def _parse_timestamp(value):
+    """
+    Parses a log timestamp as read from an input file, or returns None.
+
+    Any UTC offset is dropped, as PostgreSQL does when storing it in a TIMESTAMP
+    column, so timestamps with and without an offset can be compared.
+    """
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+    return value.replace(tzinfo=None)
+
+def is_valid_window_rule(rule):
+    """Checks a window rule tuple (see get_active_window_rules) against the whitelists."""
+    (_, _, _, target_field, operator, _, group_by_field, aggregate,
+     distinct_field, window_type, window_seconds, threshold) = rule
+    return (
+        target_field in ALLOWED_TARGET_FIELDS and operator in ALLOWED_OPERATORS
+        and group_by_field in ALLOWED_TARGET_FIELDS
+        and aggregate in ALLOWED_AGGREGATES
+        and (aggregate != 'distinct_count' or distinct_field in ALLOWED_TARGET_FIELDS)
+        and window_type in ALLOWED_WINDOW_TYPES
+        and bool(window_seconds) and window_seconds > 0
+        and bool(threshold) and threshold > 0
+    )
+
+class WindowedRule:
+    """
+    Incremental evaluator for a windowed threshold rule.
+
+    Events that pass the rule's condition are fed in timestamp order. Once the
+    count (or distinct count of `distinct_field`) of events for a group key
+    reaches the threshold within the window, every contributing event that has
+    not been reported yet is returned for alerting, and so is each further event
+    while the threshold stays reached.
+
+    State per key is bounded: a sliding count keeps only the last `threshold`
+    events, a sliding distinct count keeps the latest event per value inside
+    the window, and a tumbling window keeps only its current bucket. Keys that
+    have been idle for a whole window are evicted periodically.
+    """
+    EVICT_EVERY = 1000
+
+    def __init__(self, rule):
+        """
+        Args:
+            rule (tuple): A window rule as returned by get_active_window_rules.
+        """
+        (self.rule_id, self.rule_name, _, self.target_field, self.operator, self.value,
+         self.group_by_field, self.aggregate, self.distinct_field, self.window_type,
+         self.window_seconds, self.threshold) = rule
+        self.spec = tuple(rule[3:])
+        self._state = {}
+        self._last_seen = {}
+        self._latest = None
+        self._events_seen = 0
+
+    def __len__(self):
+        """The number of group keys currently holding state."""
+        return len(self._state)
+
+    def context_start(self, timestamp):
+        """Returns the earliest event time that can share a window with `timestamp`."""
+        if self.window_type == 'tumbling':
+            return timestamp - timedelta(seconds=_epoch_seconds(timestamp) % self.window_seconds)
+        return timestamp - timedelta(seconds=self.window_seconds)
+
+    def feed(self, log_id, timestamp, key, distinct_value=None, user_id=None):
+        """
+        Adds one matching event and returns the events to alert on.
+
+        Returns:
+            list: (log_id, user_id) pairs that have newly crossed the threshold.
+        """
+        if self.aggregate == 'distinct_count' and distinct_value is None:
+            return []  # NULLs are not counted, as with COUNT(DISTINCT ...)
+
+        ts = _epoch_seconds(timestamp)
+        self._latest = ts if self._latest is None else max(self._latest, ts)
+        if self.window_type == 'tumbling':
+            fired = self._feed_tumbling(log_id, ts, key, distinct_value, user_id)
+        else:
+            fired = self._feed_sliding(log_id, ts, key, distinct_value, user_id)
+
+        self._events_seen += 1
+        if self._events_seen % self.EVICT_EVERY == 0:
+            self._evict_idle_keys()
+        return fired
+
+    def _feed_sliding(self, log_id, ts, key, distinct_value, user_id):
+        # Each event is [timestamp, log_id, user_id, reported]
+        event = [ts, log_id, user_id, False]
+        self._last_seen[key] = ts
+        if self.aggregate == 'count':
+            events = self._state.setdefault(key, deque(maxlen=self.threshold))
+            events.append(event)
+            while ts - events[0][0] > self.window_seconds:
+                events.popleft()
+            active = events
+        else:
+            latest_by_value = self._state.setdefault(key, OrderedDict())
+            latest_by_value.pop(distinct_value, None)
+            latest_by_value[distinct_value] = event
+            while ts - next(iter(latest_by_value.values()))[0] > self.window_seconds:
+                latest_by_value.popitem(last=False)
+            active = latest_by_value.values()
+
+        if len(active) < self.threshold:
+            return []
+        fired = []
+        for event in active:
+            if not event[3]:
+                event[3] = True
+                fired.append((event[1], event[2]))
+        return fired
+
+    def _feed_tumbling(self, log_id, ts, key, distinct_value, user_id):
+        bucket = int(ts // self.window_seconds)
+        state = self._state.get(key)
+        if state is None or state['bucket'] != bucket:
+            # Pending events are keyed by distinct value (or log id for plain counts)
+            state = self._state[key] = {'bucket': bucket, 'pending': OrderedDict(), 'count': 0, 'fired': False}
+
+        if state['fired']:
+            return [(log_id, user_id)]
+
+        pending = state['pending']
+        if self.aggregate == 'count':
+            pending[log_id] = (log_id, user_id)
+            state['count'] += 1
+        else:
+            pending.pop(distinct_value, None)
+            pending[distinct_value] = (log_id, user_id)
+            state['count'] = len(pending)
+
+        if state['count'] < self.threshold:
+            return []
+        state['fired'] = True
+        fired = list(pending.values())
+        pending.clear()
+        return fired
+
+    def snapshot(self):
+        """Returns a copy of the per-key state, for restore() if the events fed next are rolled back."""
+        return copy.deepcopy((self._state, self._last_seen, self._latest, self._events_seen))
+
+    def restore(self, snapshot):
+        """Returns the evaluator to the state captured by snapshot()."""
+        self._state, self._last_seen, self._latest, self._events_seen = copy.deepcopy(snapshot)
+
+    def _evict_idle_keys(self):
+        if self.window_type == 'tumbling':
+            current_bucket = int(self._latest // self.window_seconds)
+            idle = [key for key, state in self._state.items() if state['bucket'] < current_bucket]
+        else:
+            idle = [key for key, last_seen in self._last_seen.items() if self._latest - last_seen > self.window_seconds]
+            for key in idle:
+                del self._last_seen[key]
+        for key in idle:
+            del self._state[key]
+
+class CompiledRuleSet:
+    """
+    Active match rules compiled into an in-process matcher for incoming logs.
+
+    Rules are grouped by target field so each field of a row is looked at
+    once: '=' and 'IN' rules share one hash lookup from value to rule ids,
+    '!=' rules match everything except the rules keyed by the row's value,
+    and LIKE patterns are precompiled regular expressions. NULL values never
+    match, as in SQL.
+
+    Window rules are compiled the same way for their condition, and matching
+    rows are fed to a WindowedRule that carries its per-key state across batches.
+    """
+    def __init__(self, rules, columns=LOG_COLUMNS, window_rules=(), previous=None):
+        """
+        Args:
+            rules (list): Rule tuples as returned by get_active_rules.
+            columns (tuple): The field order of the rows that will be matched.
+            window_rules (list): Rule tuples as returned by get_active_window_rules.
+            previous (CompiledRuleSet): A rule set being replaced; window state of
+                rules whose settings are unchanged is kept.
+        """
+        self.rule_names = {}
+        self.window_rules = {}
+        self._equals = defaultdict(lambda: defaultdict(list))
+        self._not_equals = defaultdict(lambda: defaultdict(list))
+        self._not_equals_all = defaultdict(list)
+        self._like = defaultdict(list)
+
+        for rule_id, rule_name, description, target_field, operator, value in rules:
+            if target_field not in ALLOWED_TARGET_FIELDS or operator not in ALLOWED_OPERATORS:
+                print(f"Skipping rule '{rule_name}' due to invalid field or operator.")
+                continue
+            self.rule_names[rule_id] = rule_name
+            if operator == '=':
+                self._equals[target_field][value].append(rule_id)
+            elif operator == 'IN':
+                for item in {item.strip() for item in value.split(',')}:
+                    self._equals[target_field][item].append(rule_id)
+            elif operator == '!=':
+                self._not_equals[target_field][value].append(rule_id)
+                self._not_equals_all[target_field].append(rule_id)
+            else:
+                self._like[target_field].append((like_to_regex(value), rule_id))
+
+        fields = set(self._equals) | set(self._not_equals_all) | set(self._like)
+        self._positions = [(field, columns.index(field)) for field in sorted(fields)]
+        self._columns = columns
+
+        for rule in window_rules:
+            if not is_valid_window_rule(rule):
+                print(f"Skipping rule '{rule[1]}' due to invalid window settings.")
+                continue
+            kept = previous.window_rules.get(rule[0]) if previous else None
+            evaluator = kept if kept is not None and kept.spec == tuple(rule[3:]) else WindowedRule(rule)
+            self.window_rules[evaluator.rule_id] = evaluator
+            self.rule_names[evaluator.rule_id] = evaluator.rule_name
+        self._window_conditions = None
+        if self.window_rules:
+            conditions = [rule[:6] for rule in window_rules if rule[0] in self.window_rules]
+            self._window_conditions = CompiledRuleSet(conditions, columns)
+
+    def __len__(self):
+        return len(self.rule_names)
+
+    def match(self, row):
+        """Returns the ids of every rule the row (a tuple ordered like `columns`) violates."""
+        matched = []
+        for field, position in self._positions:
+            value = row[position]
+            if value is None:
+                continue
+            equals = self._equals.get(field)
+            if equals:
+                matched.extend(equals.get(value, ()))
+            not_equals = self._not_equals_all.get(field)
+            if not_equals:
+                excluded = self._not_equals[field].get(value, ())
+                matched.extend(rule_id for rule_id in not_equals if rule_id not in excluded)
+            for pattern, rule_id in self._like.get(field, ()):
+                if pattern.fullmatch(str(value)):
+                    matched.append(rule_id)
+        return matched
+
+    def evaluate(self, rows):
+        """
+        Matches a batch of rows against every compiled rule.
+
+        Returns:
+            list: (row_index, rule_id) pairs for every violation in the batch.
+        """
+        return [(index, rule_id) for index, row in enumerate(rows) for rule_id in self.match(row)]
+
+    def evaluate_windows(self, rows, log_ids):
+        """
+        Feeds a batch of rows, in timestamp order, to the window rules.
+
+        Args:
+            rows (list): Tuples ordered like `columns`.
+            log_ids (list): The log id of each row.
+
+        Returns:
+            list: (log_id, rule_id, user_id) triples for every event that crossed
+            a threshold, including events from earlier batches.
+        """
+        if not self.window_rules:
+            return []
+
+        positions = {field: index for index, field in enumerate(self._columns)}
+        events = []
+        for index, row in enumerate(rows):
+            ts = _parse_timestamp(row[positions['timestamp']])
+            if ts is not None:
+                events.append((ts, index))
+        events.sort(key=lambda event: event[0])
+
+        fired = []
+        for ts, index in events:
+            row = rows[index]
+            for rule_id in self._window_conditions.match(row):
+                evaluator = self.window_rules[rule_id]
+                distinct_value = row[positions[evaluator.distinct_field]] if evaluator.distinct_field else None
+                for log_id, user_id in evaluator.feed(log_ids[index], ts, row[positions[evaluator.group_by_field]],
+                                                      distinct_value, row[positions['user_id']]):
+                    fired.append((log_id, rule_id, user_id))
+        return fired
+
+    def snapshot_windows(self):
+        """
+        Captures the state of every window rule.
+
+        Window state changes as soon as rows are evaluated, so a writer takes a
+        snapshot before a batch and restores it if the batch is rolled back;
+        otherwise a retried batch would count its events twice.
+        """
+        return {rule_id: evaluator.snapshot() for rule_id, evaluator in self.window_rules.items()}
+
+    def restore_windows(self, snapshot):
+        """Returns every window rule to the state captured by snapshot_windows()."""
+        for rule_id, state in snapshot.items():
+            self.window_rules[rule_id].restore(state)
+
+def compile_active_rules(columns=LOG_COLUMNS, previous=None):
+    """
+    Loads the active rules from the database and compiles them into a CompiledRuleSet.
+
+    Args:
+        columns (tuple): The field order of the rows that will be matched.
+        previous (CompiledRuleSet): The rule set being refreshed, whose window state is kept.
+    """
+    return CompiledRuleSet(get_active_rules(), columns, get_active_window_rules(), previous)
 
 def get_alerts():
     """
     Retrieves all alerts from the database, joining with logs and rules
     to get human-readable information.
     """
-    conn = get_db_connection()
-    if not conn:
-        return []
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT a.id, a.timestamp, r.name, a.description, l.user_id, l.action, l.resource
-                FROM alerts a
-                JOIN logs l ON a.log_id = l.id
-                JOIN rules r ON a.rule_id = r.id
-                ORDER BY a.timestamp DESC
-            """)
-            return cur.fetchall()
-    except Exception as e:
-        print(f"Error fetching alerts: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+    with pooled_connection() as conn:
+        if not conn:
+            return []
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT a.id, a.timestamp, r.name, a.description, l.user_id, l.action, l.resource
+                    FROM alerts a
+                    JOIN logs l ON a.log_id = l.id
+                    JOIN rules r ON a.rule_id = r.id
+                    ORDER BY a.timestamp DESC
+                """)
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error fetching alerts: {e}")
+            return []
 
 if __name__ == '__main__':
     print("Running dynamic compliance rule engine...")
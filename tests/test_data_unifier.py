@@ -0,0 +1,133 @@
+import pytest
+from datetime import datetime
+from db.database import setup_database, get_db_connection
+from db.data_unifier import (
+    get_logs_page, get_new_logs, get_latest_ids, get_unified_alerts, get_unified_alerts_page,
+    get_alert_summary
+)
+from ingestion.log_ingester import ingest_logs
+from rules.rule_engine import run_rules
+
+@pytest.fixture(scope="module")
+def db_with_logs():
+    """Fixture to set up the database with the sample logs once for this module."""
+    setup_database()
+    ingest_logs(file_path='data/sample_logs.csv')
+    yield
+
+def test_logs_pages_cover_every_log_once(db_with_logs):
+    """Tests that keyset pages walk all logs, newest first, without gaps or repeats."""
+    pages = []
+    rows, cursor = get_logs_page(page_size=6)
+    pages.append(rows)
+    while cursor is not None:
+        rows, cursor = get_logs_page(page_size=6, after=cursor)
+        pages.append(rows)
+
+    assert [len(page) for page in pages] == [6, 6, 6, 2]
+    timestamps = [row[1] for page in pages for row in page]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+def test_logs_page_filters(db_with_logs):
+    """Tests field and time-range filters on the logs page."""
+    rows, cursor = get_logs_page(filters={'action': 'failed_login'})
+    assert len(rows) == 3 and cursor is None
+    assert all(row[4] == 'failed_login' for row in rows)
+
+    rows, _ = get_logs_page(start_time=datetime(2100, 1, 1))
+    assert rows == []
+
+def test_logs_page_rejects_unknown_filter(db_with_logs):
+    with pytest.raises(ValueError):
+        get_logs_page(filters={'id; DROP TABLE logs': 1})
+
+def test_delta_fetches_only_newer_rows(db_with_logs):
+    """Tests that delta fetches return only rows above the ids already shown."""
+    latest = get_latest_ids()
+    assert latest['logs'] == 20
+    assert len(get_new_logs(15, latest['logs'])) == 5
+    # A trailing window re-read skips the ids already shown
+    assert [row[0] for row in get_new_logs(0, latest['logs'], exclude_ids=range(1, 19))] == [20, 19]
+
+    run_rules()
+    latest = get_latest_ids()
+    everything = get_unified_alerts(until=latest)
+    assert len(everything) == 9
+    assert get_unified_alerts(since=latest) == []
+    shown = {alert['id'] for alert in everything[1:]}
+    assert get_unified_alerts(until=latest, exclude_ids=shown) == everything[:1]
+
+def test_unified_alert_pages(db_with_logs):
+    """Tests keyset pages and filters over the unified alerts view."""
+    run_rules()
+    everything = get_unified_alerts()
+
+    pages = []
+    alerts, cursor = get_unified_alerts_page(page_size=4)
+    pages.extend(alerts)
+    while cursor is not None:
+        alerts, cursor = get_unified_alerts_page(page_size=4, after=cursor)
+        pages.extend(alerts)
+    assert [alert['id'] for alert in pages] == [alert['id'] for alert in everything]
+
+    rule_alerts, _ = get_unified_alerts_page(alert_type='Rule-Based', severity='Medium')
+    assert len(rule_alerts) == len(everything)
+    assert get_unified_alerts_page(alert_type='ML-Based')[0] == []
+
+def test_alert_summary_counts(db_with_logs):
+    """Tests that the summary view, refreshed by the rule engine, counts alerts by every dimension."""
+    run_rules()
+
+    summary = get_alert_summary()
+    assert summary['total'] == 9
+    assert summary['by_type'] == {'Rule-Based': 9}
+    assert summary['by_severity'] == {'Medium': 9}
+    assert summary['by_rule'][0] == ('Admin Action on Sensitive DB', 4)
+    assert dict(summary['by_user']) == {'user-201': 4, 'admin-01': 3, 'user-104': 1, 'admin-02': 1}
+    assert sum(count for _, count in summary['by_hour']) == 9
+
+def test_alert_summary_on_empty_database():
+    """Tests that the summary of a database without alerts is all zeros instead of an error."""
+    setup_database()
+    try:
+        assert get_alert_summary() == {
+            'total': 0, 'by_severity': {}, 'by_type': {}, 'by_rule': [], 'by_user': [], 'by_hour': []
+        }
+    finally:
+        # Restore the module's sample logs for any test that runs after this one
+        setup_database()
+        ingest_logs(file_path='data/sample_logs.csv')
+
+def test_unified_alert_pages_merge_both_sources(db_with_logs):
+    """Tests that pages interleave alerts and anomalies and order ids as numbers, not text."""
+    try:
+        run_rules()
+        # A second copy of the logs takes the alert ids past 9
+        ingest_logs(file_path='data/sample_logs.csv')
+        run_rules()
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            # Anomalies raised at the same time as the second run's alerts
+            cur.execute(
+                """
+                INSERT INTO anomalies (log_id, log_ts, timestamp, score, details)
+                SELECT log_id, log_ts, timestamp, -0.3, 'test' FROM alerts WHERE id > 12
+                """
+            )
+        conn.commit()
+        conn.close()
+
+        pages = []
+        alerts, cursor = get_unified_alerts_page(page_size=4)
+        pages.extend(alerts)
+        while cursor is not None:
+            alerts, cursor = get_unified_alerts_page(page_size=4, after=cursor)
+            pages.extend(alerts)
+        assert [alert['id'] for alert in pages] == [alert['id'] for alert in get_unified_alerts()]
+        assert len(pages) == 24
+
+        rule_ids = [int(alert['id'].split('-')[1]) for alert in pages if alert['type'] == 'Rule-Based']
+        assert rule_ids == sorted(rule_ids, reverse=True)
+    finally:
+        setup_database()
+        ingest_logs(file_path='data/sample_logs.csv')
@@ -1,5 +1,5 @@
 import pytest
-from db.database import get_db_connection, setup_database
+from db.database import get_db_connection, setup_database, pooled_connection, get_pool_stats
 
 def test_db_connection():
     """Tests that a connection to the database can be established."""
@@ -33,4 +33,116 @@ def test_setup_database():
             assert cur.fetchone()[0] == 'alerts', "The 'alerts' table should exist after setup"
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+def test_pooled_connections_are_reused():
+    """Tests that consecutive pooled checkouts reuse an open connection."""
+    with pooled_connection() as conn:
+        assert conn is not None, "A pooled connection should be available"
+    before = get_pool_stats()
+
+    for _ in range(3):
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                assert cur.fetchone()[0] == 1
+
+    after = get_pool_stats()
+    assert after["opened"] == before["opened"], "No new connections should be opened"
+    assert after["reused"] == before["reused"] + 3
+
+def test_partitioned_schema_and_retention(tmp_path):
+    """Tests partition creation during ingestion and dropping partitions past retention."""
+    from datetime import datetime
+    from db.partitions import drop_expired_partitions
+    from ingestion.log_ingester import bulk_ingest_logs
+    from rules.rule_engine import run_rules, get_alerts
+
+    setup_database(partitioned=True)
+    try:
+        assert bulk_ingest_logs('data/sample_logs.csv') == 20
+        run_rules()
+        assert len(get_alerts()) == 9
+
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                # The sample logs all land in their month's partition, not the default one
+                cur.execute("SELECT COUNT(*) FROM logs_p202310")
+                assert cur.fetchone()[0] == 20
+                cur.execute("SELECT COUNT(*) FROM logs_default")
+                assert cur.fetchone()[0] == 0
+
+        dropped = drop_expired_partitions(30, archive_dir=str(tmp_path), now=datetime(2024, 1, 1))
+        assert "logs_p202310" in dropped
+        assert (tmp_path / "logs_p202310.csv.gz").exists()
+
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM logs")
+                assert cur.fetchone()[0] == 0
+    finally:
+        setup_database()
+
+def _alert_counts_after_reruns(partitioned):
+    """Ingests the sample logs, runs the rules twice and returns the alert count."""
+    from ingestion.log_ingester import bulk_ingest_logs
+    from rules.rule_engine import run_rules
+
+    setup_database(partitioned=partitioned)
+    bulk_ingest_logs('data/sample_logs.csv')
+    run_rules()
+    run_rules(full_rescan=True)
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM alerts")
+            return cur.fetchone()[0]
+
+def test_partitioned_alerts_match_plain_schema_and_retention():
+    """Re-running the rules adds no duplicates on either schema, and retention leaves no orphan alerts."""
+    from datetime import datetime
+    from db.partitions import drop_expired_partitions
+
+    try:
+        plain_count = _alert_counts_after_reruns(partitioned=False)
+        assert plain_count == 9
+        assert _alert_counts_after_reruns(partitioned=True) == plain_count
+
+        drop_expired_partitions(30, now=datetime(2024, 1, 1))
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM alerts")
+                assert cur.fetchone()[0] == 0
+                cur.execute("SELECT COUNT(*) FROM alerts a WHERE NOT EXISTS (SELECT 1 FROM logs l WHERE l.id = a.log_id)")
+                assert cur.fetchone()[0] == 0
+    finally:
+        setup_database()
+
+def test_partition_creation_moves_rows_out_of_default():
+    """Rows that landed in the default partition move into their month's partition once it is created."""
+    from datetime import datetime
+    from db.partitions import ensure_partitions
+
+    setup_database(partitioned=True)
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO logs (timestamp, user_id, action, resource, status) "
+                    "VALUES ('2021-05-04 10:00:00', 'user-101', 'login', 'auth-service', 'success') RETURNING id"
+                )
+                log_id = cur.fetchone()[0]
+                cur.execute(
+                    "INSERT INTO alerts (log_id, rule_id, log_ts, timestamp, description) "
+                    "VALUES (%s, 1, '2021-05-04 10:00:00', NOW(), 'test')",
+                    (log_id,)
+                )
+                assert ensure_partitions(cur, [datetime(2021, 5, 1)]) == 3
+                cur.execute("SELECT COUNT(*) FROM logs_default")
+                assert cur.fetchone()[0] == 0
+                cur.execute("SELECT id FROM logs_p202105")
+                assert cur.fetchall() == [(log_id,)]
+                cur.execute("SELECT COUNT(*) FROM alerts_p202105")
+                assert cur.fetchone()[0] == 1
+            conn.commit()
+    finally:
+        setup_database()
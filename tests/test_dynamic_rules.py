@@ -6,6 +6,8 @@ from db.database import (
 )
 from ingestion.log_ingester import ingest_logs
 from rules.rule_engine import run_rules, get_alerts
+from rules.index_advisor import advise_indexes
+from db.partitions import existing_partitions
 
 @pytest.fixture(scope="function")
 def db_setup_for_rules():
@@ -83,4 +85,154 @@ def test_dynamic_rule_engine_execution(db_setup_for_rules):
         "Admin Action on Sensitive DB",
         "Multiple Failed Logins"
     }
-    assert triggered_rule_names == expected_rules, "All three default rules should have been triggered."
\ No newline at end of file
+    assert triggered_rule_names == expected_rules, "All three default rules should have been triggered."
+
+def test_rule_engine_does_not_duplicate_alerts(db_setup_for_rules):
+    """Running the engine again must not re-alert on already flagged logs."""
+    run_rules()
+    run_rules()
+    assert len(get_alerts()) == 9, "A second run should not create duplicate alerts."
+
+def test_in_operator_rule(db_setup_for_rules):
+    """Tests that IN rules match any value from a comma-separated list."""
+    add_rule(
+        name="Destructive or Failed Actions",
+        description="Flags deletes and failed logins.",
+        target_field="action",
+        operator="IN",
+        value="delete, failed_login",
+        is_active=True
+    )
+    run_rules()
+
+    in_alerts = [alert for alert in get_alerts() if alert[2] == "Destructive or Failed Actions"]
+    # 2 deletes + 3 failed logins
+    assert len(in_alerts) == 5
+
+def test_incremental_rule_evaluation(db_setup_for_rules):
+    """Only logs newer than each rule's watermark are evaluated on later runs."""
+    run_rules()
+    assert len(get_alerts()) == 9
+
+    # A second copy of the sample logs produces the same violations again
+    ingest_logs(file_path='data/sample_logs.csv')
+    run_rules()
+    assert len(get_alerts()) == 18
+
+def test_rule_update_triggers_full_reevaluation(db_setup_for_rules):
+    """Changing a rule's definition re-evaluates it against all existing logs."""
+    run_rules()
+    rule = next(r for r in get_all_rules() if r[1] == "Unauthorized Access Attempt")
+
+    update_rule(rule[0], rule[1], rule[2], "status", "=", "failure", True)
+    run_rules()
+
+    # 1 failed write + 3 failed logins are flagged by the updated rule
+    alerts = get_alerts()
+    assert len(alerts) == 13
+
+def test_single_pass_matches_per_rule_evaluation(db_setup_for_rules):
+    """Evaluating all match rules in one scan yields the same alerts as per-rule runs."""
+    add_rule(
+        name="Destructive or Failed Actions",
+        description="Flags deletes and failed logins.",
+        target_field="action",
+        operator="IN",
+        value="delete, failed_login",
+        is_active=True
+    )
+    run_rules(single_pass=True)
+    assert len(get_alerts()) == 14
+
+    # Watermarks were advanced, so a per-rule run adds nothing
+    run_rules()
+    assert len(get_alerts()) == 14
+
+def test_index_advisor_creates_indexes(db_setup_for_rules):
+    """The advisor creates indexes for the active rules and reports costs for each."""
+    result = advise_indexes(create=True)
+
+    assert len(result['rules']) == 2
+    for entry in result['rules']:
+        assert entry['indexes']
+        assert entry['cost_before'] > 0 and entry['cost_after'] > 0
+
+    # Alerts are unchanged once the indexes exist
+    run_rules()
+    assert len(get_alerts()) == 9
+
+def test_index_advisor_indexes_partitioned_logs():
+    """On the partitioned schema every partition gets a valid index, attached to the parent's."""
+    setup_database(partitioned=True)
+    try:
+        ingest_logs(file_path='data/sample_logs.csv')
+        result = advise_indexes(create=True)
+        assert all(entry['cost_after'] > 0 for entry in result['rules'])
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                partitions = existing_partitions(cur, 'logs')
+                assert {'logs_p202310', 'logs_default'} <= partitions
+                cur.execute(
+                    """
+                    SELECT COUNT(*), COUNT(*) FILTER (WHERE NOT i.indisvalid) FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname LIKE 'idx_logs_user_id_pattern%'
+                    """
+                )
+                # The parent's index and one per partition, all valid
+                assert cur.fetchone() == (len(partitions) + 1, 0)
+        finally:
+            conn.close()
+    finally:
+        setup_database()
+
+def test_rule_engine_catches_late_committed_logs(db_setup_for_rules):
+    """Logs committed after a run has moved past their ids are still evaluated by the next run."""
+    run_rules()
+    insert_log = (
+        "INSERT INTO logs (timestamp, user_id, action, resource, status) "
+        "VALUES ('2023-10-28T10:00:00', 'user-301', 'write', 'files', 'unauthorized')"
+    )
+    late_conn = get_db_connection()
+    early_conn = get_db_connection()
+    try:
+        # The late writer takes the lower id but commits after the early one and after a run
+        with late_conn.cursor() as cur:
+            cur.execute(insert_log)
+        with early_conn.cursor() as cur:
+            cur.execute(insert_log)
+        early_conn.commit()
+        run_rules()
+        assert len(get_alerts()) == 10
+        # While the late writer is still open the settled watermark stays below its id
+        run_rules()
+        assert len(get_alerts()) == 10
+
+        late_conn.commit()
+        run_rules()
+        assert len(get_alerts()) == 11
+    finally:
+        late_conn.close()
+        early_conn.close()
+
+def test_settled_watermark_skips_already_evaluated_logs(db_setup_for_rules):
+    """With no writer in flight, a run starts after the logs the previous run evaluated."""
+    run_rules()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MAX(id) FROM logs")
+            first_max = cur.fetchone()[0]
+        conn.commit()
+
+        ingest_logs(file_path='data/sample_logs.csv')
+        run_rules()
+        with conn.cursor() as cur:
+            cur.execute("SELECT MAX(id) FROM logs")
+            second_max = cur.fetchone()[0]
+            cur.execute("SELECT DISTINCT settled_log_id, last_evaluated_log_id FROM rules WHERE is_active")
+            assert cur.fetchall() == [(first_max, second_max)]
+    finally:
+        conn.close()
@@ -0,0 +1,333 @@
+import gzip
+import json
+import shutil
+import threading
+import time
+import pytest
+from db.database import setup_database, get_db_connection
+from ingestion.readers import LOG_COLUMNS, iter_log_batches
+from ingestion.log_ingester import bulk_ingest_logs, stream_ingest_logs, ingest_directory, follow_logs
+
+@pytest.fixture(scope="function")
+def clean_db():
+    """Fixture to give each ingestion test an empty database."""
+    setup_database()
+    yield
+
+def count_logs():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM logs")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+def test_bulk_ingest_logs(clean_db):
+    """Tests that COPY-based ingestion loads every sample row, across several batches."""
+    inserted = bulk_ingest_logs('data/sample_logs.csv', batch_size=7)
+    assert inserted == 20
+    assert count_logs() == 20
+
+def test_bulk_ingest_skips_malformed_rows(clean_db, tmp_path):
+    """Rows missing a required value are skipped, the rest are still ingested."""
+    csv_file = tmp_path / "logs.csv"
+    csv_file.write_text(
+        "timestamp,user_id,action,resource,status\n"
+        "2023-10-27T10:00:00Z,user-101,login,auth-service,success\n"
+        "2023-10-27T10:05:00Z,user-102\n"
+        "2023-10-27T10:10:00Z,user-103,write,customer-db,failure\n"
+        ",user-104,read,financial-records,unauthorized\n"
+        "2023-10-27T10:20:00Z,admin-01,delete\n"
+    )
+    assert bulk_ingest_logs(str(csv_file), batch_size=2) == 3
+    assert count_logs() == 3
+
+    # A header without every log column still makes the whole file malformed
+    csv_file.write_text(
+        "timestamp,user_id,action,resource\n"
+        "2023-10-27T10:00:00Z,user-101,login,auth-service\n"
+    )
+    assert bulk_ingest_logs(str(csv_file)) == 0
+    assert count_logs() == 3
+
+def test_stream_ingest_resumes_from_checkpoint(clean_db, tmp_path):
+    """A second run only ingests rows appended after the last committed chunk."""
+    with open('data/sample_logs.csv') as f:
+        lines = f.readlines()
+    csv_file = tmp_path / "logs.csv"
+    csv_file.write_text("".join(lines[:11]))
+
+    assert stream_ingest_logs(str(csv_file), chunk_size=4) == 10
+    assert stream_ingest_logs(str(csv_file), chunk_size=4) == 0
+
+    csv_file.write_text("".join(lines))
+    assert stream_ingest_logs(str(csv_file), chunk_size=4) == 10
+    assert count_logs() == 20
+
+def test_ingest_directory_in_parallel(clean_db, tmp_path):
+    """Every file in the directory is ingested and summarized separately."""
+    for name in ("server-a.csv", "server-b.csv"):
+        shutil.copy('data/sample_logs.csv', tmp_path / name)
+
+    summary = ingest_directory(str(tmp_path), workers=2, batch_size=5, split_bytes=256)
+    assert len(summary) == 2
+    assert all(stats['ingested'] == 20 and stats['skipped'] == 0 for stats in summary.values())
+    assert count_logs() == 40
+
+def test_ingest_directory_with_splits_smaller_than_the_header(clean_db, tmp_path):
+    """Byte ranges smaller than the header line neither drop nor duplicate rows."""
+    shutil.copy('data/sample_logs.csv', tmp_path / "logs.csv")
+
+    summary = ingest_directory(str(tmp_path), workers=2, batch_size=5, split_bytes=8)
+    assert summary[str(tmp_path / "logs.csv")]['ingested'] == 20
+    assert count_logs() == 20
+
+def test_ingest_directory_counts_unparseable_files(clean_db, tmp_path):
+    """A file whose parser raises is reported in its summary; the other files are still ingested."""
+    shutil.copy('data/sample_logs.csv', tmp_path / "good.csv")
+    (tmp_path / "broken.csv.gz").write_bytes(b"not gzip data")
+
+    summary = ingest_directory(str(tmp_path), pattern='*.csv*', workers=2, batch_size=5)
+    assert summary[str(tmp_path / "broken.csv.gz")]['parse_errors'] == 1
+    assert summary[str(tmp_path / "good.csv")]['ingested'] == 20
+    assert count_logs() == 20
+
+def test_ingest_directory_survives_broken_writer_connections(clean_db, tmp_path):
+    """Writers whose connections break keep draining the queue, so parsers never block on it."""
+    from unittest.mock import patch
+
+    for name in ("server-a.csv", "server-b.csv"):
+        shutil.copy('data/sample_logs.csv', tmp_path / name)
+
+    def break_connection(cur, months):
+        cur.connection.close()
+        raise RuntimeError("connection lost")
+
+    result = {}
+    with patch('ingestion.log_ingester.ensure_partitions', side_effect=break_connection):
+        # One row per batch: far more batches than the queue holds
+        ingester = threading.Thread(target=lambda: result.update(
+            ingest_directory(str(tmp_path), workers=2, writer_connections=1, batch_size=1)
+        ))
+        ingester.start()
+        ingester.join(timeout=30)
+    assert not ingester.is_alive(), "ingest_directory should not deadlock when its writers fail"
+    assert len(result) == 2
+    assert all(stats['failed'] == 20 and stats['ingested'] == 0 for stats in result.values())
+
+def test_follow_logs_ingests_appended_lines(clean_db, tmp_path):
+    """Lines appended to a followed file are inserted within the flush interval."""
+    log_file = tmp_path / "live.csv"
+    log_file.write_text("timestamp,user_id,action,resource,status\n")
+
+    stop = threading.Event()
+    follower = threading.Thread(
+        target=follow_logs, args=(str(log_file),),
+        kwargs={'flush_interval': 0.1, 'poll_interval': 0.05, 'stop_event': stop}
+    )
+    follower.start()
+    try:
+        time.sleep(0.2)
+        with open(log_file, 'a') as f:
+            f.write("2023-10-27T12:00:00Z,user-101,login,auth-service,success\n")
+            f.write("2023-10-27T12:00:01Z,user-102,read,customer-db,success\n")
+        time.sleep(0.5)
+        assert count_logs() == 2
+    finally:
+        stop.set()
+        follower.join()
+
+def test_follow_logs_retries_a_failed_batch(clean_db, tmp_path):
+    """A batch whose write fails is kept and written on a later poll instead of being lost."""
+    from unittest.mock import patch
+    from ingestion import log_ingester
+
+    log_file = tmp_path / "live.csv"
+    log_file.write_text("timestamp,user_id,action,resource,status\n"
+                        "2023-10-27T12:00:00Z,user-101,login,auth-service,success\n"
+                        "2023-10-27T12:00:01Z,user-102,read,customer-db,success\n")
+    copy_rows = log_ingester._copy_rows
+    calls = []
+
+    def fail_once(cur, rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise RuntimeError("connection lost")
+        return copy_rows(cur, rows)
+
+    stop = threading.Event()
+    with patch('ingestion.log_ingester._copy_rows', side_effect=fail_once):
+        follower = threading.Thread(
+            target=follow_logs, args=(str(log_file),),
+            kwargs={'flush_interval': 0.05, 'poll_interval': 0.05, 'stop_event': stop, 'from_start': True}
+        )
+        follower.start()
+        try:
+            time.sleep(0.5)
+            assert count_logs() == 2
+            assert calls[:2] == [2, 2]
+        finally:
+            stop.set()
+            follower.join()
+
+def test_follow_logs_skips_rows_the_database_rejects(clean_db, tmp_path):
+    """A row with an unparseable timestamp is skipped and the rest of its batch is still written."""
+    with open('data/sample_logs.csv') as f:
+        lines = f.readlines()[:7]
+    lines[3] = "not-a-date,user-101,logout,auth-service,success\n"
+    log_file = tmp_path / "live.csv"
+    log_file.write_text("".join(lines))
+
+    stop = threading.Event()
+    follower = threading.Thread(
+        target=follow_logs, args=(str(log_file),),
+        kwargs={'flush_interval': 0.05, 'poll_interval': 0.05, 'stop_event': stop, 'from_start': True}
+    )
+    follower.start()
+    try:
+        time.sleep(0.5)
+        assert count_logs() == 5
+    finally:
+        stop.set()
+        follower.join()
+
+def test_follow_logs_reads_a_header_written_after_start(clean_db, tmp_path):
+    """Following a file that is still empty takes the first complete line written as its header."""
+    log_file = tmp_path / "live.csv"
+    log_file.write_text("")
+
+    stop = threading.Event()
+    follower = threading.Thread(
+        target=follow_logs, args=(str(log_file),),
+        kwargs={'flush_interval': 0.05, 'poll_interval': 0.05, 'stop_event': stop}
+    )
+    follower.start()
+    try:
+        time.sleep(0.2)
+        with open(log_file, 'a') as f:
+            f.write("timestamp,user_id,action,resource,status\n")
+            f.write("2023-10-27T12:00:00Z,user-101,login,auth-service,success\n")
+            f.write("2023-10-27T12:00:01Z,user-102,read,customer-db,success\n")
+        time.sleep(0.5)
+        assert count_logs() == 2
+    finally:
+        stop.set()
+        follower.join()
+
+def test_follow_logs_retry_does_not_double_count_window_events(clean_db, tmp_path):
+    """A batch whose alerts fail to be stored is retried without its events counting twice in a window."""
+    from unittest.mock import patch
+    from ingestion import log_ingester
+
+    log_file = tmp_path / "live.csv"
+    log_file.write_text("timestamp,user_id,action,resource,status\n"
+                        "2023-10-27T12:00:00Z,user-201,failed_login,auth-service,failure\n"
+                        "2023-10-27T12:01:00Z,user-201,failed_login,auth-service,failure\n")
+    insert_alerts = log_ingester.insert_alerts
+    calls = []
+
+    def fail_once(cur, alerts, alert_ts):
+        calls.append(len(alerts))
+        if len(calls) == 1:
+            raise RuntimeError("connection lost")
+        return insert_alerts(cur, alerts, alert_ts)
+
+    stop = threading.Event()
+    with patch('ingestion.log_ingester.insert_alerts', side_effect=fail_once):
+        follower = threading.Thread(
+            target=follow_logs, args=(str(log_file),),
+            kwargs={'flush_interval': 0.05, 'poll_interval': 0.05, 'stop_event': stop,
+                    'from_start': True, 'evaluate_rules': True}
+        )
+        follower.start()
+        try:
+            time.sleep(0.5)
+        finally:
+            stop.set()
+            follower.join()
+
+    assert len(calls) >= 2
+    assert count_logs() == 2
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM alerts")
+            assert cur.fetchone()[0] == 0
+    finally:
+        conn.close()
+
+def read_all(file_path, batch_size=8):
+    """Collects every row and the skipped count produced by a file's reader."""
+    rows, skipped = [], 0
+    for batch, bad in iter_log_batches(str(file_path), batch_size):
+        rows.extend(batch)
+        skipped += bad
+    return rows, skipped
+
+def test_gzip_csv_reader(tmp_path):
+    """Gzip'd CSV is decompressed on the fly and read in batches."""
+    gz_file = tmp_path / "logs.csv.gz"
+    with open('data/sample_logs.csv', 'rb') as src, gzip.open(gz_file, 'wb') as dst:
+        dst.write(src.read())
+
+    rows, skipped = read_all(gz_file)
+    assert len(rows) == 20 and skipped == 0
+    assert rows[0] == ('2023-10-27T10:00:00Z', 'user-101', 'login', 'auth-service', 'success')
+
+def test_jsonl_reader_skips_malformed_records(tmp_path):
+    """JSONL records missing a log column, or that are not JSON objects, are skipped."""
+    record = dict(zip(LOG_COLUMNS, ('2023-10-27T10:00:00Z', 'user-101', 'login', 'auth-service', 'success')))
+    jsonl_file = tmp_path / "logs.jsonl"
+    jsonl_file.write_text("\n".join([
+        json.dumps(record),
+        json.dumps({'user_id': 'user-102'}),
+        "not json",
+        "",
+        json.dumps(record),
+    ]))
+
+    rows, skipped = read_all(jsonl_file)
+    assert len(rows) == 2 and skipped == 2
+
+def test_parquet_reader(tmp_path):
+    """Parquet files are read column chunk by column chunk."""
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({k: [f"{k}-{i}" for i in range(10)] for k in LOG_COLUMNS})
+    parquet_file = tmp_path / "logs.parquet"
+    pq.write_table(table, parquet_file)
+
+    rows, skipped = read_all(parquet_file, batch_size=4)
+    assert len(rows) == 10 and skipped == 0
+    assert rows[3] == tuple(f"{k}-3" for k in LOG_COLUMNS)
+
+def test_follow_logs_generates_alerts_at_ingestion(clean_db, tmp_path):
+    """With evaluate_rules, violations are stored together with the new logs."""
+    log_file = tmp_path / "live.csv"
+    log_file.write_text(
+        "timestamp,user_id,action,resource,status\n"
+        "2023-10-27T12:00:00Z,user-104,read,financial-records,unauthorized\n"
+        "2023-10-27T12:00:01Z,user-102,read,customer-db,success\n"
+    )
+
+    stop = threading.Event()
+    follower = threading.Thread(
+        target=follow_logs, args=(str(log_file),),
+        kwargs={'flush_interval': 0.1, 'poll_interval': 0.05, 'stop_event': stop,
+                'from_start': True, 'evaluate_rules': True}
+    )
+    follower.start()
+    try:
+        time.sleep(0.5)
+    finally:
+        stop.set()
+        follower.join()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT l.user_id FROM alerts a JOIN logs l ON a.log_id = l.id")
+            assert cur.fetchall() == [('user-104',)]
+    finally:
+        conn.close()
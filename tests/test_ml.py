@@ -1,10 +1,14 @@
 import pytest
+import numpy as np
 import pandas as pd
 import os
 from unittest.mock import patch
 
-from ml.feature_extractor import fetch_logs_as_dataframe, preprocess_features
-from ml.anomaly_detector import AnomalyDetector, run_anomaly_detection, get_anomalies
+from ml.feature_extractor import fetch_logs_as_dataframe, build_feature_vocabulary, iter_log_chunks
+from ml.encoder import FeatureEncoder
+from ml.anomaly_detector import (
+    AnomalyDetector, run_anomaly_detection, get_anomalies, get_watermark, save_anomalies
+)
 from db.database import setup_database, get_db_connection
 from ingestion.log_ingester import ingest_logs
 
@@ -24,19 +28,20 @@ def test_fetch_logs_as_dataframe(db_with_logs):
     assert 'user_id' in df.columns
     assert 'action' in df.columns
 
-def test_preprocess_features(db_with_logs):
-    """Tests the feature extraction and preprocessing pipeline."""
+def test_feature_encoding(db_with_logs):
+    """Tests the feature extraction and encoding of the stored logs."""
     df = fetch_logs_as_dataframe()
-    processed_df, original_df = preprocess_features(df)
+    encoder = FeatureEncoder().fit(df)
+    processed = encoder.transform(df)
 
-    assert not processed_df.empty
-    assert 'hour_of_day' in processed_df.columns
-    assert 'day_of_week' in processed_df.columns
-    assert 'user_id_admin-01' in processed_df.columns # Check one-hot encoding
-    assert 'action_login' in processed_df.columns
+    assert processed.shape == (len(df), len(encoder.feature_names))
+    assert 'hour_of_day' in encoder.feature_names
+    assert 'day_of_week' in encoder.feature_names
+    assert 'user_id_admin-01' in encoder.feature_names # Check one-hot encoding
+    assert 'action_login' in encoder.feature_names
 
-    # Check that no object types remain (all numerical)
-    assert all(dtype.kind in 'if' for dtype in processed_df.dtypes) # int or float
+    # All numerical
+    assert processed.dtype.kind == 'f'
 
 @patch('ml.anomaly_detector.joblib.dump') # Mock saving to avoid creating files
 def test_anomaly_detector_class(mock_dump):
@@ -88,4 +93,162 @@ def test_full_anomaly_detection_pipeline(mock_dump, db_with_logs):
     # Check the structure of the first anomaly record
     first_anomaly = anomalies[0]
     assert len(first_anomaly) == 7 # id, timestamp, user_id, action, resource, score, details
-    assert isinstance(first_anomaly[5], float) # Score should be a float (decimal is read as float)
\ No newline at end of file
+    assert isinstance(first_anomaly[5], float) # Score should be a float (decimal is read as float)
+
+def test_chunked_features_share_a_vocabulary(db_with_logs):
+    """Tests that features streamed in chunks match the whole-table features column for column."""
+    vocabulary = build_feature_vocabulary()
+    assert vocabulary == FeatureEncoder().fit(fetch_logs_as_dataframe()).feature_names
+
+    encoder = FeatureEncoder.from_columns(vocabulary)
+    chunks = [encoder.transform(chunk) for chunk in iter_log_chunks(chunk_size=7)]
+    assert [features.shape for features in chunks] == [(7, len(vocabulary)), (7, len(vocabulary)), (6, len(vocabulary))]
+
+@patch('ml.anomaly_detector.joblib.dump')
+def test_chunked_anomaly_detection_pipeline(mock_dump, db_with_logs):
+    """Tests the pipeline when the logs are streamed and scored in chunks."""
+    run_anomaly_detection(chunk_size=7)
+    assert len(get_anomalies()) > 0
+
+def test_feature_encoder_matches_get_dummies():
+    """The sparse encoding has the same columns and values as a dense pd.get_dummies encoding."""
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'timestamp': ['2023-10-27T10:00:00', '2023-10-28T23:30:00', '2023-10-27T02:15:00'],
+        'user_id': ['user-101', 'admin-01', 'user-101'],
+        'action': ['login', 'delete', 'read'],
+        'resource': ['auth-service', 'db-main', 'auth-service'],
+        'status': ['success', 'failure', 'success']
+    })
+    encoder = FeatureEncoder().fit(df)
+    matrix = encoder.transform(df)
+    timestamps = pd.to_datetime(df['timestamp'])
+    dense = pd.concat([
+        pd.DataFrame({'hour_of_day': timestamps.dt.hour, 'day_of_week': timestamps.dt.dayofweek}),
+        pd.get_dummies(df[['user_id', 'action', 'resource', 'status']], dtype=float)
+    ], axis=1).astype(float)
+
+    assert matrix.format == 'csr'
+    assert encoder.feature_names == dense.columns.tolist()
+    assert (matrix.toarray() == dense.to_numpy()).all()
+
+    # The column names alone are enough to rebuild the encoder
+    rebuilt = FeatureEncoder.from_columns(encoder.feature_names)
+    assert rebuilt.categories == encoder.categories
+
+def test_feature_encoder_drops_unseen_categories():
+    """Values not seen when fitting are not encoded, and the width stays fixed."""
+    encoder = FeatureEncoder.from_columns(['hour_of_day', 'day_of_week', 'user_id_user-101', 'action_login'])
+    df = pd.DataFrame({
+        'id': [1], 'timestamp': ['2023-10-27T10:00:00'], 'user_id': ['new-user'],
+        'action': ['login'], 'resource': ['auth-service'], 'status': [None]
+    })
+    matrix = encoder.transform(df)
+    assert matrix.shape == (1, 4)
+    assert matrix.toarray()[0].tolist() == [10.0, 4.0, 0.0, 1.0]
+
+def test_legacy_model_scores_sparse_rows_without_warnings():
+    """A model saved without an encoder is migrated to score CSR rows without feature-name warnings."""
+    import warnings
+    from sklearn.ensemble import IsolationForest
+
+    columns = ['hour_of_day', 'day_of_week', 'user_id_user-101', 'action_login']
+    model = IsolationForest(random_state=42).fit(pd.DataFrame(np.eye(4), columns=columns))
+    with patch('ml.anomaly_detector.joblib.load', side_effect=[model, columns]), \
+            patch('ml.anomaly_detector.FeatureEncoder.load', side_effect=FileNotFoundError):
+        detector = AnomalyDetector()
+        assert detector.load_model()
+
+    df = pd.DataFrame({
+        'id': [1], 'timestamp': ['2023-10-27T10:00:00'], 'user_id': ['user-101'],
+        'action': ['login'], 'resource': ['auth-service'], 'status': ['success']
+    })
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        predictions, _ = detector.predict(detector.encoder.transform(df))
+    assert len(predictions) == 1
+
+@patch('ml.anomaly_detector.joblib.dump')
+def test_incremental_anomaly_detection(mock_dump, db_with_logs):
+    """An incremental run re-scores logs after the settled watermark and rewrites only the changed anomalies."""
+    run_anomaly_detection()
+    max_log_id = fetch_logs_as_dataframe()['id'].max()
+    assert get_watermark() == max_log_id
+
+    conn = get_db_connection()
+    with conn.cursor() as cur:
+        # xmin changes whenever a row is rewritten
+        cur.execute("SELECT id, log_id, xmin::text FROM anomalies ORDER BY id")
+        kept = cur.fetchall()
+        # A stale anomaly for a log the model now considers normal
+        cur.execute(
+            """
+            INSERT INTO anomalies (log_id, log_ts, timestamp, score, details)
+            SELECT id, timestamp, NOW(), -0.5, 'stale' FROM logs
+            WHERE id NOT IN (SELECT log_id FROM anomalies) ORDER BY id LIMIT 1
+            """
+        )
+        cur.execute("UPDATE pipeline_watermarks SET last_log_id = 10, settled_log_id = 10")
+    conn.commit()
+    conn.close()
+
+    run_anomaly_detection(incremental=True)
+    assert get_watermark() == max_log_id
+
+    conn = get_db_connection()
+    with conn.cursor() as cur:
+        # Logs still anomalous keep their rows untouched; the re-scored normal log loses its anomaly
+        cur.execute("SELECT id, log_id, xmin::text FROM anomalies ORDER BY id")
+        assert cur.fetchall() == kept
+        cur.execute("SELECT log_id, COUNT(*) FROM anomalies GROUP BY log_id HAVING COUNT(*) > 1")
+        assert cur.fetchall() == []
+    conn.close()
+
+def test_save_anomalies_in_bulk(db_with_logs):
+    """Anomalies are saved in order with their scores, even when the frame's index repeats."""
+    logs = fetch_logs_as_dataframe().head(3)
+    logs.index = [0, 0, 0]
+    save_anomalies(logs, [-0.1, -0.2, -0.3])
+
+    conn = get_db_connection()
+    with conn.cursor() as cur:
+        cur.execute("SELECT log_id, score, details FROM anomalies ORDER BY id")
+        saved = cur.fetchall()
+    conn.close()
+    assert [(log_id, float(score)) for log_id, score, _ in saved] == list(zip(logs['id'], [-0.1, -0.2, -0.3]))
+    assert saved[0][2] == (f"Anomaly detected for user '{logs.iloc[0]['user_id']}' performing action "
+                           f"'{logs.iloc[0]['action']}' on resource '{logs.iloc[0]['resource']}'")
+
+def test_batched_parallel_scoring_matches_predict():
+    """score() in batches across processes gives the same labels and scores as IsolationForest."""
+    rng = np.random.default_rng(0)
+    sample_data = pd.DataFrame(rng.normal(size=(200, 3)), columns=['a', 'b', 'c'])
+    detector = AnomalyDetector(n_jobs=2, max_samples=64)
+    detector.train(sample_data)
+
+    try:
+        predictions, scores = detector.score(sample_data, batch_size=50)
+        assert (predictions == detector.model.predict(sample_data)).all()
+        assert np.allclose(scores, detector.model.decision_function(sample_data))
+
+        # Later calls reuse the same processes, and each call is split across them
+        pool = detector._pool
+        assert pool is not None
+        predictions, scores = detector.score(sample_data[:20])
+        assert detector._pool is pool
+        assert np.allclose(scores, detector.model.decision_function(sample_data[:20]))
+    finally:
+        detector.close()
+    assert detector._pool is None
+
+@patch('ml.anomaly_detector.joblib.dump')
+def test_chunked_parallel_anomaly_detection_matches_serial(mock_dump, db_with_logs):
+    """Chunked scoring across processes saves the same anomalies as scoring in this process."""
+    def saved_anomalies():
+        # (details, score); ids are reassigned when a full run replaces the anomalies
+        return sorted((row[6], float(row[5])) for row in get_anomalies())
+
+    run_anomaly_detection(chunk_size=7)
+    serial = saved_anomalies()
+    run_anomaly_detection(chunk_size=7, n_jobs=2)
+    assert saved_anomalies() == serial
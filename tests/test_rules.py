@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+from ingestion.readers import iter_log_batches
+from rules.rule_engine import CompiledRuleSet, WindowedRule, like_to_regex
+from rules.index_advisor import propose_indexes
+
+DEFAULT_RULES = [
+    (1, 'Unauthorized Access Attempt', '', 'status', '=', 'unauthorized'),
+    (2, 'Admin Action on Sensitive DB', '', 'user_id', 'LIKE', 'admin%'),
+    (3, 'Multiple Failed Logins', '', 'action', '=', 'failed_login'),
+]
+
+def sample_rows():
+    return [row for rows, _ in iter_log_batches('data/sample_logs.csv', 100) for row in rows]
+
+def test_like_to_regex():
+    """LIKE wildcards and escapes translate to equivalent regular expressions."""
+    assert like_to_regex('admin%').fullmatch('admin-01')
+    assert not like_to_regex('admin%').fullmatch('sysadmin')
+    assert like_to_regex('user-1_1').fullmatch('user-101')
+    assert like_to_regex('100\\%').fullmatch('100%')
+    assert not like_to_regex('100\\%').fullmatch('1000')
+    assert like_to_regex('a.b').fullmatch('a.b') and not like_to_regex('a.b').fullmatch('axb')
+
+def test_compiled_rules_match_sample_logs():
+    """The in-memory matcher flags the same 9 violations as the SQL rule engine."""
+    violations = CompiledRuleSet(DEFAULT_RULES).evaluate(sample_rows())
+    assert len(violations) == 9
+    assert {rule_id for _, rule_id in violations} == {1, 2, 3}
+
+def test_compiled_in_and_not_equal_rules():
+    """IN rules match any listed value; != rules skip equal and NULL values."""
+    rule_set = CompiledRuleSet([
+        (10, 'Destructive Actions', '', 'action', 'IN', 'delete, grant'),
+        (11, 'Non-Auth Resource', '', 'resource', '!=', 'auth-service'),
+    ])
+    assert sorted(rule_set.match(('t', 'u', 'delete', 'auth-service', 'success'))) == [10]
+    assert sorted(rule_set.match(('t', 'u', 'grant', 'payroll-db', 'success'))) == [10, 11]
+    assert rule_set.match(('t', 'u', 'read', None, 'success')) == []
+
+def test_invalid_rules_are_not_compiled():
+    """Rules outside the field/operator whitelist are skipped, as in run_rules."""
+    rule_set = CompiledRuleSet([(1, 'Bad Field', '', 'password', '=', 'x'), (2, 'Bad Op', '', 'status', '>', 'a')])
+    assert len(rule_set) == 0
+
+def window_rule(aggregate='count', window_type='sliding', window_seconds=900, threshold=3, distinct_field=None):
+    return (20, 'Failed Logins Burst', '', 'action', '=', 'failed_login',
+            'user_id', aggregate, distinct_field, window_type, window_seconds, threshold)
+
+def at(minute):
+    return datetime(2023, 10, 27, 11, 0) + timedelta(minutes=minute)
+
+def test_sliding_count_window_alerts_contributing_events():
+    """Reaching the threshold flags every event in the window, then each further one."""
+    evaluator = WindowedRule(window_rule())
+    assert evaluator.feed(1, at(0), 'user-201', user_id='user-201') == []
+    assert evaluator.feed(2, at(5), 'user-201', user_id='user-201') == []
+    assert evaluator.feed(3, at(10), 'user-201', user_id='user-201') == [(1, 'user-201'), (2, 'user-201'), (3, 'user-201')]
+    assert evaluator.feed(4, at(12), 'user-201', user_id='user-201') == [(4, 'user-201')]
+    # Only one recent event left in the window: the count starts over
+    assert evaluator.feed(5, at(40), 'user-201', user_id='user-201') == []
+
+def test_sliding_window_keys_are_independent():
+    """Events of different group keys never add up."""
+    evaluator = WindowedRule(window_rule())
+    for log_id, user in enumerate(['a', 'b', 'a', 'b'], start=1):
+        assert evaluator.feed(log_id, at(log_id), user, user_id=user) == []
+
+def test_tumbling_window_resets_each_bucket():
+    """Tumbling windows only count events that fall in the same bucket."""
+    evaluator = WindowedRule(window_rule(window_type='tumbling', window_seconds=600))
+    assert evaluator.feed(1, at(5), 'u') == []
+    assert evaluator.feed(2, at(8), 'u') == []
+    assert evaluator.feed(3, at(11), 'u') == []  # New 10-minute bucket
+    assert evaluator.feed(4, at(12), 'u') == []
+    assert evaluator.feed(5, at(13), 'u') == [(3, None), (4, None), (5, None)]
+
+def test_distinct_count_window():
+    """Distinct-count rules count each value once and ignore NULLs."""
+    evaluator = WindowedRule(window_rule(aggregate='distinct_count', distinct_field='resource', threshold=2))
+    assert evaluator.feed(1, at(0), 'u', 'db-1') == []
+    assert evaluator.feed(2, at(1), 'u', 'db-1') == []
+    assert evaluator.feed(3, at(2), 'u', None) == []
+    assert evaluator.feed(4, at(3), 'u', 'db-2') == [(2, None), (4, None)]
+
+def test_window_state_is_bounded():
+    """Idle keys are evicted, so state does not grow with the number of distinct users."""
+    evaluator = WindowedRule(window_rule(window_seconds=60))
+    for log_id in range(WindowedRule.EVICT_EVERY * 3):
+        evaluator.feed(log_id, at(log_id), f"user-{log_id}")
+    assert len(evaluator) <= WindowedRule.EVICT_EVERY
+
+def test_restored_window_state_forgets_rolled_back_events():
+    """Events fed after a snapshot are forgotten on restore, so a retried batch is not counted twice."""
+    rule_set = CompiledRuleSet([], window_rules=[window_rule()])
+    rows = [(at(0).isoformat(), 'user-201', 'failed_login', 'auth-service', 'failure'),
+            (at(5).isoformat(), 'user-201', 'failed_login', 'auth-service', 'failure')]
+    snapshot = rule_set.snapshot_windows()
+    assert rule_set.evaluate_windows(rows, [1, 2]) == []
+    rule_set.restore_windows(snapshot)
+    # The same two failed logins, retried with new ids, stay below the threshold of 3
+    assert rule_set.evaluate_windows(rows, [3, 4]) == []
+
+def test_compiled_window_rule_on_sample_logs():
+    """The seeded failed-login window rule flags the 3 failed logins of user-201."""
+    rows = sample_rows()
+    rule_set = CompiledRuleSet([], window_rules=[window_rule()])
+    fired = rule_set.evaluate_windows(rows, list(range(1, len(rows) + 1)))
+    assert sorted(log_id for log_id, _, _ in fired) == [13, 14, 15]
+    assert {user for _, _, user in fired} == {'user-201'}
+
+def test_window_rule_mixes_offset_and_naive_timestamps():
+    """Timestamps with and without a UTC offset are ordered together, like PostgreSQL stores them."""
+    rows = [row for row in sample_rows() if row[1] == 'user-201']
+    rows[0] = (datetime.fromisoformat(rows[0][0]).replace(tzinfo=None),) + rows[0][1:]
+    rows[1] = (rows[1][0].rstrip('Z'),) + rows[1][1:]
+    rule_set = CompiledRuleSet([], window_rules=[window_rule()])
+    fired = rule_set.evaluate_windows(rows, list(range(1, len(rows) + 1)))
+    assert len(fired) == 3
+
+def test_index_advisor_proposals():
+    """Rules sharing a field share one index, and every index is built without blocking writes."""
+    rules = [
+        (1, "Admin DB", "", "resource", "LIKE", "admin%"),
+        (2, "Any admin", "", "resource", "LIKE", "%admin%"),
+        (3, "Failed", "", "status", "=", "failure"),
+        (4, "Failed or denied", "", "status", "IN", "failure, denied"),
+        (5, "Not o'brien", "", "user_id", "!=", "o'brien"),
+    ]
+    proposals = {p['name']: p for p in propose_indexes(rules)}
+
+    assert set(proposals) == {"idx_logs_resource_pattern", "idx_logs_status_id", "idx_logs_rule_5"}
+    assert "text_pattern_ops" in proposals["idx_logs_resource_pattern"]['sql']
+    assert proposals["idx_logs_resource_pattern"]['rule_ids'] == [1]
+    assert proposals["idx_logs_status_id"]['rule_ids'] == [3, 4]
+    assert proposals["idx_logs_rule_5"]['sql'].endswith("WHERE user_id <> 'o''brien'")
+    assert all(p['sql'].startswith("CREATE INDEX CONCURRENTLY") for p in proposals.values())